@@ -0,0 +1,58 @@
+import logging
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app import schemas
+from app.crud import holidays as crud_holidays
+from app.working_calendar import working_calendar
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/calendar", tags=["calendar"])
+
+
+@router.get("/working-days", response_model=schemas.WorkingDays)
+def get_working_days(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    dept_no: Optional[str] = Query(default=None, description="Include this department's holidays"),
+    db: Session = Depends(get_db),
+):
+    """Working days in [start_date, end_date], excluding weekends and holidays."""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after or equal to start_date")
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "dept_no": dept_no,
+        "working_days": working_calendar.working_days(db, start_date, end_date, dept_no),
+    }
+
+
+@router.get("/holidays", response_model=List[schemas.Holiday])
+def list_holidays(
+    year: Optional[int] = Query(default=None),
+    dept_no: Optional[str] = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    return crud_holidays.get_holidays(db, year=year, dept_no=dept_no)
+
+
+@router.post("/holidays", response_model=schemas.Holiday, status_code=201)
+def create_holiday(
+    holiday_in: schemas.HolidayCreate,
+    db: Session = Depends(get_db),
+):
+    logger.info(f"POST /calendar/holidays called, date={holiday_in.holiday_date}, dept_no={holiday_in.dept_no}")
+    return crud_holidays.create_holiday(db, holiday_in)
+
+
+@router.delete("/holidays/{holiday_id}", status_code=204)
+def delete_holiday(holiday_id: int, db: Session = Depends(get_db)):
+    if not crud_holidays.delete_holiday(db, holiday_id):
+        raise HTTPException(status_code=404, detail="Holiday not found")
+    return None
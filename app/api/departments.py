@@ -1,11 +1,13 @@
-from typing import List
+from datetime import date
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app import schemas
 from app.crud import departments as crud_departments
+from app.crud import department_stats as crud_department_stats
 
 router = APIRouter(prefix="/departments", tags=["departments"])
 
@@ -23,6 +25,74 @@ def create_department(
     return crud_departments.create_department(db, dept_in)
 
 
+@router.get("/stats", response_model=List[schemas.DepartmentStats])
+def list_department_stats(db: Session = Depends(get_db)):
+    """
+    Headcount, gender split and average tenure for every department,
+    served from the incrementally maintained dept_stats table.
+    """
+    return [
+        crud_department_stats.to_schema_dict(stats)
+        for stats in crud_department_stats.get_all_department_stats(db)
+    ]
+
+
+@router.get("/{dept_no}/stats", response_model=schemas.DepartmentStats)
+def get_department_stats(dept_no: str, db: Session = Depends(get_db)):
+    stats = crud_department_stats.get_department_stats(db, dept_no)
+    if stats is None:
+        # No members aggregated yet; distinguish from an unknown department.
+        if not crud_departments.get_department(db, dept_no):
+            raise HTTPException(status_code=404, detail="Department not found")
+        return schemas.DepartmentStats(
+            dept_no=dept_no, headcount=0, male_count=0, female_count=0
+        )
+    return crud_department_stats.to_schema_dict(stats)
+
+
+@router.get("/{dept_no}/employees", response_model=List[schemas.DepartmentMember])
+def list_department_members(
+    dept_no: str,
+    after_emp_no: Optional[int] = Query(
+        default=None, description="Last emp_no of the previous page (keyset cursor)"
+    ),
+    limit: int = Query(50, ge=1, le=crud_departments.MAX_ROSTER_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    """
+    Current members of a department, ordered by emp_no.
+    To fetch the next page, pass the emp_no of the last row as after_emp_no.
+    """
+    if not crud_departments.get_department(db, dept_no):
+        raise HTTPException(status_code=404, detail="Department not found")
+    return crud_departments.get_department_members(
+        db, dept_no, after_emp_no=after_emp_no, limit=limit
+    )
+
+
+@router.get("/{dept_no}/absences", response_model=schemas.DepartmentAbsences)
+def get_department_absences(
+    dept_no: str,
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+):
+    """
+    Team absence calendar: per day in [from, to], the current members of
+    the department on approved or pending leave.
+    """
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to must be on or after from")
+    if (to_date - from_date).days + 1 > crud_departments.MAX_ABSENCE_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window may span at most {crud_departments.MAX_ABSENCE_WINDOW_DAYS} days",
+        )
+    if not crud_departments.get_department(db, dept_no):
+        raise HTTPException(status_code=404, detail="Department not found")
+    return crud_departments.get_department_absences(db, dept_no, from_date, to_date)
+
+
 @router.get("/{dept_no}", response_model=schemas.Department)
 def get_department(dept_no: str, db: Session = Depends(get_db)):
     db_dept = crud_departments.get_department(db, dept_no)
@@ -37,16 +107,14 @@ def update_department(
     dept_in: schemas.DepartmentUpdate,
     db: Session = Depends(get_db),
 ):
-    db_dept = crud_departments.get_department(db, dept_no)
+    db_dept = crud_departments.update_department(db, dept_no, dept_in)
     if not db_dept:
         raise HTTPException(status_code=404, detail="Department not found")
-    return crud_departments.update_department(db, db_dept, dept_in)
+    return db_dept
 
 
 @router.delete("/{dept_no}", status_code=204)
 def delete_department(dept_no: str, db: Session = Depends(get_db)):
-    db_dept = crud_departments.get_department(db, dept_no)
-    if not db_dept:
+    if not crud_departments.delete_department(db, dept_no):
         raise HTTPException(status_code=404, detail="Department not found")
-    crud_departments.delete_department(db, db_dept)
     return None
@@ -2,7 +2,9 @@ import logging
 
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func    
 
@@ -13,6 +15,7 @@ from app.models import Employee
 from app.schemas import EmployeeSearchResult
 
 from app.dependencies.auth import get_current_user
+from app.dependencies.versioning import expected_version, if_match_version, set_etag
 
 logger = logging.getLogger(__name__)
 
@@ -91,10 +94,11 @@ def create_employee(
 
 
 @router.get("/{emp_no}", response_model=schemas.Employee)
-def get_employee(emp_no: int, db: Session = Depends(get_db)):
+def get_employee(emp_no: int, response: Response, db: Session = Depends(get_db)):
     db_employee = crud_employees.get_employee(db, emp_no)
     if not db_employee:
         raise HTTPException(status_code=404, detail="Employee not found")
+    set_etag(response, db_employee)
     return db_employee
 
 
@@ -102,12 +106,36 @@ def get_employee(emp_no: int, db: Session = Depends(get_db)):
 def update_employee(
     emp_no: int,
     employee_in: schemas.EmployeeUpdate,
+    response: Response,
+    if_match: Optional[int] = Depends(if_match_version),
     db: Session = Depends(get_db),
 ):
+    """
+    Send the version you read (body "version" or If-Match: the ETag) to get
+    409 instead of overwriting someone else's change.
+    """
+    db_employee = crud_employees.update_employee(
+        db, emp_no, employee_in, expected_version(employee_in.version, if_match)
+    )
+    if not db_employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    set_etag(response, db_employee)
+    return db_employee
+
+
+@router.post("/{emp_no}/transfer", response_model=schemas.Employee)
+def transfer_employee(
+    emp_no: int,
+    transfer_in: schemas.EmployeeTransfer,
+    db: Session = Depends(get_db),
+):
+    logger.info(f"POST /employees/{emp_no}/transfer called, transfer_in: {transfer_in}")
     db_employee = crud_employees.get_employee(db, emp_no)
     if not db_employee:
         raise HTTPException(status_code=404, detail="Employee not found")
-    return crud_employees.update_employee(db, db_employee, employee_in)
+    return crud_employees.transfer_employee(
+        db, db_employee, transfer_in.dept_no, transfer_in.effective_date
+    )
 
 
 @router.delete("/{emp_no}", status_code=204)
@@ -1,29 +1,91 @@
+import json
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app import schemas
 from app.crud import leave_quotas as crud_leave_quotas
+from app.crud import leave_ledger as crud_leave_ledger
+from app.dependencies.versioning import expected_version, if_match_version, set_etag
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/leave-quotas", tags=["leave-quotas"])
 
+# Rows per chunk written to the socket by GET /leave-quotas/stream.
+NDJSON_LINES_PER_CHUNK = 500
+
 
 @router.get("", response_model=List[schemas.LeaveQuota])
 def list_leave_quotas(
     emp_no: Optional[int] = Query(default=None),
     year: Optional[int] = Query(default=None),
     leave_type_id: Optional[int] = Query(default=None),
+    after_emp_no: Optional[int] = Query(
+        default=None, description="emp_no of the last row of the previous page"
+    ),
+    after_year: Optional[int] = Query(
+        default=None, description="year of the last row of the previous page"
+    ),
+    after_leave_type_id: Optional[int] = Query(
+        default=None, description="leave_type_id of the last row of the previous page"
+    ),
+    limit: int = Query(100, ge=1, le=crud_leave_quotas.MAX_QUOTA_PAGE_SIZE),
     db: Session = Depends(get_db),
 ):
+    """
+    Quota rows ordered by (emp_no, year, leave_type_id).
+    To fetch the next page, pass the key of the last row as
+    after_emp_no / after_year / after_leave_type_id.
+    For a full export use GET /leave-quotas/stream.
+    """
+    cursor = (after_emp_no, after_year, after_leave_type_id)
+    if any(part is None for part in cursor) and any(part is not None for part in cursor):
+        raise HTTPException(
+            status_code=400,
+            detail="after_emp_no, after_year and after_leave_type_id must be given together",
+        )
     return crud_leave_quotas.get_leave_quotas(
+        db,
+        emp_no=emp_no,
+        year=year,
+        leave_type_id=leave_type_id,
+        after=cursor if after_emp_no is not None else None,
+        limit=limit,
+    )
+
+
+@router.get("/stream")
+def stream_leave_quotas(
+    emp_no: Optional[int] = Query(default=None),
+    year: Optional[int] = Query(default=None),
+    leave_type_id: Optional[int] = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """
+    All matching quota rows as newline-delimited JSON (one object per line),
+    streamed from a server-side cursor.
+    """
+    rows = crud_leave_quotas.iter_leave_quota_rows(
         db, emp_no=emp_no, year=year, leave_type_id=leave_type_id
     )
 
+    def ndjson():
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row))
+            if len(lines) == NDJSON_LINES_PER_CHUNK:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 
 @router.post("", response_model=schemas.LeaveQuota, status_code=201)
 def create_leave_quota(
@@ -33,16 +95,46 @@ def create_leave_quota(
     return crud_leave_quotas.create_leave_quota(db, quota_in)
 
 
+@router.post("/bulk", response_model=schemas.LeaveQuotaBulkResult)
+def bulk_upsert_leave_quotas(
+    bulk_in: schemas.LeaveQuotaBulkUpsert,
+    db: Session = Depends(get_db),
+):
+    """
+    Set (days) or adjust (delta) many quotas at once, for explicit
+    employees and/or every current member of a department.
+    Rows are applied in chunked transactions; rows that fail validation are
+    listed in "errors" and the rest are still applied.
+    """
+    logger.info(
+        f"POST /leave-quotas/bulk called, entries={len(bulk_in.entries)}, "
+        f"department_rules={len(bulk_in.department_rules)}"
+    )
+    return crud_leave_quotas.bulk_upsert_quotas(db, bulk_in)
+
+
+@router.get("/{emp_no}/{year}/balance", response_model=List[schemas.LeaveBalance])
+def get_leave_balances(
+    emp_no: int,
+    year: int,
+    db: Session = Depends(get_db),
+):
+    """Entitled / used / pending / available days per leave type, from the balance snapshot."""
+    return crud_leave_ledger.get_balances(db, emp_no, year)
+
+
 @router.get("/{emp_no}/{year}/{leave_type_id}", response_model=schemas.LeaveQuota)
 def get_leave_quota(
     emp_no: int,
     year: int,
     leave_type_id: int,
+    response: Response,
     db: Session = Depends(get_db),
 ):
     db_quota = crud_leave_quotas.get_leave_quota(db, emp_no, year, leave_type_id)
     if not db_quota:
         raise HTTPException(status_code=404, detail="Leave quota not found")
+    set_etag(response, db_quota)
     return db_quota
 
 
@@ -52,12 +144,22 @@ def update_leave_quota(
     year: int,
     leave_type_id: int,
     quota_in: schemas.LeaveQuotaUpdate,
+    response: Response,
+    if_match: Optional[int] = Depends(if_match_version),
     db: Session = Depends(get_db),
 ):
-    db_quota = crud_leave_quotas.get_leave_quota(db, emp_no, year, leave_type_id)
+    """
+    Send the version you read (body "version" or If-Match: the ETag) to get
+    409 instead of overwriting someone else's change. Approvals and
+    cancellations move the quota too, so they bump its version.
+    """
+    db_quota = crud_leave_quotas.update_leave_quota(
+        db, emp_no, year, leave_type_id, quota_in, expected_version(quota_in.version, if_match)
+    )
     if not db_quota:
         raise HTTPException(status_code=404, detail="Leave quota not found")
-    return crud_leave_quotas.update_leave_quota(db, db_quota, quota_in)
+    set_etag(response, db_quota)
+    return db_quota
 
 
 @router.delete("/{emp_no}/{year}/{leave_type_id}", status_code=204)
@@ -67,8 +169,6 @@ def delete_leave_quota(
     leave_type_id: int,
     db: Session = Depends(get_db),
 ):
-    db_quota = crud_leave_quotas.get_leave_quota(db, emp_no, year, leave_type_id)
-    if not db_quota:
+    if not crud_leave_quotas.delete_leave_quota(db, emp_no, year, leave_type_id):
         raise HTTPException(status_code=404, detail="Leave quota not found")
-    crud_leave_quotas.delete_leave_quota(db, db_quota)
     return None
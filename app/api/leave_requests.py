@@ -1,30 +1,67 @@
+import io
 import logging
+from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app import schemas
 from app.crud import leave_requests as crud_leave_requests
+from app.crud import leave_import as crud_leave_import
+from app.dependencies.versioning import expected_version, if_match_version, set_etag
+from app.leave_events import leave_events, stream_events
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/leave-requests", tags=["leave-requests"])
 
+# Largest CSV body accepted by POST /leave-requests/import.
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+
 
 @router.get("", response_model=List[schemas.LeaveRequest])
 def list_leave_requests(
     emp_no: Optional[int] = Query(default=None),
     status: Optional[str] = Query(default=None),
-    limit: int = Query(50, ge=1),
+    manager_emp_no: Optional[int] = Query(default=None),
+    before_requested_at: Optional[datetime] = Query(
+        default=None, description="requested_at of the last row of the previous page"
+    ),
+    before_leave_id: Optional[int] = Query(
+        default=None, description="leave_id of the last row of the previous page"
+    ),
+    start_from: Optional[date] = Query(default=None, description="only requests starting on or after"),
+    start_to: Optional[date] = Query(default=None, description="only requests starting on or before"),
+    limit: int = Query(50, ge=1, le=crud_leave_requests.MAX_LEAVE_REQUEST_PAGE_SIZE),
     offset: int = Query(0, ge=0),
+    include_archived: bool = Query(False, description="also list archived (old, decided) requests"),
     db: Session = Depends(get_db),
 ):
-    logger.info(f"GET /leave-requests called, emp_no:{emp_no}, status:{status}")
+    logger.info(
+        f"GET /leave-requests called, emp_no:{emp_no}, manager_emp_no:{manager_emp_no}, status:{status}"
+    )
+    if (before_requested_at is None) != (before_leave_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="before_requested_at and before_leave_id must be given together",
+        )
     try:
         leave_requests = crud_leave_requests.get_leave_requests(
-            db, emp_no=emp_no, status=status, skip=offset, limit=limit
+            db,
+            emp_no=emp_no,
+            status=status,
+            skip=offset,
+            limit=limit,
+            manager_emp_no=manager_emp_no,
+            before_requested_at=before_requested_at,
+            before_leave_id=before_leave_id,
+            start_from=start_from,
+            start_to=start_to,
+            include_archived=include_archived,
         )
         return leave_requests
     except Exception as e:
@@ -34,6 +71,41 @@ def list_leave_requests(
         raise
 
 
+@router.get("/pending-count", response_model=schemas.PendingCount)
+def get_pending_count(
+    manager_emp_no: int = Query(..., description="Employee number of the manager"),
+    db: Session = Depends(get_db),
+):
+    """Lightweight badge count for a manager's inbox."""
+    return schemas.PendingCount(
+        manager_emp_no=manager_emp_no,
+        pending=crud_leave_requests.count_pending_for_manager(db, manager_emp_no),
+    )
+
+
+@router.get("/events")
+async def stream_leave_request_events(
+    request: Request,
+    emp_no: Optional[int] = Query(default=None, description="Changes to this employee's requests"),
+    manager_emp_no: Optional[int] = Query(default=None, description="Changes to requests this manager reviews"),
+    last_event_id: Optional[str] = Header(default=None),
+):
+    """
+    Server-Sent Events stream of leave request changes (created, updated,
+    reviewed, cancelled, expired, deleted) for an employee and/or a manager.
+    Reconnecting with Last-Event-ID replays what was missed; a "reset"
+    event means the gap is too old and the list should be refetched once.
+    """
+    if emp_no is None and manager_emp_no is None:
+        raise HTTPException(status_code=400, detail="emp_no or manager_emp_no is required")
+    subscription = leave_events.subscribe(emp_no=emp_no, manager_emp_no=manager_emp_no)
+    return StreamingResponse(
+        stream_events(request, subscription, leave_events, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("", response_model=schemas.LeaveRequest, status_code=201)
 def create_leave_request(
     leave_in: schemas.LeaveRequestCreate,
@@ -56,12 +128,47 @@ def create_leave_request(
     
 
 
+@router.post("/import", response_model=schemas.LeaveImportResult)
+async def import_leave_requests(
+    request: Request,
+    dry_run: bool = Query(False, description="validate only, write nothing"),
+    chunk_size: int = Query(crud_leave_import.IMPORT_CHUNK_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    """
+    Bulk import leave requests from a CSV request body (header row required;
+    columns as in app.crud.leave_import.IMPORT_COLUMNS).
+    All rows are validated first; rows that fail are listed in "errors"
+    with their line number and the rest are inserted in chunked transactions.
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_IMPORT_BYTES:
+            raise HTTPException(status_code=413, detail="CSV file too large")
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    logger.info(f"POST /leave-requests/import called, bytes={len(body)}, dry_run={dry_run}")
+    return await run_in_threadpool(
+        crud_leave_import.import_leave_requests,
+        db,
+        # Not str.splitlines(): it also breaks on \x0b, \x1c, \u2028 and
+        # friends, which may appear inside quoted fields.
+        io.StringIO(text, newline=""),
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+    )
+
+
 @router.get("/{leave_id}", response_model=schemas.LeaveRequest)
-def get_leave_request(leave_id: int, db: Session = Depends(get_db)):
+def get_leave_request(leave_id: int, response: Response, db: Session = Depends(get_db)):
     logger.info(f"GET leaveReq by id, leave_id={leave_id}")
-    db_leave = crud_leave_requests.get_leave_request(db, leave_id)
+    db_leave = crud_leave_requests.get_leave_request(db, leave_id, include_archived=True)
     if not db_leave:
         raise HTTPException(status_code=404, detail="Leave request not found")
+    set_etag(response, db_leave)
     return db_leave
 
 
@@ -69,13 +176,23 @@ def get_leave_request(leave_id: int, db: Session = Depends(get_db)):
 def update_leave_request(
     leave_id: int,
     leave_in: schemas.LeaveRequestUpdate,
+    response: Response,
+    if_match: Optional[int] = Depends(if_match_version),
     db: Session = Depends(get_db),
 ):
+    """
+    Send the version you read (body "version" or If-Match: the ETag) to get
+    409 instead of overwriting someone else's change.
+    """
     logger.info("UPDATE leaveReq by id...", extra={"leave_id":leave_id, "leave_in": leave_in})
     db_leave = crud_leave_requests.get_leave_request(db, leave_id)
     if not db_leave:
         raise HTTPException(status_code=404, detail="Leave request not found")
-    return crud_leave_requests.update_leave_request(db, db_leave, leave_in)
+    db_leave = crud_leave_requests.update_leave_request(
+        db, db_leave, leave_in, expected_version(leave_in.version, if_match)
+    )
+    set_etag(response, db_leave)
+    return db_leave
 
 
 @router.delete("/{leave_id}", status_code=204)
@@ -87,6 +204,35 @@ def delete_leave_request(leave_id: int, db: Session = Depends(get_db)):
     return None
 
 
+@router.patch("/review", response_model=List[schemas.LeaveReviewOutcome])
+def review_leave_requests_bulk(
+    review_in: schemas.LeaveRequestBulkReview,
+    manager_emp_no: int = Query(..., description="Employee number of the reviewing manager"),
+    db: Session = Depends(get_db),
+):
+    """
+    Manager approves/rejects many leave requests at once.
+    All decisions and quota deductions are committed in one transaction;
+    each item reports whether it was applied.
+    """
+    logger.info(f"PATCH /leave-requests/review called, manager_emp_no={manager_emp_no}, items={len(review_in.items)}")
+    return crud_leave_requests.review_leave_requests_bulk(
+        db, review_in.items, manager_emp_no
+    )
+
+
+@router.patch("/{leave_id}/cancel", response_model=schemas.LeaveRequest)
+def cancel_leave_request(leave_id: int, db: Session = Depends(get_db)):
+    """
+    Cancel a pending or approved leave request.
+    Cancelling an approved request gives its days back to the quota.
+    """
+    db_leave = crud_leave_requests.get_leave_request(db, leave_id)
+    if not db_leave:
+        raise HTTPException(status_code=404, detail="Leave request not found")
+    return crud_leave_requests.cancel_leave_request(db, db_leave)
+
+
 @router.patch("/{leave_id}/review", response_model=schemas.LeaveRequest)
 def review_leave_request(
     leave_id: int,
@@ -0,0 +1,143 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.models import FAR_FUTURE
+
+DAYS_PER_YEAR = 365.25
+
+
+def get_department_stats(db: Session, dept_no: str) -> Optional[models.DepartmentStats]:
+    return db.get(models.DepartmentStats, dept_no)
+
+
+def get_all_department_stats(db: Session) -> List[models.DepartmentStats]:
+    return (
+        db.query(models.DepartmentStats)
+        .order_by(models.DepartmentStats.dept_no)
+        .all()
+    )
+
+
+def to_schema_dict(stats: models.DepartmentStats, today: Optional[date] = None) -> dict:
+    """
+    Turn a stats row into the API payload.
+    Average tenure is derived from the stored hire-date sum, so it never goes stale.
+    """
+    if today is None:
+        today = date.today()
+
+    avg_tenure_years = None
+    if stats.headcount > 0:
+        avg_hire_ordinal = stats.hire_ordinal_sum / stats.headcount
+        avg_tenure_years = round((today.toordinal() - avg_hire_ordinal) / DAYS_PER_YEAR, 2)
+
+    return {
+        "dept_no": stats.dept_no,
+        "headcount": stats.headcount,
+        "male_count": stats.male_count,
+        "female_count": stats.female_count,
+        "avg_tenure_years": avg_tenure_years,
+    }
+
+
+def adjust_department_stats(
+    db: Session, dept_no: str, gender: str, hire_date: date, delta: int = 1
+) -> None:
+    """
+    Apply a membership change (+1 join, -1 leave) to a department's aggregates.
+    Does NOT commit; the caller commits together with the dept_emp change.
+
+    If the department has no stats row yet, one is created for joins only
+    (a leave from a department that was never aggregated is left for the
+    batch recompute to fix).
+    """
+    stats = models.DepartmentStats
+    male = delta if gender == "M" else 0
+    female = delta if gender == "F" else 0
+    ordinal = delta * hire_date.toordinal()
+
+    result = db.execute(
+        update(stats)
+        .where(stats.dept_no == dept_no)
+        .values(
+            headcount=stats.headcount + delta,
+            male_count=stats.male_count + male,
+            female_count=stats.female_count + female,
+            hire_ordinal_sum=stats.hire_ordinal_sum + ordinal,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount == 0 and delta > 0:
+        db.add(
+            models.DepartmentStats(
+                dept_no=dept_no,
+                headcount=delta,
+                male_count=male,
+                female_count=female,
+                hire_ordinal_sum=ordinal,
+            )
+        )
+        # Flush so a second adjustment in the same unit of work hits the UPDATE path.
+        db.flush()
+
+
+def get_current_dept_nos(db: Session, emp_no: int) -> List[str]:
+    """All departments the employee is currently assigned to (to_date = 9999-01-01)."""
+    rows = (
+        db.query(models.DeptEmp.dept_no)
+        .filter(
+            models.DeptEmp.emp_no == emp_no,
+            models.DeptEmp.to_date == FAR_FUTURE,
+        )
+        .all()
+    )
+    return [dept_no for (dept_no,) in rows]
+
+
+def recompute_department_stats(db: Session) -> int:
+    """
+    Rebuild dept_stats from dept_emp + employees in one grouped scan.
+
+    Grouping by (dept_no, gender, hire_date) keeps the date arithmetic in
+    Python, so the same query works on MySQL and SQLite. Returns the number
+    of departments written.
+    """
+    rows = (
+        db.query(
+            models.DeptEmp.dept_no,
+            models.Employee.gender,
+            models.Employee.hire_date,
+            func.count(),
+        )
+        .join(models.Employee, models.Employee.emp_no == models.DeptEmp.emp_no)
+        .filter(models.DeptEmp.to_date == FAR_FUTURE)
+        .group_by(models.DeptEmp.dept_no, models.Employee.gender, models.Employee.hire_date)
+        .all()
+    )
+
+    totals: Dict[str, dict] = defaultdict(
+        lambda: {"headcount": 0, "male_count": 0, "female_count": 0, "hire_ordinal_sum": 0}
+    )
+    for dept_no, gender, hire_date, n in rows:
+        agg = totals[dept_no]
+        agg["headcount"] += n
+        if gender == "M":
+            agg["male_count"] += n
+        elif gender == "F":
+            agg["female_count"] += n
+        agg["hire_ordinal_sum"] += n * hire_date.toordinal()
+
+    db.execute(delete(models.DepartmentStats))
+    if totals:
+        db.execute(
+            models.DepartmentStats.__table__.insert(),
+            [{"dept_no": dept_no, **agg} for dept_no, agg in totals.items()],
+        )
+    db.commit()
+    return len(totals)
@@ -1,7 +1,17 @@
+from collections import Counter
+from datetime import date, timedelta
 from typing import List, Optional
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 
 from app import models, schemas
+from app.crud.leave_requests import ACTIVE_STATUSES
+from app.crud.writes import commit_and_keep, delete_by_pk, update_by_pk
+from app.models import FAR_FUTURE, recurrence_dict
+from app.recurrence import clip_runs, leave_runs, recurrence_of
+
+MAX_ROSTER_PAGE_SIZE = 500
+MAX_ABSENCE_WINDOW_DAYS = 366
 
 
 def get_department(db: Session, dept_no: str) -> Optional[models.Department]:
@@ -12,26 +22,158 @@ def get_departments(db: Session) -> List[models.Department]:
     return db.query(models.Department).order_by(models.Department.dept_no).all()
 
 
+def get_department_members(
+    db: Session,
+    dept_no: str,
+    after_emp_no: Optional[int] = None,
+    limit: int = 50,
+):
+    """
+    Current members of a department (dept_emp.to_date = '9999-01-01') with
+    their current title, ordered by emp_no.
+
+    Keyset pagination: pass the last emp_no of the previous page as
+    after_emp_no. The filter + order map onto the
+    (dept_no, to_date, emp_no) index, so every page is a bounded range scan
+    no matter how deep into the department it is.
+    """
+    limit = min(limit, MAX_ROSTER_PAGE_SIZE)
+    q = (
+        db.query(
+            models.Employee.emp_no,
+            models.Employee.first_name,
+            models.Employee.last_name,
+            models.Employee.gender,
+            models.Employee.hire_date,
+            models.DeptEmp.from_date,
+            models.Title.title,
+        )
+        .select_from(models.DeptEmp)
+        .join(models.Employee, models.Employee.emp_no == models.DeptEmp.emp_no)
+        .outerjoin(
+            models.Title,
+            and_(
+                models.Title.emp_no == models.DeptEmp.emp_no,
+                models.Title.to_date == FAR_FUTURE,
+            ),
+        )
+        .filter(
+            models.DeptEmp.dept_no == dept_no,
+            models.DeptEmp.to_date == FAR_FUTURE,
+        )
+    )
+    if after_emp_no is not None:
+        q = q.filter(models.DeptEmp.emp_no > after_emp_no)
+    return q.order_by(models.DeptEmp.emp_no).limit(limit).all()
+
+
+def get_department_absences(
+    db: Session, dept_no: str, from_date: date, to_date: date
+) -> dict:
+    """
+    Who of the department's current members is out on each day of
+    [from_date, to_date], from PENDING and APPROVED leave requests.
+
+    One query fetches every request intersecting the window (current
+    members via the (dept_no, to_date, emp_no) dept_emp index, then the
+    (emp_no, start_date, end_date) leave index). The per-day lists come from
+    a single sweep over the window: each request adds its employee on its
+    first day inside the window and removes it the day after its last.
+    Recurring requests are expanded, clipped to the window, and each run of
+    days is swept the same way; series with no day inside the window are
+    left out.
+    """
+    leave = models.EmployeeLeaveRequest
+    rows = (
+        db.query(
+            models.Employee.emp_no,
+            models.Employee.first_name,
+            models.Employee.last_name,
+            leave.leave_id,
+            leave.leave_type_id,
+            leave.status,
+            leave.start_date,
+            leave.end_date,
+            leave.recurrence_weekdays,
+            leave.recurrence_interval_weeks,
+        )
+        .select_from(models.DeptEmp)
+        .join(models.Employee, models.Employee.emp_no == models.DeptEmp.emp_no)
+        .join(leave, leave.emp_no == models.DeptEmp.emp_no)
+        .filter(
+            models.DeptEmp.dept_no == dept_no,
+            models.DeptEmp.to_date == FAR_FUTURE,
+            leave.start_date <= to_date,
+            leave.end_date >= from_date,
+            leave.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(leave.start_date, models.Employee.emp_no, leave.leave_id)
+        .all()
+    )
+
+    n_days = (to_date - from_date).days + 1
+    arrivals: List[List[int]] = [[] for _ in range(n_days + 1)]
+    departures: List[List[int]] = [[] for _ in range(n_days + 1)]
+    absences = []
+    for row in rows:
+        runs = list(clip_runs(
+            leave_runs(row.start_date, row.end_date, recurrence_of(row)), from_date, to_date
+        ))
+        if not runs:
+            continue
+        for first, last in runs:
+            arrivals[(first - from_date).days].append(row.emp_no)
+            departures[(last - from_date).days + 1].append(row.emp_no)
+        absence = row._asdict()
+        absence["recurrence"] = recurrence_dict(row)
+        del absence["recurrence_weekdays"], absence["recurrence_interval_weeks"]
+        absences.append(absence)
+
+    # Counter rather than a set: legacy overlapping requests of one employee
+    # must not end the absence when only one of them does.
+    out: Counter = Counter()
+    days = []
+    for offset in range(n_days):
+        out.update(arrivals[offset])
+        for emp_no in departures[offset]:
+            out[emp_no] -= 1
+            if not out[emp_no]:
+                del out[emp_no]
+        days.append({
+            "date": from_date + timedelta(days=offset),
+            "count": len(out),
+            "emp_nos": sorted(out),
+        })
+
+    return {
+        "dept_no": dept_no,
+        "from_date": from_date,
+        "to_date": to_date,
+        "days": days,
+        "absences": absences,
+    }
+
+
 def create_department(db: Session, dept_in: schemas.DepartmentCreate) -> models.Department:
     dept = models.Department(**dept_in.model_dump())
     db.add(dept)
-    db.commit()
-    db.refresh(dept)
+    commit_and_keep(db)
     return dept
 
 
 def update_department(
-    db: Session, db_dept: models.Department, dept_in: schemas.DepartmentUpdate
-) -> models.Department:
-    data = dept_in.model_dump(exclude_unset=True)
-    for key, value in data.items():
-        setattr(db_dept, key, value)
-    db.add(db_dept)
-    db.commit()
-    db.refresh(db_dept)
+    db: Session, dept_no: str, dept_in: schemas.DepartmentUpdate
+) -> Optional[models.Department]:
+    """Returns the updated department, or None if it does not exist."""
+    db_dept = update_by_pk(
+        db, models.Department, {"dept_no": dept_no}, dept_in.model_dump(exclude_unset=True)
+    )
+    commit_and_keep(db)
     return db_dept
 
 
-def delete_department(db: Session, db_dept: models.Department) -> None:
-    db.delete(db_dept)
+def delete_department(db: Session, dept_no: str) -> bool:
+    """Returns False if the department does not exist."""
+    deleted = delete_by_pk(db, models.Department, {"dept_no": dept_no})
     db.commit()
+    return deleted
@@ -1,10 +1,13 @@
+from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from typing import List, Optional
 from app import models, schemas
 from app.security import hash_password
 from datetime import date
-from app.models import Employee
+from app.models import Employee, FAR_FUTURE
+from app.crud import department_stats
+from app.crud.writes import check_version, commit_and_keep, update_by_pk
 
 DEFAULT_SICK_LEAVE_QUOTA = 5
 DEFAULT_PAID_LEAVE_QUOTA = 10
@@ -49,7 +52,7 @@ def create_employee(db: Session, employee_in: schemas.EmployeeCreate) -> models.
     db.add(auth_user)
 
     start_date = employee.hire_date
-    far_future = date(9999, 1, 1)
+    far_future = FAR_FUTURE
 
     # ---- Dept assignment (dept_emp) ----
     db.add(
@@ -60,6 +63,9 @@ def create_employee(db: Session, employee_in: schemas.EmployeeCreate) -> models.
             to_date=far_future,
         )
     )
+    department_stats.adjust_department_stats(
+        db, dept_no, employee.gender, employee.hire_date, +1
+    )
 
     # ---- Starting salary (salaries) ----
     db.add(
@@ -100,26 +106,131 @@ def create_employee(db: Session, employee_in: schemas.EmployeeCreate) -> models.
         )
     )
 
-    db.commit()
-    db.refresh(employee)
+    commit_and_keep(db)
     return employee
 
 
 def update_employee(
-    db: Session, db_employee: models.Employee, employee_in: schemas.EmployeeUpdate
-) -> models.Employee:
-    data = employee_in.model_dump(exclude_unset=True)
+    db: Session,
+    emp_no: int,
+    employee_in: schemas.EmployeeUpdate,
+    expected_version: Optional[int] = None,
+) -> Optional[models.Employee]:
+    """
+    Returns the updated employee, or None if it does not exist.
+    409 if expected_version is given and the row is at another version.
+    """
+    data = employee_in.model_dump(exclude_unset=True, exclude={"version"})
+
+    if not {"gender", "hire_date"} & data.keys():
+        # Name / birth date only: a single UPDATE, nothing else depends on them.
+        db_employee = update_by_pk(
+            db, models.Employee, {"emp_no": emp_no}, data, expected_version=expected_version
+        )
+        commit_and_keep(db)
+        return db_employee
+
+    db_employee = get_employee(db, emp_no)
+    if db_employee is None:
+        return None
+    check_version(db_employee, expected_version)
+
+    # gender / hire_date feed the department aggregates: move the employee's
+    # contribution from the old values to the new ones.
+    stats_changed = any(
+        key in data and data[key] != getattr(db_employee, key)
+        for key in ("gender", "hire_date")
+    )
+    if stats_changed:
+        dept_nos = department_stats.get_current_dept_nos(db, db_employee.emp_no)
+        for dept_no in dept_nos:
+            department_stats.adjust_department_stats(
+                db, dept_no, db_employee.gender, db_employee.hire_date, -1
+            )
+
     for key, value in data.items():
         setattr(db_employee, key, value)
+
+    if stats_changed:
+        for dept_no in dept_nos:
+            department_stats.adjust_department_stats(
+                db, dept_no, db_employee.gender, db_employee.hire_date, +1
+            )
+
     db.add(db_employee)
-    db.commit()
-    db.refresh(db_employee)
+    commit_and_keep(db)
+    return db_employee
+
+
+def transfer_employee(
+    db: Session,
+    db_employee: models.Employee,
+    dept_no: str,
+    effective_date: Optional[date] = None,
+) -> models.Employee:
+    """
+    Move an employee to another department.
+    Closes the current dept_emp row(s) at effective_date and opens a new
+    current row, adjusting both departments' aggregates in the same commit.
+    404 if the department does not exist. Moving back to a department the
+    employee was in before reopens that row: dept_emp allows one row per
+    (emp_no, dept_no) in the production schema.
+    """
+    if db.get(models.Department, dept_no) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Department {dept_no} not found"
+        )
+    if effective_date is None:
+        effective_date = date.today()
+
+    rows = (
+        db.query(models.DeptEmp)
+        .filter(
+            models.DeptEmp.emp_no == db_employee.emp_no,
+            or_(models.DeptEmp.to_date == FAR_FUTURE, models.DeptEmp.dept_no == dept_no),
+        )
+        .order_by(models.DeptEmp.from_date.desc())
+        .all()
+    )
+    current_rows = [row for row in rows if row.to_date == FAR_FUTURE]
+    if any(row.dept_no == dept_no for row in current_rows):
+        return db_employee  # already there, nothing to do
+
+    for row in current_rows:
+        row.to_date = effective_date
+        department_stats.adjust_department_stats(
+            db, row.dept_no, db_employee.gender, db_employee.hire_date, -1
+        )
+
+    previous = next((row for row in rows if row.dept_no == dept_no), None)
+    if previous is not None:
+        previous.from_date = effective_date
+        previous.to_date = FAR_FUTURE
+    else:
+        db.add(
+            models.DeptEmp(
+                emp_no=db_employee.emp_no,
+                dept_no=dept_no,
+                from_date=effective_date,
+                to_date=FAR_FUTURE,
+            )
+        )
+    department_stats.adjust_department_stats(
+        db, dept_no, db_employee.gender, db_employee.hire_date, +1
+    )
+
+    commit_and_keep(db)
     return db_employee
 
 
 def delete_employee(db: Session, db_employee: models.Employee) -> None:
+    for dept_no in department_stats.get_current_dept_nos(db, db_employee.emp_no):
+        department_stats.adjust_department_stats(
+            db, dept_no, db_employee.gender, db_employee.hire_date, -1
+        )
     db.delete(db_employee)
-    db.commit()
+    commit_and_keep(db)
 
 def search_employees_by_name(
     db: Session,
@@ -0,0 +1,60 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.crud.writes import commit_and_keep, delete_by_pk
+from app.working_calendar import working_calendar
+
+
+def get_holiday(db: Session, holiday_id: int) -> Optional[models.Holiday]:
+    return db.get(models.Holiday, holiday_id)
+
+
+def get_holidays(
+    db: Session,
+    year: Optional[int] = None,
+    dept_no: Optional[str] = None,
+) -> List[models.Holiday]:
+    """Holidays ordered by date. With dept_no: company-wide plus that department's."""
+    holiday = models.Holiday
+    q = db.query(holiday)
+    if year is not None:
+        q = q.filter(holiday.holiday_date >= date(year, 1, 1), holiday.holiday_date <= date(year, 12, 31))
+    if dept_no is not None:
+        q = q.filter((holiday.dept_no.is_(None)) | (holiday.dept_no == dept_no))
+    return q.order_by(holiday.holiday_date, holiday.holiday_id).all()
+
+
+def create_holiday(db: Session, holiday_in: schemas.HolidayCreate) -> models.Holiday:
+    holiday = models.Holiday
+    duplicate = db.query(holiday.holiday_id).filter(
+        holiday.holiday_date == holiday_in.holiday_date,
+        holiday.dept_no.is_(None) if holiday_in.dept_no is None else holiday.dept_no == holiday_in.dept_no,
+    ).first()
+    if duplicate:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Holiday already exists for that date"
+        )
+    if holiday_in.dept_no is not None and db.get(models.Department, holiday_in.dept_no) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Department not found"
+        )
+    db_holiday = models.Holiday(**holiday_in.model_dump())
+    db.add(db_holiday)
+    commit_and_keep(db)
+    working_calendar.invalidate()
+    return db_holiday
+
+
+def delete_holiday(db: Session, holiday_id: int) -> bool:
+    """Returns False if the holiday does not exist."""
+    deleted = delete_by_pk(db, models.Holiday, {"holiday_id": holiday_id})
+    db.commit()
+    if deleted:
+        working_calendar.invalidate()
+    return deleted
@@ -0,0 +1,105 @@
+"""
+Archival of decided leave requests.
+
+APPROVED, REJECTED and CANCELLED requests that ended and were decided more
+than a retention window ago are moved from employee_leave_requests to
+employee_leave_requests_archive, keeping their leave_id. The hot table then
+only holds open and recent requests, so its indexes (manager inbox,
+overlap checks, listings) stay small however much history accumulates.
+
+Nothing that affects balances is touched: quota rows and the leave ledger
+already reflect these requests, and ledger entries keep pointing at the
+archived leave_id. Reads reach archived requests through
+get_leave_request / get_leave_requests with include_archived=True.
+"""
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import DateTime, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+LEAVE_ARCHIVE_RETENTION_DAYS = int(os.getenv("LEAVE_ARCHIVE_RETENTION_DAYS", "730"))
+ARCHIVE_CHUNK_SIZE = 1000
+CLOSED_STATUSES = ("APPROVED", "REJECTED", "CANCELLED")
+
+# Columns copied as they are; archived_at is added per chunk.
+ARCHIVED_COLUMNS = [
+    column.name
+    for column in models.EmployeeLeaveRequest.__table__.columns
+]
+
+
+def _archivable_filter(cutoff: date):
+    leave = models.EmployeeLeaveRequest
+    cutoff_at = datetime.combine(cutoff, datetime.min.time())
+    return (
+        leave.status.in_(CLOSED_STATUSES),
+        leave.end_date < cutoff,
+        or_(leave.decided_at < cutoff_at, leave.decided_at.is_(None)),
+    )
+
+
+def archive_leave_requests(
+    db: Session,
+    retention_days: int = LEAVE_ARCHIVE_RETENTION_DAYS,
+    today: Optional[date] = None,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Move decided requests whose end_date and decided_at are more than
+    retention_days before `today` into the archive table.
+
+    Works in chunks of chunk_size rows in leave_id order, one transaction
+    each: the chunk is locked (SELECT ... FOR UPDATE), copied with one
+    INSERT ... SELECT and removed with one DELETE, so a request is always
+    in exactly one of the two tables. dry_run only counts.
+
+    Returns {"archived", "chunks", "cutoff"}.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=retention_days)
+    leave = models.EmployeeLeaveRequest
+    archive = models.EmployeeLeaveRequestArchive
+    archivable = _archivable_filter(cutoff)
+    counts = {"archived": 0, "chunks": 0, "cutoff": cutoff}
+    if dry_run:
+        counts["archived"] = db.query(func.count(leave.leave_id)).filter(*archivable).scalar()
+        db.rollback()
+        return counts
+
+    last_leave_id = 0
+    while True:
+        leave_ids = [
+            leave_id
+            for (leave_id,) in db.query(leave.leave_id)
+            .filter(*archivable, leave.leave_id > last_leave_id)
+            .order_by(leave.leave_id)
+            .limit(chunk_size)
+            .with_for_update()
+        ]
+        if not leave_ids:
+            db.rollback()
+            break
+        last_leave_id = leave_ids[-1]
+        db.execute(
+            insert(archive.__table__).from_select(
+                ARCHIVED_COLUMNS + ["archived_at"],
+                select(
+                    *(leave.__table__.c[name] for name in ARCHIVED_COLUMNS),
+                    literal(datetime.utcnow(), DateTime),
+                ).where(leave.leave_id.in_(leave_ids)),
+            )
+        )
+        db.execute(
+            delete(leave)
+            .where(leave.leave_id.in_(leave_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        counts["archived"] += len(leave_ids)
+        counts["chunks"] += 1
+    return counts
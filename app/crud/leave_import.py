@@ -0,0 +1,285 @@
+import csv
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.crud import leave_ledger, leave_quotas
+from app.crud.leave_requests import ACTIVE_STATUSES, MAX_LEAVE_SPAN_DAYS
+from app.manager_resolver import manager_resolver
+from app.recurrence import leave_runs, recurrence_of
+from app.working_calendar import working_calendar
+
+IMPORT_COLUMNS = (
+    "emp_no", "leave_type_id", "start_date", "end_date", "status",
+    "requested_at", "decided_at", "manager_emp_no", "employee_comment", "manager_comment",
+)
+REQUIRED_COLUMNS = ("emp_no", "leave_type_id", "start_date", "end_date")
+STATUSES = ("PENDING", "APPROVED", "REJECTED", "CANCELLED")
+MAX_IMPORT_ROWS = 200000
+IMPORT_CHUNK_SIZE = 1000
+# Rows per IN (...) list when resolving employees / existing leave.
+LOOKUP_BATCH_SIZE = 1000
+
+
+def _parse_row(raw: dict) -> dict:
+    """One CSV record -> insert values (without days_requested). Raises ValueError."""
+    missing = [c for c in REQUIRED_COLUMNS if not (raw.get(c) or "").strip()]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    def optional(name: str) -> Optional[str]:
+        value = (raw.get(name) or "").strip()
+        return value or None
+
+    row = {
+        "emp_no": int(raw["emp_no"]),
+        "leave_type_id": int(raw["leave_type_id"]),
+        "start_date": date.fromisoformat(raw["start_date"].strip()),
+        "end_date": date.fromisoformat(raw["end_date"].strip()),
+        "status": (optional("status") or "PENDING").upper(),
+        "requested_at": datetime.fromisoformat(optional("requested_at")) if optional("requested_at") else None,
+        "decided_at": datetime.fromisoformat(optional("decided_at")) if optional("decided_at") else None,
+        "manager_emp_no": int(optional("manager_emp_no")) if optional("manager_emp_no") else None,
+        "employee_comment": optional("employee_comment"),
+        "manager_comment": optional("manager_comment"),
+    }
+    if row["leave_type_id"] not in (0, 1, 2):
+        raise ValueError("leave_type_id must be 0 (paid), 1 (unpaid) or 2 (sick)")
+    if row["status"] not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    if row["end_date"] < row["start_date"]:
+        raise ValueError("end_date must be after or equal to start_date")
+    if (row["end_date"] - row["start_date"]).days + 1 > MAX_LEAVE_SPAN_DAYS:
+        raise ValueError(f"Leave request may span at most {MAX_LEAVE_SPAN_DAYS} days")
+    for name in ("employee_comment", "manager_comment"):
+        if row[name] is not None and len(row[name]) > 255:
+            raise ValueError(f"{name} is longer than 255 characters")
+    return row
+
+
+def _batches(values: List, size: int = LOOKUP_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _existing_active_leave(db: Session, emp_nos: List[int]) -> Dict[int, List[Tuple[date, date, int]]]:
+    """Active leave per employee as (first, last, leave_id); recurring requests give one per run."""
+    leave = models.EmployeeLeaveRequest
+    intervals: Dict[int, List[Tuple[date, date, int]]] = defaultdict(list)
+    for batch in _batches(emp_nos):
+        for row in (
+            db.query(
+                leave.emp_no, leave.start_date, leave.end_date, leave.leave_id,
+                leave.recurrence_weekdays, leave.recurrence_interval_weeks,
+            )
+            .filter(leave.emp_no.in_(batch), leave.status.in_(ACTIVE_STATUSES))
+        ):
+            intervals[row.emp_no].extend(
+                (first, last, row.leave_id)
+                for first, last in leave_runs(row.start_date, row.end_date, recurrence_of(row))
+            )
+    return intervals
+
+
+def import_leave_requests(
+    db: Session,
+    lines: Iterable[str],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Import leave requests (e.g. history from a previous system) from CSV
+    lines with a header row; columns are IMPORT_COLUMNS, of which
+    REQUIRED_COLUMNS must be filled. status defaults to PENDING.
+
+    Every row is validated before anything is written:
+      - format, dates, leave type and status, per row,
+      - employees and given manager_emp_nos, one IN query per
+        LOOKUP_BATCH_SIZE emp_nos,
+      - managers (when not given) and departments from one ManagerResolver
+        snapshot; days_requested from the working-day calendar,
+      - overlaps between PENDING/APPROVED rows, within the file and against
+        existing requests (one IN query per batch),
+      - quotas per (emp_no, year, leave_type_id) in aggregate: the APPROVED
+        days of a key must fit its remaining quota together, otherwise all
+        of that key's APPROVED rows fail; each PENDING row must fit what is
+        left after them.
+
+    Valid rows are then inserted with executemany in chunks of about
+    chunk_size rows, one transaction per chunk (all rows of an employee
+    land in the same chunk). Approved days are deducted per key with the
+    guarded quota UPDATE and recorded as one DEDUCTION ledger entry per key.
+    Imported requests do not emit change events.
+
+    Returns {"imported", "failed", "errors": [{"row", "detail"}]}; row is
+    the 1-based line number in the file (the header is line 1).
+    """
+    reader = csv.DictReader(lines)
+    errors: List[dict] = []
+    if reader.fieldnames is None:
+        return {"imported": 0, "failed": 0, "errors": []}
+    unknown_columns = set(reader.fieldnames) - set(IMPORT_COLUMNS)
+    missing_columns = set(REQUIRED_COLUMNS) - set(reader.fieldnames)
+    if unknown_columns or missing_columns:
+        detail = []
+        if missing_columns:
+            detail.append(f"missing columns: {', '.join(sorted(missing_columns))}")
+        if unknown_columns:
+            detail.append(f"unknown columns: {', '.join(sorted(unknown_columns))}")
+        return {"imported": 0, "failed": 1, "errors": [{"row": 1, "detail": "; ".join(detail)}]}
+
+    rows: Dict[int, dict] = {}
+    for raw in reader:
+        line_no = reader.line_num
+        if len(rows) + len(errors) >= MAX_IMPORT_ROWS:
+            errors.append({"row": line_no, "detail": f"More than {MAX_IMPORT_ROWS} rows; the rest was not read"})
+            break
+        try:
+            rows[line_no] = _parse_row(raw)
+        except (ValueError, TypeError) as exc:
+            errors.append({"row": line_no, "detail": str(exc)})
+
+    def fail(line_no: int, detail: str) -> None:
+        rows.pop(line_no, None)
+        errors.append({"row": line_no, "detail": detail})
+
+    # Employees and explicitly given managers, in batches.
+    emp_nos = sorted(
+        {row["emp_no"] for row in rows.values()}
+        | {row["manager_emp_no"] for row in rows.values() if row["manager_emp_no"] is not None}
+    )
+    known = set()
+    for batch in _batches(emp_nos):
+        known.update(
+            emp_no for (emp_no,) in db.query(models.Employee.emp_no)
+            .filter(models.Employee.emp_no.in_(batch))
+        )
+    for line_no, row in list(rows.items()):
+        if row["emp_no"] not in known:
+            fail(line_no, f"Employee with emp_no {row['emp_no']} not found")
+        elif row["manager_emp_no"] is not None and row["manager_emp_no"] not in known:
+            fail(line_no, f"Manager with emp_no {row['manager_emp_no']} not found")
+
+    # Managers, departments and working days from one resolver snapshot.
+    managers = manager_resolver.resolve_many(db, {row["emp_no"] for row in rows.values()})
+    now = datetime.utcnow()
+    for line_no, row in list(rows.items()):
+        if row["manager_emp_no"] is None:
+            row["manager_emp_no"] = managers.get(row["emp_no"])
+        dept_no = manager_resolver.current_dept(db, row["emp_no"])
+        row["days_requested"] = working_calendar.working_days(db, row["start_date"], row["end_date"], dept_no)
+        if row["days_requested"] <= 0:
+            fail(line_no, "Leave request must include at least 1 working day")
+            continue
+        row["requested_at"] = row["requested_at"] or now
+        if row["status"] != "PENDING" and row["decided_at"] is None:
+            row["decided_at"] = now
+
+    # Overlaps: sweep each employee's active rows together with existing leave.
+    existing = _existing_active_leave(db, sorted({row["emp_no"] for row in rows.values()}))
+    by_emp: Dict[int, List[Tuple[date, date, Optional[int], Optional[int]]]] = defaultdict(list)
+    for line_no, row in rows.items():
+        if row["status"] in ACTIVE_STATUSES:
+            by_emp[row["emp_no"]].append((row["start_date"], row["end_date"], line_no, None))
+    for emp_no, intervals in by_emp.items():
+        intervals.extend((start, end, None, leave_id) for start, end, leave_id in existing.get(emp_no, ()))
+        # Existing leave sorts first on equal start, so the file row is the one reported.
+        intervals.sort(key=lambda interval: (interval[0], interval[2] is not None, interval[1]))
+        reach = None  # furthest-reaching interval so far
+        for interval in intervals:
+            start, end, line_no, _ = interval
+            if reach is not None and start <= reach[1] and line_no is not None:
+                other = f"row {reach[2]}" if reach[2] is not None else f"leave request {reach[3]}"
+                fail(line_no, f"Overlaps {other}")
+                continue
+            if reach is None or end > reach[1]:
+                reach = interval
+
+    # Quotas, aggregated per (emp_no, year, leave_type_id).
+    keyed: Dict[tuple, List[int]] = defaultdict(list)
+    for line_no, row in rows.items():
+        if row["status"] in ACTIVE_STATUSES and row["leave_type_id"] in leave_quotas.DEFAULT_QUOTAS:
+            keyed[(row["emp_no"], row["start_date"].year, row["leave_type_id"])].append(line_no)
+    remaining = {}
+    quota = models.EmployeeLeaveQuota
+    key_emp_nos = sorted({key[0] for key in keyed})
+    for batch in _batches(key_emp_nos):
+        for emp_no, year, leave_type_id, days in db.query(
+            quota.emp_no, quota.year, quota.leave_type_id, quota.annual_quota_days
+        ).filter(quota.emp_no.in_(batch)):
+            remaining[(emp_no, year, leave_type_id)] = days
+    for key, line_nos in keyed.items():
+        available = remaining.get(key, leave_quotas.DEFAULT_QUOTAS[key[2]])
+        approved = [n for n in line_nos if rows[n]["status"] == "APPROVED"]
+        approved_days = sum(rows[n]["days_requested"] for n in approved)
+        if approved_days > available:
+            for line_no in approved:
+                fail(line_no, "Insufficient quota")
+        else:
+            available -= approved_days
+        for line_no in line_nos:
+            if line_no in rows and rows[line_no]["status"] == "PENDING":
+                if rows[line_no]["days_requested"] > available:
+                    fail(line_no, "Insufficient quota")
+
+    if dry_run:
+        errors.sort(key=lambda error: error["row"])
+        return {"imported": len(rows), "failed": len(errors), "errors": errors}
+
+    # Write, one transaction per chunk of whole employees.
+    chunks: List[List[int]] = [[]]
+    last_emp_no = None
+    for line_no in sorted(rows, key=lambda n: (rows[n]["emp_no"], n)):
+        emp_no = rows[line_no]["emp_no"]
+        if len(chunks[-1]) >= chunk_size and emp_no != last_emp_no:
+            chunks.append([])
+        chunks[-1].append(line_no)
+        last_emp_no = emp_no
+
+    imported = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        deductions: Dict[tuple, int] = defaultdict(int)
+        pending: Dict[tuple, int] = defaultdict(int)
+        contributors: Dict[tuple, List[int]] = defaultdict(list)
+        for line_no in chunk:
+            row = rows[line_no]
+            if row["leave_type_id"] not in leave_quotas.DEFAULT_QUOTAS:
+                continue
+            key = (row["emp_no"], row["start_date"].year, row["leave_type_id"])
+            if row["status"] == "APPROVED":
+                deductions[key] += row["days_requested"]
+                contributors[key].append(line_no)
+            elif row["status"] == "PENDING":
+                pending[key] += row["days_requested"]
+
+        leave_ledger.ensure_balances(db, set(deductions) | set(pending))
+        leave_quotas.ensure_quotas(db, deductions.keys())
+        for key, days in list(deductions.items()):
+            # Guarded: a concurrent approval may have used the quota meanwhile.
+            if not leave_quotas.deduct_quota(db, *key, days):
+                del deductions[key]
+                for line_no in contributors[key]:
+                    chunk.remove(line_no)
+                    fail(line_no, "Insufficient quota")
+
+        if chunk:
+            db.execute(
+                models.EmployeeLeaveRequest.__table__.insert(),
+                [{column: rows[line_no][column] for column in (*IMPORT_COLUMNS, "days_requested")}
+                 for line_no in chunk],
+            )
+        leave_ledger.post(
+            db,
+            [leave_ledger.entry(key, "DEDUCTION", days, note="CSV import") for key, days in deductions.items()],
+            pending,
+        )
+        db.commit()
+        imported += len(chunk)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
@@ -0,0 +1,327 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, extract, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.crud import leave_quotas
+
+Key = Tuple[int, int, int]  # (emp_no, year, leave_type_id)
+
+# Which balance column each ledger entry type moves, and in which direction.
+ENTRY_EFFECTS = {
+    "GRANT": ("entitled_days", 1),
+    "ADJUSTMENT": ("entitled_days", 1),
+    "DEDUCTION": ("used_days", 1),
+    "REVERSAL": ("used_days", -1),
+}
+
+
+def leave_key(leave) -> Optional[Key]:
+    """Balance key a leave request counts against, or None if its type has no quota."""
+    if leave.leave_type_id not in leave_quotas.DEFAULT_QUOTAS:
+        return None
+    return (leave.emp_no, leave.start_date.year, leave.leave_type_id)
+
+
+def get_balances(db: Session, emp_no: int, year: int) -> List[dict]:
+    """
+    Balances for every quota'd leave type of an employee/year, read from the
+    leave_balance snapshot (primary-key lookup).
+
+    Keys that have never seen a ledger movement have no snapshot yet; they
+    are reported from the quota row (or the default quota) with nothing used
+    or pending, without writing anything.
+    """
+    snapshots = {
+        row.leave_type_id: row
+        for row in db.query(models.LeaveBalance).filter(
+            models.LeaveBalance.emp_no == emp_no,
+            models.LeaveBalance.year == year,
+        )
+    }
+    missing = [t for t in leave_quotas.DEFAULT_QUOTAS if t not in snapshots]
+    quotas = {}
+    if missing:
+        quotas = {
+            q.leave_type_id: q.annual_quota_days
+            for q in leave_quotas.get_leave_quotas(db, emp_no=emp_no, year=year)
+        }
+
+    balances = []
+    for leave_type_id, default in leave_quotas.DEFAULT_QUOTAS.items():
+        row = snapshots.get(leave_type_id)
+        if row is not None:
+            entitled, used, pending = row.entitled_days, row.used_days, row.pending_days
+        else:
+            entitled, used, pending = quotas.get(leave_type_id, default), 0, 0
+        balances.append({
+            "emp_no": emp_no,
+            "year": year,
+            "leave_type_id": leave_type_id,
+            "entitled_days": entitled,
+            "used_days": used,
+            "pending_days": pending,
+            "available_days": entitled - used,
+        })
+    return balances
+
+
+def ensure_balances(db: Session, keys: Iterable[Key]) -> None:
+    """
+    Seed a leave_balance snapshot (plus its opening GRANT entry) for every key
+    that does not have one yet. The opening entitlement is the current quota
+    row value, or the default quota if the row does not exist.
+
+    Must run BEFORE any quota deduction in the same transaction, so the
+    opening balance is taken from the untouched quota. Does NOT commit.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+
+    balance = models.LeaveBalance
+    existing = set(
+        db.query(balance.emp_no, balance.year, balance.leave_type_id)
+        .filter(balance.emp_no.in_({k[0] for k in keys}))
+        .filter(balance.year.in_({k[1] for k in keys}))
+        .all()
+    )
+    missing = keys - existing
+    if not missing:
+        return
+
+    quota = models.EmployeeLeaveQuota
+    quota_days = {
+        (emp_no, year, leave_type_id): days
+        for emp_no, year, leave_type_id, days in db.query(
+            quota.emp_no, quota.year, quota.leave_type_id, quota.annual_quota_days
+        )
+        .filter(quota.emp_no.in_({k[0] for k in missing}))
+        .filter(quota.year.in_({k[1] for k in missing}))
+    }
+
+    now = datetime.utcnow()
+    for key in missing:
+        emp_no, year, leave_type_id = key
+        entitled = quota_days.get(key, leave_quotas.DEFAULT_QUOTAS[leave_type_id])
+        try:
+            # Savepoint: a concurrent transaction may seed the same key first.
+            with db.begin_nested():
+                db.execute(insert(balance.__table__).values(
+                    emp_no=emp_no, year=year, leave_type_id=leave_type_id,
+                    entitled_days=entitled, used_days=0, pending_days=0,
+                ))
+                db.execute(insert(models.LeaveLedgerEntry.__table__).values(
+                    emp_no=emp_no, year=year, leave_type_id=leave_type_id,
+                    entry_type="GRANT", days=entitled, created_at=now,
+                    note="opening balance",
+                ))
+        except IntegrityError:
+            pass
+
+
+def post(
+    db: Session,
+    entries: Iterable[dict] = (),
+    pending: Optional[Dict[Key, int]] = None,
+    seeded: bool = False,
+) -> None:
+    """
+    Append ledger entries and move the matching snapshots in one go.
+
+    entries: dicts with emp_no, year, leave_type_id, entry_type, days and
+             optionally leave_id / note.
+    pending: {key: delta} changes to pending_days (pending requests are not
+             ledger movements; they live in employee_leave_requests).
+    seeded:  the caller knows every snapshot exists; skips ensure_balances.
+
+    Entries go out as one executemany INSERT; snapshot deltas are summed per
+    key into one UPDATE each. Seeds missing snapshots first. Does NOT commit.
+    """
+    entries = list(entries)
+    pending = {k: v for k, v in (pending or {}).items() if v}
+    deltas: Dict[Key, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for e in entries:
+        column, sign = ENTRY_EFFECTS[e["entry_type"]]
+        key = (e["emp_no"], e["year"], e["leave_type_id"])
+        deltas[key][column] += sign * e["days"]
+    for key, delta in pending.items():
+        deltas[key]["pending_days"] += delta
+    if not deltas:
+        return
+
+    if not seeded:
+        ensure_balances(db, deltas.keys())
+
+    if entries:
+        now = datetime.utcnow()
+        db.execute(
+            insert(models.LeaveLedgerEntry.__table__),
+            [
+                {
+                    "emp_no": e["emp_no"],
+                    "year": e["year"],
+                    "leave_type_id": e["leave_type_id"],
+                    "entry_type": e["entry_type"],
+                    "days": e["days"],
+                    "leave_id": e.get("leave_id"),
+                    "note": e.get("note"),
+                    "created_at": now,
+                }
+                for e in entries
+            ],
+        )
+
+    balance = models.LeaveBalance
+    for (emp_no, year, leave_type_id), delta in deltas.items():
+        values = {
+            column: getattr(balance, column) + amount
+            for column, amount in delta.items()
+            if amount
+        }
+        if not values:
+            continue
+        db.execute(
+            update(balance)
+            .where(
+                balance.emp_no == emp_no,
+                balance.year == year,
+                balance.leave_type_id == leave_type_id,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def entry(key: Key, entry_type: str, days: int, leave_id: Optional[int] = None,
+          note: Optional[str] = None) -> dict:
+    emp_no, year, leave_type_id = key
+    return {
+        "emp_no": emp_no,
+        "year": year,
+        "leave_type_id": leave_type_id,
+        "entry_type": entry_type,
+        "days": days,
+        "leave_id": leave_id,
+        "note": note,
+    }
+
+
+def rebuild_balances(db: Session) -> int:
+    """
+    Recompute every leave_balance row from scratch:
+      entitled/used from one grouped scan of leave_ledger (INSERT ... SELECT),
+      pending from one grouped scan of PENDING leave requests.
+    Returns the number of snapshot rows written. Commits.
+    """
+    ledger = models.LeaveLedgerEntry
+    balance = models.LeaveBalance
+
+    def summed(*types):
+        return func.coalesce(
+            func.sum(case((ledger.entry_type.in_(types), ledger.days), else_=0)), 0
+        )
+
+    db.execute(delete(balance))
+    db.execute(
+        insert(balance.__table__).from_select(
+            ["emp_no", "year", "leave_type_id", "entitled_days", "used_days", "pending_days"],
+            select(
+                ledger.emp_no,
+                ledger.year,
+                ledger.leave_type_id,
+                summed("GRANT", "ADJUSTMENT"),
+                summed("DEDUCTION") - summed("REVERSAL"),
+                0,
+            ).group_by(ledger.emp_no, ledger.year, ledger.leave_type_id),
+        )
+    )
+
+    leave = models.EmployeeLeaveRequest
+    year = extract("year", leave.start_date)
+    pending_rows = (
+        db.query(leave.emp_no, year, leave.leave_type_id, func.sum(leave.days_requested))
+        .filter(
+            leave.status == "PENDING",
+            leave.leave_type_id.in_(list(leave_quotas.DEFAULT_QUOTAS)),
+        )
+        .group_by(leave.emp_no, year, leave.leave_type_id)
+        .all()
+    )
+    pending = {
+        (emp_no, int(y), leave_type_id): int(days)
+        for emp_no, y, leave_type_id, days in pending_rows
+    }
+    # Keys with pending requests but no ledger history get seeded by post().
+    post(db, pending=pending)
+
+    db.commit()
+    return db.query(func.count()).select_from(balance).scalar()
+
+
+def _snapshot(db: Session, key: Key) -> Optional[models.LeaveBalance]:
+    return db.get(models.LeaveBalance, key, populate_existing=True)
+
+
+def sync_available(db: Session, key: Key, new_available: int, note: Optional[str] = None) -> None:
+    """
+    Record a direct quota edit (HR setting annual_quota_days) as an
+    ADJUSTMENT of the entitlement, so entitled - used keeps matching the
+    quota row. Keys without a snapshot need nothing: they are seeded from
+    the quota row on first use. Does NOT commit.
+    """
+    snapshot = _snapshot(db, key)
+    if snapshot is None:
+        return
+    delta = new_available - (snapshot.entitled_days - snapshot.used_days)
+    if delta:
+        post(db, [entry(key, "ADJUSTMENT", delta, note=note)])
+
+
+def sync_available_many(db: Session, new_available: Dict[Key, int], note: Optional[str] = None) -> None:
+    """sync_available for many keys: one snapshot SELECT, one post(). Does NOT commit."""
+    if not new_available:
+        return
+    balance = models.LeaveBalance
+    snapshots = {
+        (emp_no, year, leave_type_id): entitled - used
+        for emp_no, year, leave_type_id, entitled, used in db.query(
+            balance.emp_no, balance.year, balance.leave_type_id,
+            balance.entitled_days, balance.used_days,
+        )
+        .filter(balance.emp_no.in_({k[0] for k in new_available}))
+        .filter(balance.year.in_({k[1] for k in new_available}))
+    }
+    entries = [
+        entry(key, "ADJUSTMENT", days - snapshots[key], note=note)
+        for key, days in new_available.items()
+        if key in snapshots and days != snapshots[key]
+    ]
+    post(db, entries)
+
+
+def close_balance(db: Session, key: Key) -> None:
+    """
+    The quota row is being deleted: net the key's ledger to zero and drop
+    its snapshot. Does NOT commit.
+    """
+    snapshot = _snapshot(db, key)
+    if snapshot is None:
+        return
+    entries = []
+    if snapshot.entitled_days:
+        entries.append(entry(key, "ADJUSTMENT", -snapshot.entitled_days, note="quota deleted"))
+    if snapshot.used_days:
+        entries.append(entry(key, "REVERSAL", snapshot.used_days, note="quota deleted"))
+    post(db, entries)
+    db.execute(
+        delete(models.LeaveBalance).where(
+            models.LeaveBalance.emp_no == key[0],
+            models.LeaveBalance.year == key[1],
+            models.LeaveBalance.leave_type_id == key[2],
+        ).execution_options(synchronize_session=False)
+    )
@@ -1,8 +1,23 @@
 from datetime import date
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, exists, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import Session
 
 from app import models, schemas
+from app.crud.writes import commit_and_keep, delete_by_pk, update_by_pk
+from app.models import FAR_FUTURE
+
+# Default annual quota per leave type. Unpaid leave (1) has no quota.
+DEFAULT_QUOTAS = {
+    0: 10,  # paid leave
+    2: 5,   # sick leave
+}
+
+MAX_QUOTA_PAGE_SIZE = 1000
+
+# Rows per transaction in bulk_upsert_quotas.
+BULK_UPSERT_CHUNK_SIZE = 1000
 
 
 def get_leave_quota(
@@ -19,83 +34,509 @@ def get_leave_quota(
     )
 
 
-def get_leave_quotas(
-    db: Session,
+def _filtered_quotas(
+    q,
     emp_no: Optional[int] = None,
     year: Optional[int] = None,
     leave_type_id: Optional[int] = None,
-) -> List[models.EmployeeLeaveQuota]:
-    q = db.query(models.EmployeeLeaveQuota)
+    after: Optional[Tuple[int, int, int]] = None,
+):
+    quota = models.EmployeeLeaveQuota
     if emp_no is not None:
-        q = q.filter(models.EmployeeLeaveQuota.emp_no == emp_no)
+        q = q.filter(quota.emp_no == emp_no)
     if year is not None:
-        q = q.filter(models.EmployeeLeaveQuota.year == year)
+        q = q.filter(quota.year == year)
     if leave_type_id is not None:
-        q = q.filter(models.EmployeeLeaveQuota.leave_type_id == leave_type_id)
+        q = q.filter(quota.leave_type_id == leave_type_id)
+    if after is not None:
+        after_emp_no, after_year, after_leave_type_id = after
+        q = q.filter(
+            or_(
+                quota.emp_no > after_emp_no,
+                and_(quota.emp_no == after_emp_no, quota.year > after_year),
+                and_(
+                    quota.emp_no == after_emp_no,
+                    quota.year == after_year,
+                    quota.leave_type_id > after_leave_type_id,
+                ),
+            )
+        )
+    return q.order_by(quota.emp_no, quota.year, quota.leave_type_id)
+
+
+def get_leave_quotas(
+    db: Session,
+    emp_no: Optional[int] = None,
+    year: Optional[int] = None,
+    leave_type_id: Optional[int] = None,
+    after: Optional[Tuple[int, int, int]] = None,
+    limit: Optional[int] = None,
+) -> List[models.EmployeeLeaveQuota]:
+    """
+    Quota rows in primary-key order (emp_no, year, leave_type_id).
+
+    Keyset pagination: pass the primary key of the last row of the previous
+    page as `after`; every page is then a range scan of the primary key.
+    """
+    q = _filtered_quotas(
+        db.query(models.EmployeeLeaveQuota), emp_no, year, leave_type_id, after
+    )
+    if limit is not None:
+        q = q.limit(min(limit, MAX_QUOTA_PAGE_SIZE))
     return q.all()
 
 
+def iter_leave_quota_rows(
+    db: Session,
+    emp_no: Optional[int] = None,
+    year: Optional[int] = None,
+    leave_type_id: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Every matching quota row as a plain dict, in primary-key order, read
+    through a server-side cursor batch_size rows at a time. Nothing is loaded
+    into the session, so memory stays bounded however many rows match.
+    """
+    quota = models.EmployeeLeaveQuota
+    q = _filtered_quotas(
+        db.query(quota.emp_no, quota.year, quota.leave_type_id, quota.annual_quota_days),
+        emp_no, year, leave_type_id,
+    ).execution_options(stream_results=True, yield_per=batch_size)
+    for row in q:
+        yield row._asdict()
+
+
 def create_leave_quota(
     db: Session, quota_in: schemas.LeaveQuotaCreate
 ) -> models.EmployeeLeaveQuota:
+    from app.crud import leave_ledger
+
     quota = models.EmployeeLeaveQuota(**quota_in.model_dump())
+    leave_ledger.sync_available(
+        db, (quota.emp_no, quota.year, quota.leave_type_id), quota.annual_quota_days,
+        note="quota created",
+    )
     db.add(quota)
-    db.commit()
-    db.refresh(quota)
+    commit_and_keep(db)
     return quota
 
 
 def update_leave_quota(
     db: Session,
-    db_quota: models.EmployeeLeaveQuota,
+    emp_no: int,
+    year: int,
+    leave_type_id: int,
     quota_in: schemas.LeaveQuotaUpdate,
-) -> models.EmployeeLeaveQuota:
-    data = quota_in.model_dump(exclude_unset=True)
-    for key, value in data.items():
-        setattr(db_quota, key, value)
-    db.add(db_quota)
-    db.commit()
-    db.refresh(db_quota)
+    expected_version: Optional[int] = None,
+) -> Optional[models.EmployeeLeaveQuota]:
+    """
+    Returns the updated quota, or None if it does not exist.
+    409 if expected_version is given and the row is at another version.
+    """
+    from app.crud import leave_ledger
+
+    data = quota_in.model_dump(exclude_unset=True, exclude={"version"})
+    db_quota = update_by_pk(
+        db, models.EmployeeLeaveQuota,
+        {"emp_no": emp_no, "year": year, "leave_type_id": leave_type_id}, data,
+        expected_version=expected_version,
+    )
+    if db_quota is None:
+        db.rollback()
+        return None
+    if data.get("annual_quota_days") is not None:
+        leave_ledger.sync_available(
+            db, (emp_no, year, leave_type_id), data["annual_quota_days"], note="quota updated",
+        )
+    commit_and_keep(db)
     return db_quota
 
 
-def delete_leave_quota(db: Session, db_quota: models.EmployeeLeaveQuota) -> None:
-    db.delete(db_quota)
+def delete_leave_quota(db: Session, emp_no: int, year: int, leave_type_id: int) -> bool:
+    """Returns False if the quota does not exist."""
+    from app.crud import leave_ledger
+
+    if not delete_by_pk(
+        db, models.EmployeeLeaveQuota,
+        {"emp_no": emp_no, "year": year, "leave_type_id": leave_type_id},
+    ):
+        db.rollback()
+        return False
+    leave_ledger.close_balance(db, (emp_no, year, leave_type_id))
     db.commit()
+    return True
+
+
+def _quota_pk(table):
+    return [table.c.emp_no, table.c.year, table.c.leave_type_id]
+
+
+QUOTA_COLUMNS = ("emp_no", "year", "leave_type_id", "annual_quota_days")
+
+
+def _bound_rows(rows: List[dict]) -> List[dict]:
+    return [{f"b_{name}": row[name] for name in QUOTA_COLUMNS} for row in rows]
+
+
+def _insert_missing_stmt(table):
+    """
+    Portable insert-if-missing, one row per parameter set:
+    INSERT ... SELECT :values WHERE NOT EXISTS (the same primary key).
+    """
+    return insert(table).from_select(
+        list(QUOTA_COLUMNS),
+        select(*(bindparam(f"b_{name}", type_=table.c[name].type) for name in QUOTA_COLUMNS))
+        .where(~exists().where(*(column == bindparam(f"b_{column.name}") for column in _quota_pk(table)))),
+    )
+
+
+def insert_quotas_if_missing(db: Session, rows: List[dict]) -> None:
+    """
+    INSERT quota rows ({emp_no, year, leave_type_id, annual_quota_days}),
+    leaving existing ones untouched, as one executemany in the dialect's
+    upsert syntax:
+      MySQL:           INSERT ... ON DUPLICATE KEY UPDATE annual_quota_days = annual_quota_days
+      SQLite/Postgres: INSERT ... ON CONFLICT (pk) DO NOTHING
+      others:          INSERT ... SELECT ... WHERE NOT EXISTS
+    Does NOT commit.
+    """
+    if not rows:
+        return
+    table = models.EmployeeLeaveQuota.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        db.execute(stmt.on_duplicate_key_update(annual_quota_days=table.c.annual_quota_days), rows)
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        db.execute(stmt.on_conflict_do_nothing(index_elements=_quota_pk(table)), rows)
+    else:
+        db.execute(_insert_missing_stmt(table), _bound_rows(rows))
+
+
+def upsert_quotas(db: Session, rows: List[dict]) -> None:
+    """
+    INSERT quota rows, overwriting annual_quota_days (and bumping version)
+    of existing ones, in the dialect's upsert syntax. Other dialects get the
+    portable two-step: a guarded UPDATE of the existing rows, then the
+    insert-if-missing for the rest. Does NOT commit.
+    """
+    if not rows:
+        return
+    table = models.EmployeeLeaveQuota.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        db.execute(stmt.on_duplicate_key_update(
+            annual_quota_days=stmt.inserted.annual_quota_days, version=table.c.version + 1
+        ), rows)
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=_quota_pk(table),
+            set_={"annual_quota_days": stmt.excluded.annual_quota_days, "version": table.c.version + 1},
+        ), rows)
+    else:
+        _upsert_portable(db, rows)
+
+
+def _upsert_portable(db: Session, rows: List[dict]) -> None:
+    table = models.EmployeeLeaveQuota.__table__
+    bound = _bound_rows(rows)
+    db.execute(
+        update(table)
+        .where(*(column == bindparam(f"b_{column.name}") for column in _quota_pk(table)))
+        .values(annual_quota_days=bindparam("b_annual_quota_days"), version=table.c.version + 1),
+        bound,
+    )
+    db.execute(_insert_missing_stmt(table), bound)
 
 
 def get_or_create_quota(
     db: Session, emp_no: int, leave_type_id: int, year: Optional[int] = None
 ) -> models.EmployeeLeaveQuota:
     """
-    Get existing quota or create with default values.
+    Get existing quota or create with default values, race-free.
     Default quotas: sick=5 days, paid=10 days.
     Unpaid leaves (type 1) don't have quotas.
+
+    On SQLite/Postgres this is a single
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNING round trip. MySQL has no
+    RETURNING, so it is INSERT ... ON DUPLICATE KEY UPDATE followed by a
+    primary-key SELECT. Either way two concurrent callers can no longer
+    collide on the primary key. Does NOT commit.
     """
     if year is None:
         year = date.today().year
     
-    # Default quota values based on leave type
-    default_quotas = {
-        0: 10,  # paid leave
-        2: 5,   # sick leave
-    }
-    
-    if leave_type_id not in default_quotas:
+    if leave_type_id not in DEFAULT_QUOTAS:
         raise ValueError(f"Invalid leave_type_id {leave_type_id} for quota. Only paid (0) and sick (2) have quotas.")
     
-    quota = get_leave_quota(db, emp_no, year, leave_type_id)
-    
-    if quota is None:
-        # Create quota with default value
-        quota = models.EmployeeLeaveQuota(
-            emp_no=emp_no,
-            year=year,
-            leave_type_id=leave_type_id,
-            annual_quota_days=default_quotas[leave_type_id],
+    values = {
+        "emp_no": emp_no,
+        "year": year,
+        "leave_type_id": leave_type_id,
+        "annual_quota_days": DEFAULT_QUOTAS[leave_type_id],
+    }
+    quota = models.EmployeeLeaveQuota
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        # No-op DO UPDATE (rather than DO NOTHING) so RETURNING yields the
+        # existing row too.
+        stmt = (
+            insert(quota)
+            .values(**values)
+            .on_conflict_do_update(
+                index_elements=_quota_pk(quota.__table__),
+                set_={"annual_quota_days": quota.__table__.c.annual_quota_days},
+            )
+            .returning(quota)
         )
-        db.add(quota)
+        return db.scalars(stmt, execution_options={"populate_existing": True}).one()
+
+    insert_quotas_if_missing(db, [values])
+    return get_leave_quota(db, emp_no, year, leave_type_id)
+
+
+def ensure_quotas(db: Session, keys: Iterable[Tuple[int, int, int]]) -> None:
+    """
+    Make sure a quota row exists for every (emp_no, year, leave_type_id) key,
+    inserting the defaults for missing ones with a single executemany
+    insert-if-missing. Does NOT commit.
+    """
+    rows = [
+        {
+            "emp_no": emp_no,
+            "year": year,
+            "leave_type_id": leave_type_id,
+            "annual_quota_days": DEFAULT_QUOTAS[leave_type_id],
+        }
+        for emp_no, year, leave_type_id in set(keys)
+        if leave_type_id in DEFAULT_QUOTAS
+    ]
+    insert_quotas_if_missing(db, rows)
+
+
+def restore_quota(db: Session, emp_no: int, year: int, leave_type_id: int, days: int) -> None:
+    """Give days back to a quota (undoing an approval). Does NOT commit."""
+    quota = models.EmployeeLeaveQuota
+    db.execute(
+        update(quota)
+        .where(
+            quota.emp_no == emp_no,
+            quota.year == year,
+            quota.leave_type_id == leave_type_id,
+        )
+        .values(annual_quota_days=quota.annual_quota_days + days, version=quota.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def deduct_quota(db: Session, emp_no: int, year: int, leave_type_id: int, days: int) -> bool:
+    """
+    Atomically subtract days from a quota inside the database:
+
+        UPDATE employee_leave_quota
+           SET annual_quota_days = annual_quota_days - :days
+         WHERE <pk> AND annual_quota_days >= :days
+
+    The row lock taken by the UPDATE serialises concurrent approvals, so no
+    deduction is lost. Returns False (nothing changed) if the quota row is
+    missing or has fewer than `days` left. Does NOT commit.
+    """
+    quota = models.EmployeeLeaveQuota
+    result = db.execute(
+        update(quota)
+        .where(
+            quota.emp_no == emp_no,
+            quota.year == year,
+            quota.leave_type_id == leave_type_id,
+            quota.annual_quota_days >= days,
+        )
+        .values(annual_quota_days=quota.annual_quota_days - days, version=quota.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def backfill_quotas(
+    db: Session,
+    year: int,
+    quotas: Optional[Dict[int, int]] = None,
+    chunk_size: int = 50000,
+) -> Tuple[int, int]:
+    """
+    Create the missing (emp_no, year, leave_type_id) quota rows for every
+    employee, set-based:
+
+        INSERT INTO employee_leave_quota (...)
+        SELECT e.emp_no, :year, :type, :days FROM employees e
+         WHERE e.emp_no >= :lo AND e.emp_no < :hi
+           AND NOT EXISTS (SELECT 1 FROM employee_leave_quota q WHERE <pk matches>)
+
+    One statement per (leave type, emp_no chunk), committed per chunk so an
+    interrupted run can simply be restarted. Existing rows are never touched.
+
+    quotas maps leave_type_id -> days and defaults to DEFAULT_QUOTAS.
+    Returns (created, skipped).
+    """
+    if quotas is None:
+        quotas = DEFAULT_QUOTAS
+    for leave_type_id in quotas:
+        if leave_type_id not in DEFAULT_QUOTAS:
+            raise ValueError(f"Invalid leave_type_id {leave_type_id} for quota. Only paid (0) and sick (2) have quotas.")
+
+    employee = models.Employee
+    quota = models.EmployeeLeaveQuota
+    lo, hi, total = db.query(
+        func.min(employee.emp_no), func.max(employee.emp_no), func.count(employee.emp_no)
+    ).one()
+    if not total:
+        return 0, 0
+
+    created = 0
+    for chunk_lo in range(lo, hi + 1, chunk_size):
+        chunk_hi = chunk_lo + chunk_size
+        for leave_type_id, days in quotas.items():
+            missing = select(
+                employee.emp_no,
+                literal(year),
+                literal(leave_type_id),
+                literal(days),
+            ).where(
+                employee.emp_no >= chunk_lo,
+                employee.emp_no < chunk_hi,
+                ~exists().where(
+                    and_(
+                        quota.emp_no == employee.emp_no,
+                        quota.year == year,
+                        quota.leave_type_id == leave_type_id,
+                    )
+                ),
+            )
+            result = db.execute(
+                insert(quota.__table__).from_select(
+                    ["emp_no", "year", "leave_type_id", "annual_quota_days"], missing
+                )
+            )
+            created += result.rowcount
         db.commit()
-        db.refresh(quota)
-    
-    return quota
+
+    skipped = total * len(quotas) - created
+    return created, skipped
+
+
+def _bulk_rows(db: Session, bulk_in: schemas.LeaveQuotaBulkUpsert) -> Tuple[List[dict], List[dict]]:
+    """
+    Flatten explicit entries and department rules into one list of rows
+    ({index, dept_no, emp_no, year, leave_type_id, days, delta}), plus the
+    errors for rules that cannot be expanded.
+    """
+    rows = [
+        {"index": index, "dept_no": None, **entry.model_dump()}
+        for index, entry in enumerate(bulk_in.entries)
+    ]
+    errors = []
+    for index, rule in enumerate(bulk_in.department_rules):
+        members = [
+            emp_no for (emp_no,) in db.query(models.DeptEmp.emp_no).filter(
+                models.DeptEmp.dept_no == rule.dept_no,
+                models.DeptEmp.to_date == FAR_FUTURE,
+            )
+        ]
+        if not members and db.get(models.Department, rule.dept_no) is None:
+            errors.append({
+                "index": index, "dept_no": rule.dept_no, "emp_no": None, "year": rule.year,
+                "leave_type_id": rule.leave_type_id, "detail": "Department not found",
+            })
+            continue
+        data = rule.model_dump()
+        rows.extend({"index": index, **data, "emp_no": emp_no} for emp_no in members)
+    return rows, errors
+
+
+def bulk_upsert_quotas(
+    db: Session,
+    bulk_in: schemas.LeaveQuotaBulkUpsert,
+    chunk_size: int = BULK_UPSERT_CHUNK_SIZE,
+) -> dict:
+    """
+    Set (days) or adjust (delta) many quotas at once.
+
+    Rows come from the explicit entries plus the current members of each
+    department rule. Per chunk of rows, in one transaction:
+      - one SELECT for the employees, one SELECT ... FOR UPDATE for the
+        existing quota rows,
+      - new values computed in Python (a missing row counts as the default
+        quota for delta rows),
+      - one executemany upsert, and the matching ledger adjustments.
+
+    Rows that cannot be applied (unknown employee, both or neither of
+    days/delta, a key repeated in the request, a delta below zero) are
+    reported in "errors" and do not block the rest of the batch.
+    """
+    from app.crud import leave_ledger
+
+    rows, errors = _bulk_rows(db, bulk_in)
+
+    def fail(row, detail):
+        errors.append({
+            "index": row["index"], "dept_no": row["dept_no"], "emp_no": row["emp_no"],
+            "year": row["year"], "leave_type_id": row["leave_type_id"], "detail": detail,
+        })
+
+    key_counts: Dict[tuple, int] = {}
+    for row in rows:
+        key = (row["emp_no"], row["year"], row["leave_type_id"])
+        key_counts[key] = key_counts.get(key, 0) + 1
+
+    quota = models.EmployeeLeaveQuota
+    applied = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        emp_nos = {row["emp_no"] for row in chunk}
+        known = {
+            emp_no for (emp_no,) in db.query(models.Employee.emp_no)
+            .filter(models.Employee.emp_no.in_(emp_nos))
+        }
+        current = {
+            (emp_no, year, leave_type_id): days
+            for emp_no, year, leave_type_id, days in db.query(
+                quota.emp_no, quota.year, quota.leave_type_id, quota.annual_quota_days
+            )
+            .filter(quota.emp_no.in_(emp_nos))
+            .filter(quota.year.in_({row["year"] for row in chunk}))
+            .with_for_update()
+        }
+
+        values: Dict[tuple, int] = {}
+        for row in chunk:
+            key = (row["emp_no"], row["year"], row["leave_type_id"])
+            if (row["days"] is None) == (row["delta"] is None):
+                fail(row, "Exactly one of days or delta is required")
+            elif row["emp_no"] not in known:
+                fail(row, "Employee not found")
+            elif key_counts[key] > 1:
+                fail(row, "Duplicate (emp_no, year, leave_type_id) in request")
+            elif row["days"] is not None:
+                values[key] = row["days"]
+            else:
+                days = current.get(key, DEFAULT_QUOTAS[row["leave_type_id"]]) + row["delta"]
+                if days < 0:
+                    fail(row, "Quota cannot go below 0")
+                else:
+                    values[key] = days
+
+        if values:
+            upsert_quotas(db, [
+                {"emp_no": emp_no, "year": year, "leave_type_id": leave_type_id, "annual_quota_days": days}
+                for (emp_no, year, leave_type_id), days in values.items()
+            ])
+            leave_ledger.sync_available_many(db, values, note="bulk adjustment")
+        db.commit()
+        applied += len(values)
+
+    return {"applied": applied, "failed": len(errors), "errors": errors}
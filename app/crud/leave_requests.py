@@ -1,21 +1,90 @@
-from datetime import date, datetime
-from typing import List, Optional
+import heapq
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import text
+from sqlalchemy import and_, bindparam, exists, func, insert, or_, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app import models, schemas
+from app import models, outbox, schemas
+from app.models import FAR_FUTURE
 from app.crud import leave_quotas
-from app.crud import employees
+from app.crud import leave_ledger
+from app.crud.writes import check_version, commit_and_keep
+from app.outbox import outbox_worker
+from app.manager_resolver import manager_resolver
+from app.recurrence import Recurrence, leave_runs, recurrence_of, runs_overlap, weekdays_mask
+from app.working_calendar import working_calendar
 
+MAX_LEAVE_REQUEST_PAGE_SIZE = 500
+MAX_LEAVE_SPAN_DAYS = 366
+EXPIRY_CHUNK_SIZE = 1000
 
-def get_leave_request(db: Session, leave_id: int) -> Optional[models.EmployeeLeaveRequest]:
-    return (
+
+def get_leave_request(
+    db: Session, leave_id: int, include_archived: bool = False
+) -> Optional[models.EmployeeLeaveRequest]:
+    """
+    The request with this id. With include_archived, a request moved to
+    the archive table (crud.leave_archive) is returned too; archived rows
+    are read-only, so write paths leave it False.
+    """
+    leave_request = (
         db.query(models.EmployeeLeaveRequest)
         .filter(models.EmployeeLeaveRequest.leave_id == leave_id)
         .first()
     )
+    if leave_request is None and include_archived:
+        leave_request = db.get(models.EmployeeLeaveRequestArchive, leave_id)
+    return leave_request
+
+
+def leave_requests_query(
+    db: Session,
+    emp_no: Optional[int] = None,
+    status: Optional[str] = None,
+    manager_emp_no: Optional[int] = None,
+    before_requested_at: Optional[datetime] = None,
+    before_leave_id: Optional[int] = None,
+    start_from: Optional[date] = None,
+    start_to: Optional[date] = None,
+    model=models.EmployeeLeaveRequest,
+):
+    """
+    Filtered leave requests, newest first (requested_at DESC, leave_id DESC).
+
+    Each equality-filter combination has an index ending in requested_at
+    (none, status, emp_no, manager_emp_no + status); the primary key is the
+    implicit last column of every secondary index, so the listing is read
+    in index order with no sort step. start_from / start_to narrow the rows
+    read from that index. model=EmployeeLeaveRequestArchive runs the same
+    query against the archive table.
+    """
+    leave = model
+    q = db.query(leave)
+    if emp_no is not None:
+        q = q.filter(leave.emp_no == emp_no)
+    if manager_emp_no is not None:
+        q = q.filter(leave.manager_emp_no == manager_emp_no)
+    if status is not None:
+        q = q.filter(leave.status == status)
+    if start_from is not None:
+        q = q.filter(leave.start_date >= start_from)
+    if start_to is not None:
+        q = q.filter(leave.start_date <= start_to)
+    if before_requested_at is not None and before_leave_id is not None:
+        q = q.filter(
+            or_(
+                leave.requested_at < before_requested_at,
+                and_(
+                    leave.requested_at == before_requested_at,
+                    leave.leave_id < before_leave_id,
+                ),
+            )
+        )
+    return q.order_by(leave.requested_at.desc(), leave.leave_id.desc())
 
 
 def get_leave_requests(
@@ -24,18 +93,60 @@ def get_leave_requests(
     status: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
+    manager_emp_no: Optional[int] = None,
+    before_requested_at: Optional[datetime] = None,
+    before_leave_id: Optional[int] = None,
+    start_from: Optional[date] = None,
+    start_to: Optional[date] = None,
+    include_archived: bool = False,
 ) -> List[models.EmployeeLeaveRequest]:
-    q = db.query(models.EmployeeLeaveRequest)
-    if emp_no is not None:
-        q = q.filter(models.EmployeeLeaveRequest.emp_no == emp_no)
-    if status is not None:
-        q = q.filter(models.EmployeeLeaveRequest.status == status)
-    return (
-        q.order_by(models.EmployeeLeaveRequest.requested_at.desc())
-        .offset(skip)
-        .limit(limit)
+    """
+    List leave requests, newest first (requested_at DESC, leave_id DESC).
+
+    Keyset pagination: pass the requested_at and leave_id of the last row of
+    the previous page as before_requested_at / before_leave_id instead of an
+    offset, so deep pages cost the same as the first one.
+
+    include_archived also reads the archive table (crud.leave_archive) and
+    merges both listings in the same order; each side is read up to
+    skip + limit rows from its own index, so keyset pages stay cheap there
+    too.
+    """
+    limit = min(limit, MAX_LEAVE_REQUEST_PAGE_SIZE)
+    filters = dict(
+        emp_no=emp_no,
+        status=status,
+        manager_emp_no=manager_emp_no,
+        before_requested_at=before_requested_at,
+        before_leave_id=before_leave_id,
+        start_from=start_from,
+        start_to=start_to,
+    )
+    if not include_archived:
+        return leave_requests_query(db, **filters).offset(skip).limit(limit).all()
+
+    hot = leave_requests_query(db, **filters).limit(skip + limit).all()
+    archived = (
+        leave_requests_query(db, model=models.EmployeeLeaveRequestArchive, **filters)
+        .limit(skip + limit)
         .all()
     )
+    merged = heapq.merge(
+        hot, archived, key=lambda row: (row.requested_at, row.leave_id), reverse=True
+    )
+    return list(islice(merged, skip, skip + limit))
+
+
+def count_pending_for_manager(db: Session, manager_emp_no: int) -> int:
+    """Number of PENDING requests awaiting a manager; answered from the inbox index."""
+    return (
+        db.query(func.count(models.EmployeeLeaveRequest.leave_id))
+        .filter(
+            models.EmployeeLeaveRequest.manager_emp_no == manager_emp_no,
+            models.EmployeeLeaveRequest.status == "PENDING",
+        )
+        .scalar()
+    )
 
 
 def get_employee_manager(db: Session, emp_no: int) -> Optional[int]:
@@ -46,47 +157,20 @@ def get_employee_manager(db: Session, emp_no: int) -> Optional[int]:
     
     Edge cases handled:
     - Employee has no current department → returns None
-    - Multiple current departments → uses latest (ORDER BY from_date DESC)
+    - Multiple current departments → uses latest (by from_date)
     - Department has no current manager → returns None
-    - Multiple current managers → uses latest (ORDER BY from_date DESC)
+    - Multiple current managers → uses latest (by from_date)
     
+    Served from the in-process ManagerResolver maps, so this costs no
+    queries once the maps are loaded.
     Returns the manager's emp_no, or None if not found.
     """
-    # Find employee's CURRENT department (active assignment)
-    # If multiple exist, get the one with the latest from_date
-    dept_query = text("""
-        SELECT dept_no 
-        FROM dept_emp 
-        WHERE emp_no = :emp_no 
-        AND to_date = '9999-01-01'
-        ORDER BY from_date DESC
-        LIMIT 1
-    """)
-    
-    result = db.execute(dept_query, {"emp_no": emp_no}).fetchone()
-    
-    if not result:
-        return None  # Employee has no current department
-    
-    dept_no = result[0]
-    
-    # Find current manager of that department
-    # If multiple managers exist (shouldn't happen for current), get the one with latest from_date
-    manager_query = text("""
-        SELECT emp_no 
-        FROM dept_manager 
-        WHERE dept_no = :dept_no 
-        AND to_date = '9999-01-01'
-        ORDER BY from_date DESC
-        LIMIT 1
-    """)
-    
-    manager_result = db.execute(manager_query, {"dept_no": dept_no}).fetchone()
-    
-    if not manager_result:
-        return None  # Department has no current manager
-    
-    return manager_result[0]
+    return manager_resolver.resolve(db, emp_no)
+
+
+def get_employee_managers(db: Session, emp_nos: Iterable[int]) -> Dict[int, Optional[int]]:
+    """Batch form of get_employee_manager: {emp_no: manager_emp_no or None}."""
+    return manager_resolver.resolve_many(db, emp_nos)
 
 
 def check_quota_availability(
@@ -96,6 +180,9 @@ def check_quota_availability(
     Check if employee has sufficient quota for the requested leave type.
     Unpaid leaves (type 1) don't require quota checks.
     Returns True if quota is sufficient, False otherwise.
+
+    Read-only: a missing quota row counts as the default quota for that
+    type; the row itself is only created when days are actually deducted.
     """
     # Unpaid leaves don't have quotas
     if leave_type_id == 1:
@@ -108,11 +195,205 @@ def check_quota_availability(
     if year is None:
         year = date.today().year
     
-    # Get or create quota with default values
-    quota = leave_quotas.get_or_create_quota(db, emp_no, leave_type_id, year)
+    quota = leave_quotas.get_leave_quota(db, emp_no, year, leave_type_id)
+    available = (
+        quota.annual_quota_days if quota is not None
+        else leave_quotas.DEFAULT_QUOTAS[leave_type_id]
+    )
     
     # Check if available quota is sufficient
-    return quota.annual_quota_days >= days_requested
+    return available >= days_requested
+
+
+def count_leave_days(db: Session, emp_no: int, start_date: date, end_date: date,
+                     recurrence: Optional[Recurrence] = None) -> int:
+    """
+    Working days in [start_date, end_date] for the employee: weekends,
+    company-wide holidays and holidays of the employee's current
+    department do not count against quota. With a recurrence only its
+    occurrences count, summed over the expansion in one calendar lookup.
+    """
+    dept_no = manager_resolver.current_dept(db, emp_no)
+    return _working_days(db, start_date, end_date, recurrence, dept_no)
+
+
+def _working_days(db: Session, start_date: date, end_date: date,
+                  recurrence: Optional[Recurrence], dept_no: Optional[str]) -> int:
+    if recurrence is None:
+        return working_calendar.working_days(db, start_date, end_date, dept_no)
+    return working_calendar.working_days_in(
+        db, leave_runs(start_date, end_date, recurrence), start_date, end_date, dept_no
+    )
+
+
+def _recurrence_in(leave_in: schemas.LeaveRequestBase) -> Optional[Recurrence]:
+    if leave_in.recurrence is None:
+        return None
+    return Recurrence(weekdays_mask(leave_in.recurrence.weekdays), leave_in.recurrence.interval_weeks)
+
+
+def _check_leave_span(start_date: date, end_date: date) -> None:
+    """A request (or recurring series) covers at most MAX_LEAVE_SPAN_DAYS days."""
+    if (end_date - start_date).days + 1 > MAX_LEAVE_SPAN_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Leave request may span at most {MAX_LEAVE_SPAN_DAYS} days"
+        )
+
+
+ACTIVE_STATUSES = ("PENDING", "APPROVED")
+
+
+def find_overlapping_leave(
+    db: Session,
+    emp_no: int,
+    start_date: date,
+    end_date: date,
+    exclude_leave_id: Optional[int] = None,
+    recurrence: Optional[Recurrence] = None,
+) -> Optional[int]:
+    """
+    leave_id of a PENDING/APPROVED request of emp_no sharing a day with
+    [start_date, end_date] (only its occurrences, with a recurrence), or None.
+
+    One probe of the (emp_no, start_date, end_date) index: the range
+    start_date <= end_date is scanned within the employee, and end_date is
+    checked from the index entry itself. Two plain requests whose bounds
+    intersect overlap; when either side is recurring both are expanded and
+    compared run by run, stopping at the first shared day.
+    """
+    leave = models.EmployeeLeaveRequest
+    q = db.query(
+        leave.leave_id, leave.start_date, leave.end_date,
+        leave.recurrence_weekdays, leave.recurrence_interval_weeks,
+    ).filter(
+        leave.emp_no == emp_no,
+        leave.start_date <= end_date,
+        leave.end_date >= start_date,
+        leave.status.in_(ACTIVE_STATUSES),
+    )
+    if exclude_leave_id is not None:
+        q = q.filter(leave.leave_id != exclude_leave_id)
+    for row in q.order_by(leave.start_date, leave.leave_id):
+        if recurrence is None and row.recurrence_weekdays is None:
+            return row.leave_id
+        if runs_overlap(
+            leave_runs(start_date, end_date, recurrence),
+            leave_runs(row.start_date, row.end_date, recurrence_of(row)),
+        ):
+            return row.leave_id
+    return None
+
+
+def _raise_if_overlapping(db: Session, emp_no: int, start_date: date, end_date: date,
+                          exclude_leave_id: Optional[int] = None,
+                          recurrence: Optional[Recurrence] = None) -> None:
+    overlapping = find_overlapping_leave(db, emp_no, start_date, end_date, exclude_leave_id, recurrence)
+    if overlapping is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Leave request overlaps existing leave request {overlapping}"
+        )
+
+
+def find_all_overlaps(db: Session, batch_size: int = 10000) -> Iterator[dict]:
+    """
+    Every pair of overlapping PENDING/APPROVED requests, in one sweep.
+
+    Active requests are streamed ordered by (emp_no, start_date). Per
+    employee the sweep keeps the earlier requests still reaching the current
+    start date; each request is checked against them, furthest-reaching
+    first, and reported once, against the first one it shares a day with.
+    Plain requests compare by their bounds; recurring ones by their expanded
+    occurrences (app.recurrence), so a series with gaps only overlaps what
+    falls on its days.
+    """
+    leave = models.EmployeeLeaveRequest
+    rows = (
+        db.query(
+            leave.leave_id, leave.emp_no, leave.start_date, leave.end_date,
+            leave.recurrence_weekdays, leave.recurrence_interval_weeks,
+        )
+        .filter(leave.status.in_(ACTIVE_STATUSES))
+        .order_by(leave.emp_no, leave.start_date, leave.leave_id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    current_emp_no = None
+    reaching: List = []  # earlier rows of the employee, furthest-reaching first
+    for row in rows:
+        if row.emp_no != current_emp_no:
+            current_emp_no, reaching = row.emp_no, []
+        reaching = [earlier for earlier in reaching if earlier.end_date >= row.start_date]
+        for earlier in reaching:
+            shared = runs_overlap(
+                leave_runs(earlier.start_date, earlier.end_date, recurrence_of(earlier)),
+                leave_runs(row.start_date, row.end_date, recurrence_of(row)),
+            )
+            if shared is not None:
+                yield {
+                    "emp_no": row.emp_no,
+                    "leave_id": earlier.leave_id,
+                    "overlapping_leave_id": row.leave_id,
+                    "overlap_start": shared[0],
+                    "overlap_end": shared[1],
+                }
+                break
+        reaching.append(row)
+        reaching.sort(key=lambda earlier: earlier.end_date, reverse=True)
+
+
+def _creation_facts(db: Session, emp_no: int, leave_type_id: int, start_date: date, end_date: date):
+    """
+    Everything create_leave_request needs to know, in one SELECT of scalar
+    subqueries (each a primary-key or index probe):
+
+      employee_exists, dept_no (latest current department), manager_emp_no
+      (latest current manager of that department), quota_days (None if the
+      quota row for start_date's year is missing), has_balance (snapshot
+      exists), overlapping_leave_id (a plain PENDING/APPROVED request
+      overlapping the dates, or None), recurring_candidate (a recurring
+      PENDING/APPROVED request's bounds overlap the dates; its actual days
+      still need comparing).
+    """
+    dept_emp, dept_manager = models.DeptEmp, models.DeptManager
+    quota, balance, leave = models.EmployeeLeaveQuota, models.LeaveBalance, models.EmployeeLeaveRequest
+    year = start_date.year
+    dept_no = (
+        select(dept_emp.dept_no)
+        .where(dept_emp.emp_no == emp_no, dept_emp.to_date == FAR_FUTURE)
+        .order_by(dept_emp.from_date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    candidate = and_(
+        leave.emp_no == emp_no,
+        leave.start_date <= end_date,
+        leave.end_date >= start_date,
+        leave.status.in_(ACTIVE_STATUSES),
+    )
+    return db.execute(select(
+        exists().where(models.Employee.emp_no == emp_no).label("employee_exists"),
+        dept_no.label("dept_no"),
+        select(dept_manager.emp_no)
+        .where(dept_manager.dept_no == dept_no, dept_manager.to_date == FAR_FUTURE)
+        .order_by(dept_manager.from_date.desc())
+        .limit(1)
+        .scalar_subquery()
+        .label("manager_emp_no"),
+        select(quota.annual_quota_days)
+        .where(quota.emp_no == emp_no, quota.year == year, quota.leave_type_id == leave_type_id)
+        .scalar_subquery()
+        .label("quota_days"),
+        exists().where(
+            balance.emp_no == emp_no, balance.year == year, balance.leave_type_id == leave_type_id
+        ).label("has_balance"),
+        select(leave.leave_id)
+        .where(candidate, leave.recurrence_weekdays.is_(None))
+        .limit(1)
+        .scalar_subquery()
+        .label("overlapping_leave_id"),
+        exists().where(candidate, leave.recurrence_weekdays.isnot(None)).label("recurring_candidate"),
+    )).one()
 
 
 def create_leave_request(
@@ -129,10 +410,22 @@ def create_leave_request(
     5. Multiple current departments → uses latest
     6. Quota validation for paid/sick leaves
     7. Negative/zero days → prevented by date validation
+    8. Dates overlapping a PENDING/APPROVED request → HTTPException 400
+    9. Recurring leave (leave_in.recurrence): one row for the whole series;
+       days_requested, quota and overlaps come from its expansion
+
+    All checks come from one combined query (_creation_facts) and the
+    working-day calendar cache; the writes are the INSERT, the pending_days
+    UPDATE of the balance snapshot (paid/sick only) and the outbox row, in
+    a single commit. The returned object is built from the inserted values,
+    so there is no refresh afterwards.
     """
+    facts = _creation_facts(
+        db, leave_in.emp_no, leave_in.leave_type_id, leave_in.start_date, leave_in.end_date
+    )
+
     # EDGE CASE 1: Validate employee exists
-    employee = employees.get_employee(db, leave_in.emp_no)
-    if not employee:
+    if not facts.employee_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee with emp_no {leave_in.emp_no} not found"
@@ -144,32 +437,53 @@ def create_leave_request(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="end_date must be after or equal to start_date"
         )
+    _check_leave_span(leave_in.start_date, leave_in.end_date)
     
-    # Compute days_requested as inclusive difference.
-    days_requested = (leave_in.end_date - leave_in.start_date).days + 1
+    recurrence = _recurrence_in(leave_in)
+
+    # Compute days_requested as the working days in the range (of its
+    # occurrences, for a recurring request).
+    days_requested = _working_days(
+        db, leave_in.start_date, leave_in.end_date, recurrence, facts.dept_no
+    )
     
-    # EDGE CASE 3: Ensure positive days (shouldn't happen if dates are valid, but safeguard)
+    # EDGE CASE 3: Range covers only weekends/holidays
     if days_requested <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Leave request must be for at least 1 day"
+            detail="Leave request must include at least 1 working day"
         )
     
-    # EDGE CASE 4: Validate quota availability (only for paid and sick leaves)
-    if leave_in.leave_type_id in [0, 2]:  # paid or sick
-        if not check_quota_availability(
-            db, leave_in.emp_no, leave_in.leave_type_id, days_requested
-        ):
+    # EDGE CASE 4: Validate quota availability (only for paid and sick leaves).
+    # A missing quota row counts as the default quota for that type.
+    if leave_in.leave_type_id in leave_quotas.DEFAULT_QUOTAS:
+        available = (
+            facts.quota_days if facts.quota_days is not None
+            else leave_quotas.DEFAULT_QUOTAS[leave_in.leave_type_id]
+        )
+        if available < days_requested:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient quota"
             )
     
-    # EDGE CASE 5: Find the employee's CURRENT manager automatically
-    # Returns None if employee has no department or department has no manager
-    manager_emp_no = get_employee_manager(db, leave_in.emp_no)
+    # EDGE CASE 5: Reject dates overlapping a pending/approved request.
+    # Plain against plain is settled by the combined query; a recurring
+    # request on either side means comparing the expanded days.
+    overlapping_leave_id = facts.overlapping_leave_id
+    if facts.recurring_candidate or (recurrence is not None and overlapping_leave_id is not None):
+        overlapping_leave_id = find_overlapping_leave(
+            db, leave_in.emp_no, leave_in.start_date, leave_in.end_date, recurrence=recurrence
+        )
+    if overlapping_leave_id is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Leave request overlaps existing leave request {overlapping_leave_id}"
+        )
     
-    leave = models.EmployeeLeaveRequest(
+    # EDGE CASE 6: manager_emp_no is the employee's CURRENT manager, from the
+    # same query (None if no department or the department has no manager)
+    values = dict(
         emp_no=leave_in.emp_no,
         leave_type_id=leave_in.leave_type_id,
         start_date=leave_in.start_date,
@@ -179,64 +493,176 @@ def create_leave_request(
         status="PENDING",
         requested_at=datetime.utcnow(),
         employee_comment=leave_in.employee_comment,
-        manager_emp_no=manager_emp_no,  # Set automatically (may be None if no manager found)
+        manager_emp_no=facts.manager_emp_no,
+        recurrence_weekdays=recurrence.weekdays if recurrence else None,
+        recurrence_interval_weeks=recurrence.interval_weeks if recurrence else None,
+        version=1,
     )
-    db.add(leave)
+    result = db.execute(insert(models.EmployeeLeaveRequest.__table__).values(**values))
+    leave = models.EmployeeLeaveRequest(leave_id=result.inserted_primary_key[0], **values)
+
+    # New PENDING days show up in the balance snapshot in the same commit.
+    key = leave_ledger.leave_key(leave)
+    if key is not None:
+        if not facts.has_balance:
+            leave_ledger.ensure_balances(db, [key])
+        leave_ledger.post(db, (), {key: days_requested}, seeded=True)
+    _enqueue_leave_event(db, "created", leave)
     db.commit()
-    db.refresh(leave)
+    outbox_worker.wake()
     return leave
 
 
+def _enqueue_event(db: Session, event_type: str, leave_id: int, emp_no: int,
+                   manager_emp_no: Optional[int], leave_status: str) -> None:
+    """
+    Queue the change notification in the caller's transaction; the outbox
+    worker fans it out once the transaction has committed.
+    """
+    outbox.enqueue(db, outbox.LEAVE_REQUEST_CHANGED, {
+        "event_type": event_type,
+        "leave_id": leave_id,
+        "emp_no": emp_no,
+        "manager_emp_no": manager_emp_no,
+        "status": leave_status,
+    })
+
+
+def _enqueue_leave_event(db: Session, event_type: str, leave: models.EmployeeLeaveRequest) -> None:
+    _enqueue_event(db, event_type, leave.leave_id, leave.emp_no, leave.manager_emp_no, leave.status)
+
+
+def _deduct(db: Session, key: tuple, days: int) -> bool:
+    if leave_quotas.deduct_quota(db, *key, days):
+        return True
+    # The quota row may not exist yet for that year: create defaults, retry once.
+    leave_quotas.ensure_quotas(db, [key])
+    return leave_quotas.deduct_quota(db, *key, days)
+
+
 def update_quota_on_approval(
     db: Session, leave_request: models.EmployeeLeaveRequest
-) -> None:
+) -> bool:
     """
-    Update quota when a leave request is approved.
-    Deducts the requested days from the employee's quota.
-    Only updates quota for paid (0) and sick (2) leave types.
+    Deduct an approved request's days from the employee's quota, in the
+    caller's transaction (no commit).
+    Only paid (0) and sick (2) leave types have quotas.
+
+    The deduction is a single guarded UPDATE in the database, so concurrent
+    approvals for the same employee cannot lose updates. Returns False if
+    the remaining quota is insufficient; the caller should roll back.
+    Approvals made through review/update go through move_leave_balance,
+    which also records the ledger entry.
     """
-    # Only update quota for paid and sick leaves
-    if leave_request.leave_type_id not in [0, 2]:
-        return
-    
-    # Get the year from start_date
-    year = leave_request.start_date.year
-    
-    # Get or create quota
-    quota = leave_quotas.get_or_create_quota(
-        db, leave_request.emp_no, leave_request.leave_type_id, year
+    key = leave_ledger.leave_key(leave_request)
+    if key is None:
+        return True
+    return _deduct(db, key, leave_request.days_requested)
+
+
+NO_EFFECT = (None, None, 0)
+
+
+def leave_state(leave) -> tuple:
+    """(status, balance key, days) - everything that decides a request's effect on balances."""
+    return (leave.status, leave_ledger.leave_key(leave), leave.days_requested)
+
+
+def move_leave_balance(db: Session, leave_id: Optional[int], before: tuple, after: tuple) -> bool:
+    """
+    Move a leave request's effect on quotas and balances from `before` to
+    `after` (both leave_state tuples): undo the old effect, apply the new one.
+
+      PENDING  -> pending_days
+      APPROVED -> guarded quota deduction + DEDUCTION ledger entry
+                  (undone by giving the days back + a REVERSAL entry)
+
+    Everything happens in the caller's transaction. Returns False if the new
+    effect needs more quota than is left; the caller should roll back.
+    """
+    if before == after:
+        return True
+    before_status, before_key, before_days = before
+    after_status, after_key, after_days = after
+    keys = {key for key in (before_key, after_key) if key is not None}
+    if not keys:
+        return True
+
+    # Seed snapshots from the untouched quota before anything is deducted.
+    leave_ledger.ensure_balances(db, keys)
+
+    entries = []
+    pending: Dict[tuple, int] = {}
+    if before_key is not None:
+        if before_status == "PENDING":
+            pending[before_key] = pending.get(before_key, 0) - before_days
+        elif before_status == "APPROVED":
+            leave_quotas.restore_quota(db, *before_key, before_days)
+            entries.append(leave_ledger.entry(before_key, "REVERSAL", before_days, leave_id))
+    if after_key is not None:
+        if after_status == "PENDING":
+            pending[after_key] = pending.get(after_key, 0) + after_days
+        elif after_status == "APPROVED":
+            if not _deduct(db, after_key, after_days):
+                return False
+            entries.append(leave_ledger.entry(after_key, "DEDUCTION", after_days, leave_id))
+
+    leave_ledger.post(db, entries, pending)
+    return True
+
+
+def _raise_insufficient_quota(db: Session) -> None:
+    db.rollback()
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Insufficient quota"
     )
-    
-    # Deduct the requested days from quota
-    quota.annual_quota_days -= leave_request.days_requested
-    
-    # Ensure quota doesn't go negative (safeguard, though validation should prevent this)
-    if quota.annual_quota_days < 0:
-        quota.annual_quota_days = 0
-    
-    db.add(quota)
-    db.commit()
 
 
 def update_leave_request(
     db: Session,
     db_leave: models.EmployeeLeaveRequest,
     leave_in: schemas.LeaveRequestUpdate,
+    expected_version: Optional[int] = None,
 ) -> models.EmployeeLeaveRequest:
-    data = leave_in.model_dump(exclude_unset=True)
-    
-    # Track if status changed to APPROVED
-    status_changed_to_approved = (
-        "status" in data 
-        and data["status"] == "APPROVED" 
-        and db_leave.status != "APPROVED"
-    )
+    """
+    409 if expected_version is given and db_leave is at another version, or
+    if the row changes between reading db_leave and committing.
+    """
+    check_version(db_leave, expected_version)
+    data = leave_in.model_dump(exclude_unset=True, exclude={"version"})
+    before = leave_state(db_leave)
     
     # If dates change, recompute days_requested.
+    recurrence = recurrence_of(db_leave)
     if "start_date" in data or "end_date" in data:
         start_date = data.get("start_date", db_leave.start_date)
         end_date = data.get("end_date", db_leave.end_date)
-        db_leave.days_requested = (end_date - start_date).days + 1
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="end_date must be after or equal to start_date"
+            )
+        _check_leave_span(start_date, end_date)
+        days_requested = count_leave_days(db, db_leave.emp_no, start_date, end_date, recurrence)
+        if days_requested <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Leave request must include at least 1 working day"
+            )
+        db_leave.days_requested = days_requested
+    
+    # Moving dates, or reactivating a request, must not create an overlap.
+    new_status = data.get("status", db_leave.status)
+    if new_status in ACTIVE_STATUSES and ({"start_date", "end_date", "status"} & data.keys()):
+        _raise_if_overlapping(
+            db,
+            db_leave.emp_no,
+            data.get("start_date", db_leave.start_date),
+            data.get("end_date", db_leave.end_date),
+            exclude_leave_id=db_leave.leave_id,
+            recurrence=recurrence,
+        )
     
     for key, value in data.items():
         setattr(db_leave, key, value)
@@ -246,19 +672,133 @@ def update_leave_request(
         db_leave.decided_at = datetime.utcnow()
     
     db.add(db_leave)
-    db.commit()
-    db.refresh(db_leave)
-    
-    # If status changed to APPROVED, update quota
-    if status_changed_to_approved:
-        update_quota_on_approval(db, db_leave)
-    
+
+    # Status/date change and the matching quota + balance movement commit together.
+    if not move_leave_balance(db, db_leave.leave_id, before, leave_state(db_leave)):
+        _raise_insufficient_quota(db)
+
+    _enqueue_leave_event(db, "updated", db_leave)
+    commit_and_keep(db)
+    outbox_worker.wake()
     return db_leave
 
 
 def delete_leave_request(db: Session, db_leave: models.EmployeeLeaveRequest) -> None:
+    # Deleting an approved request gives its days back.
+    move_leave_balance(db, db_leave.leave_id, leave_state(db_leave), NO_EFFECT)
+    _enqueue_leave_event(db, "deleted", db_leave)
     db.delete(db_leave)
-    db.commit()
+    commit_and_keep(db)
+    outbox_worker.wake()
+
+
+def cancel_leave_request(
+    db: Session, db_leave: models.EmployeeLeaveRequest
+) -> models.EmployeeLeaveRequest:
+    """
+    Cancel a PENDING or APPROVED request. Cancelling an approved request
+    restores its days to the quota (REVERSAL ledger entry).
+    """
+    if db_leave.status not in ("PENDING", "APPROVED"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Leave request is already {db_leave.status}"
+        )
+    before = leave_state(db_leave)
+    db_leave.status = "CANCELLED"
+    db_leave.decided_at = datetime.utcnow()
+    db.add(db_leave)
+    move_leave_balance(db, db_leave.leave_id, before, leave_state(db_leave))
+    _enqueue_leave_event(db, "cancelled", db_leave)
+    commit_and_keep(db)
+    outbox_worker.wake()
+    return db_leave
+
+
+def _stale_pending_filter(today: date, max_age_days: Optional[int]):
+    leave = models.EmployeeLeaveRequest
+    stale = leave.start_date < today
+    if max_age_days is not None:
+        cutoff = datetime.combine(today, datetime.min.time()) - timedelta(days=max_age_days)
+        stale = or_(stale, leave.requested_at < cutoff)
+    return and_(leave.status == "PENDING", stale)
+
+
+def expire_pending_leave_requests(
+    db: Session,
+    today: Optional[date] = None,
+    max_age_days: Optional[int] = None,
+    chunk_size: int = EXPIRY_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Cancel PENDING requests nobody decided in time: those whose start_date
+    is before `today` and, if max_age_days is given, those requested more
+    than max_age_days ago.
+
+    Works in chunks of chunk_size rows in leave_id order, one transaction
+    each: the chunk is locked (SELECT ... FOR UPDATE), cancelled with one
+    guarded UPDATE (decided_at = now), its pending days are released from
+    the balances with one ledger post, and an "expired" event is queued per
+    request. dry_run only counts.
+
+    Returns {"expired", "past_start", "too_old", "chunks"}; a request that
+    matches both reasons counts as past_start.
+    """
+    today = today or date.today()
+    leave = models.EmployeeLeaveRequest
+    stale = _stale_pending_filter(today, max_age_days)
+    counts = {"expired": 0, "past_start": 0, "too_old": 0, "chunks": 0}
+    if dry_run:
+        counts["expired"] = db.query(func.count(leave.leave_id)).filter(stale).scalar()
+        counts["past_start"] = (
+            db.query(func.count(leave.leave_id))
+            .filter(leave.status == "PENDING", leave.start_date < today)
+            .scalar()
+        )
+        counts["too_old"] = counts["expired"] - counts["past_start"]
+        db.rollback()
+        return counts
+
+    last_leave_id = 0
+    while True:
+        rows = (
+            db.query(
+                leave.leave_id, leave.emp_no, leave.leave_type_id, leave.start_date,
+                leave.days_requested, leave.manager_emp_no,
+            )
+            .filter(stale, leave.leave_id > last_leave_id)
+            .order_by(leave.leave_id)
+            .limit(chunk_size)
+            .with_for_update()
+            .all()
+        )
+        if not rows:
+            db.rollback()
+            break
+        last_leave_id = rows[-1].leave_id
+        now = datetime.utcnow()
+        db.execute(
+            update(leave)
+            .where(leave.leave_id.in_([row.leave_id for row in rows]), leave.status == "PENDING")
+            .values(status="CANCELLED", decided_at=now, version=leave.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        pending: Dict[tuple, int] = {}
+        for row in rows:
+            key = leave_ledger.leave_key(row)
+            if key is not None:
+                pending[key] = pending.get(key, 0) - row.days_requested
+            _enqueue_event(db, "expired", row.leave_id, row.emp_no, row.manager_emp_no, "CANCELLED")
+            counts["past_start" if row.start_date < today else "too_old"] += 1
+        leave_ledger.post(db, (), pending)
+        db.commit()
+        counts["expired"] += len(rows)
+        counts["chunks"] += 1
+
+    if counts["expired"]:
+        outbox_worker.wake()
+    return counts
 
 
 def review_leave_request(
@@ -269,7 +809,9 @@ def review_leave_request(
 ) -> models.EmployeeLeaveRequest:
     """
     Manager reviews (approves or rejects) a leave request.
-    If approved, quota is automatically deducted.
+    If approved, quota is deducted in the same transaction as the status
+    change; if the quota is insufficient nothing is changed and a 400
+    "Insufficient quota" is raised.
     """
     leave_request = get_leave_request(db, leave_id)
     
@@ -285,18 +827,167 @@ def review_leave_request(
             detail=f"Leave request is already {leave_request.status}"
         )
     
-    # Update the request
-    leave_request.status = review_in.status
-    leave_request.manager_emp_no = manager_emp_no
-    leave_request.manager_comment = review_in.manager_comment
-    leave_request.decided_at = datetime.utcnow()
-    
-    db.add(leave_request)
-    db.commit()
-    db.refresh(leave_request)
-    
-    # If APPROVED, update quota
-    if review_in.status == "APPROVED":
-        update_quota_on_approval(db, leave_request)
+    # Guarded status change: only one concurrent reviewer can win the
+    # PENDING -> decided transition, and the version check makes sure the
+    # request was not edited (e.g. its dates) since it was read.
+    leave = models.EmployeeLeaveRequest
+    decision = {
+        "status": review_in.status,
+        "manager_emp_no": manager_emp_no,
+        "manager_comment": review_in.manager_comment,
+        "decided_at": datetime.utcnow(),
+        "version": leave_request.version + 1,
+    }
+    result = db.execute(
+        update(leave)
+        .where(
+            leave.leave_id == leave_id,
+            leave.status == "PENDING",
+            leave.version == leave_request.version,
+        )
+        .values(**decision)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Leave request was decided or changed concurrently"
+        )
     
+    before = leave_state(leave_request)
+    # The row now holds exactly these values; no need to read it back.
+    for key, value in decision.items():
+        set_committed_value(leave_request, key, value)
+    after = (review_in.status, before[1], before[2])
+    if not move_leave_balance(db, leave_id, before, after):
+        _raise_insufficient_quota(db)
+    
+    _enqueue_event(db, "reviewed", leave_id, leave_request.emp_no, manager_emp_no, review_in.status)
+    commit_and_keep(db)
+    outbox_worker.wake()
     return leave_request
+
+
+def review_leave_requests_bulk(
+    db: Session,
+    items: List[schemas.LeaveRequestBulkReviewItem],
+    manager_emp_no: int,
+) -> List[dict]:
+    """
+    Approve/reject many leave requests in a single transaction.
+
+    - The targeted rows are read once with SELECT ... FOR UPDATE.
+    - Decisions are written with one executemany UPDATE (guarded by
+      status = 'PENDING').
+    - Quota deductions are summed per (emp_no, year, leave_type_id) and
+      applied with one guarded UPDATE per key.
+    - Everything commits once.
+
+    Items that cannot be applied (unknown id, not PENDING, repeated id,
+    insufficient quota for their key) are reported in the per-item outcomes
+    instead of failing the whole batch.
+    """
+    leave = models.EmployeeLeaveRequest
+    leave_ids = [item.leave_id for item in items]
+    rows = {
+        row.leave_id: row
+        for row in db.query(
+            leave.leave_id,
+            leave.emp_no,
+            leave.leave_type_id,
+            leave.start_date,
+            leave.days_requested,
+            leave.status,
+        )
+        .filter(leave.leave_id.in_(leave_ids))
+        .with_for_update()
+        .all()
+    }
+
+    now = datetime.utcnow()
+    outcomes: Dict[int, dict] = {}
+    order = []
+    accepted: Dict[int, schemas.LeaveRequestBulkReviewItem] = {}
+    deductions: Dict[tuple, int] = {}
+    contributors: Dict[tuple, List[int]] = {}
+    for item in items:
+        order.append(item.leave_id)
+        row = rows.get(item.leave_id)
+        if row is None:
+            outcomes.setdefault(item.leave_id, {"leave_id": item.leave_id, "ok": False,
+                                                "detail": "Leave request not found"})
+            continue
+        if item.leave_id in accepted or item.leave_id in outcomes:
+            outcomes[item.leave_id] = {"leave_id": item.leave_id, "ok": False, "status": row.status,
+                                       "detail": "Duplicate leave_id in request"}
+            accepted.pop(item.leave_id, None)
+            continue
+        if row.status != "PENDING":
+            outcomes[item.leave_id] = {"leave_id": item.leave_id, "ok": False, "status": row.status,
+                                       "detail": f"Leave request is already {row.status}"}
+            continue
+        accepted[item.leave_id] = item
+
+    for leave_id, item in accepted.items():
+        row = rows[leave_id]
+        key = leave_ledger.leave_key(row)
+        if item.status == "APPROVED" and key is not None:
+            deductions[key] = deductions.get(key, 0) + row.days_requested
+            contributors.setdefault(key, []).append(leave_id)
+
+    # Seed balance snapshots before any quota is touched.
+    leave_ledger.ensure_balances(
+        db, {leave_ledger.leave_key(rows[leave_id]) for leave_id in accepted} - {None}
+    )
+
+    # One guarded UPDATE per (emp, year, type). If the summed deduction does
+    # not fit, none of the approvals sharing that quota are applied.
+    if deductions:
+        leave_quotas.ensure_quotas(db, deductions.keys())
+        for key, days in deductions.items():
+            if not leave_quotas.deduct_quota(db, *key, days):
+                for leave_id in contributors[key]:
+                    accepted.pop(leave_id)
+                    outcomes[leave_id] = {"leave_id": leave_id, "ok": False, "status": "PENDING",
+                                          "detail": "Insufficient quota"}
+
+    if accepted:
+        table = leave.__table__
+        db.execute(
+            update(table)
+            .where(table.c.leave_id == bindparam("b_leave_id"))
+            .where(table.c.status == "PENDING")
+            .values(
+                status=bindparam("b_status"),
+                manager_comment=bindparam("b_comment"),
+                manager_emp_no=manager_emp_no,
+                decided_at=now,
+                version=table.c.version + 1,
+            ),
+            [
+                {"b_leave_id": leave_id, "b_status": item.status, "b_comment": item.manager_comment}
+                for leave_id, item in accepted.items()
+            ],
+        )
+        for leave_id, item in accepted.items():
+            outcomes[leave_id] = {"leave_id": leave_id, "ok": True, "status": item.status}
+
+        # Ledger: one DEDUCTION per approval, pending released for every decision.
+        entries = []
+        pending: Dict[tuple, int] = {}
+        for leave_id, item in accepted.items():
+            row = rows[leave_id]
+            key = leave_ledger.leave_key(row)
+            if key is None:
+                continue
+            pending[key] = pending.get(key, 0) - row.days_requested
+            if item.status == "APPROVED":
+                entries.append(leave_ledger.entry(key, "DEDUCTION", row.days_requested, leave_id))
+        leave_ledger.post(db, entries, pending)
+
+    for leave_id, item in accepted.items():
+        _enqueue_event(db, "reviewed", leave_id, rows[leave_id].emp_no, manager_emp_no, item.status)
+    db.commit()
+    outbox_worker.wake()
+    return [outcomes[leave_id] for leave_id in dict.fromkeys(order)]
@@ -0,0 +1,134 @@
+from datetime import date
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.crud import leave_quotas
+
+
+def completed_years(hire_date: date, as_of: date) -> int:
+    """Whole years of service on as_of (0 if not hired yet)."""
+    years = as_of.year - hire_date.year
+    if (as_of.month, as_of.day) < (hire_date.month, hire_date.day):
+        years -= 1
+    return max(years, 0)
+
+
+def next_year_quota(
+    rule: schemas.LeaveTypeRolloverRule, remaining: int, tenure_years: int
+) -> int:
+    """base + tenure accrual (capped) + unused days carried over (capped)."""
+    accrual = 0
+    if rule.accrual_every_years:
+        accrual = min(
+            (tenure_years // rule.accrual_every_years) * rule.accrual_days,
+            rule.accrual_cap,
+        )
+    carry = min(max(remaining, 0), rule.carry_over_cap)
+    return rule.base_days + accrual + carry
+
+
+def _employee_chunks(db: Session, chunk_size: int) -> Iterator[List[tuple]]:
+    """(emp_no, hire_date) rows in emp_no order, keyset-chunked."""
+    last_emp_no = None
+    while True:
+        q = db.query(models.Employee.emp_no, models.Employee.hire_date)
+        if last_emp_no is not None:
+            q = q.filter(models.Employee.emp_no > last_emp_no)
+        chunk = q.order_by(models.Employee.emp_no).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_emp_no = chunk[-1][0]
+
+
+def run_rollover(
+    db: Session,
+    from_year: int,
+    rules: Optional[schemas.RolloverRules] = None,
+    chunk_size: int = 10000,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Compute from_year + 1 quotas for every employee and insert the missing ones.
+
+    Per chunk of employees: one SELECT for the employees, one SELECT for
+    their from_year / to_year quota rows, then the new rows are computed in
+    Python and written with one executemany insert-if-missing, committed per
+    chunk.
+
+    - Idempotent: to_year rows that already exist are never modified.
+    - Resumable: an interrupted run simply continues where rows are missing.
+    - Quota rows are created lazily, so a missing from_year row of someone
+      employed that year is an untouched default quota and carries over as
+      DEFAULT_QUOTAS. Only employees hired after from_year carry nothing.
+
+    Returns {"to_year", "created", "skipped", "diff"}. diff is only
+    collected when dry_run is set (a dry run writes nothing) and lists every
+    (emp_no, leave_type_id) whose to_year quota differs from the rules:
+    action "create" for missing rows, "keep" for existing rows that the
+    rollover will leave as they are.
+    """
+    if rules is None:
+        rules = schemas.RolloverRules()
+    for leave_type_id in rules.rules:
+        if leave_type_id not in leave_quotas.DEFAULT_QUOTAS:
+            raise ValueError(f"Invalid leave_type_id {leave_type_id} for quota. Only paid (0) and sick (2) have quotas.")
+    to_year = from_year + 1
+    as_of = date(to_year, 1, 1)
+    from_year_end = date(from_year, 12, 31)
+    quota = models.EmployeeLeaveQuota
+
+    created = 0
+    skipped = 0
+    diff: List[dict] = []
+
+    for chunk in _employee_chunks(db, chunk_size):
+        emp_nos_lo, emp_nos_hi = chunk[0][0], chunk[-1][0]
+        balances: Dict[tuple, int] = {
+            (emp_no, year, leave_type_id): days
+            for emp_no, year, leave_type_id, days in db.query(
+                quota.emp_no, quota.year, quota.leave_type_id, quota.annual_quota_days
+            ).filter(
+                quota.emp_no >= emp_nos_lo,
+                quota.emp_no <= emp_nos_hi,
+                quota.year.in_((from_year, to_year)),
+            )
+        }
+
+        new_rows = []
+        for emp_no, hire_date in chunk:
+            tenure = completed_years(hire_date, as_of)
+            hired_after = hire_date > from_year_end
+            for leave_type_id, rule in rules.rules.items():
+                remaining = balances.get((emp_no, from_year, leave_type_id))
+                if remaining is None:
+                    remaining = 0 if hired_after else leave_quotas.DEFAULT_QUOTAS[leave_type_id]
+                proposed = next_year_quota(rule, remaining, tenure)
+                existing = balances.get((emp_no, to_year, leave_type_id))
+                if dry_run and existing != proposed:
+                    diff.append({
+                        "emp_no": emp_no,
+                        "leave_type_id": leave_type_id,
+                        "current": existing,
+                        "proposed": proposed,
+                        "action": "create" if existing is None else "keep",
+                    })
+                if existing is not None:
+                    skipped += 1
+                    continue
+                new_rows.append({
+                    "emp_no": emp_no,
+                    "year": to_year,
+                    "leave_type_id": leave_type_id,
+                    "annual_quota_days": proposed,
+                })
+
+        created += len(new_rows)
+        if dry_run:
+            continue
+        leave_quotas.insert_quotas_if_missing(db, new_rows)
+        db.commit()
+
+    return {"to_year": to_year, "created": created, "skipped": skipped, "diff": diff}
@@ -0,0 +1,127 @@
+"""
+Single-statement write helpers.
+
+The classic pattern - SELECT the row, change it, commit, refresh() - costs
+three round trips per write. These helpers do the same in one where the
+dialect allows it:
+
+  - update_by_pk: UPDATE ... WHERE <pk> RETURNING * (SQLite, PostgreSQL);
+    MySQL has no RETURNING, so it is the UPDATE plus one primary-key SELECT.
+    A rowcount of 0 means the row does not exist (the caller's 404).
+  - delete_by_pk: DELETE ... WHERE <pk>, rowcount again tells found or not.
+  - commit_and_keep: commit without expiring the session's objects, for
+    callers that already hold every value they just wrote, so reading them
+    afterwards does not trigger a reload.
+
+Versioned tables (those with a `version` column, see models) get
+version = version + 1 on every update_by_pk; pass expected_version to make
+the UPDATE conditional on it (HTTP 409 if the row moved on). ORM flushes of
+versioned objects are checked by SQLAlchemy itself; commit_and_keep turns
+the resulting StaleDataError into the same 409.
+
+None of them bypass ORM-level cascades: use them only for tables whose
+deletes are handled by the database (ON DELETE CASCADE) or have no children.
+"""
+from typing import Any, Dict, Optional, Type
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+
+def _pk_clause(model: Type, pk: Dict[str, Any]) -> list:
+    return [getattr(model, column) == value for column, value in pk.items()]
+
+
+def raise_version_conflict(current: Optional[int] = None) -> None:
+    detail = "Record was changed by someone else; reload it and try again"
+    if current is not None:
+        detail += f" (current version {current})"
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+def check_version(obj, expected_version: Optional[int]) -> None:
+    """409 unless expected_version is None or matches the loaded object."""
+    if expected_version is not None and obj.version != expected_version:
+        raise_version_conflict(obj.version)
+
+
+def _get(db: Session, model: Type, pk: Dict[str, Any]):
+    return db.get(model, tuple(pk.values()) if len(pk) > 1 else next(iter(pk.values())))
+
+
+def update_by_pk(
+    db: Session,
+    model: Type,
+    pk: Dict[str, Any],
+    values: Dict[str, Any],
+    expected_version: Optional[int] = None,
+):
+    """
+    UPDATE the row identified by pk ({column: value}) and return it as an
+    ORM object with the new values, or None if no such row. On versioned
+    tables the version is bumped, and with expected_version the UPDATE only
+    applies to that version (409 otherwise). Does NOT commit.
+    """
+    if not values:
+        obj = _get(db, model, pk)
+        if obj is not None:
+            check_version(obj, expected_version)
+        return obj
+
+    where = _pk_clause(model, pk)
+    if "version" in model.__table__.c:
+        values = {**values, "version": model.version + 1}
+        if expected_version is not None:
+            where.append(model.version == expected_version)
+
+    stmt = update(model).where(*where).values(**values)
+    if db.get_bind().dialect.update_returning:
+        obj = db.scalars(
+            stmt.returning(model),
+            execution_options={"synchronize_session": False, "populate_existing": True},
+        ).one_or_none()
+    else:
+        # MySQL: rowcount is the number of matched rows (the dialect sets
+        # CLIENT.FOUND_ROWS), so an UPDATE that changes nothing still counts.
+        result = db.execute(stmt.execution_options(synchronize_session=False))
+        obj = None
+        if result.rowcount:
+            obj = (
+                db.query(model)
+                .filter(*_pk_clause(model, pk))
+                .populate_existing()
+                .one()
+            )
+
+    if obj is None and expected_version is not None:
+        # Missing row, or the version guard did not match?
+        current = _get(db, model, pk)
+        if current is not None:
+            db.rollback()
+            raise_version_conflict(current.version)
+    return obj
+
+
+def delete_by_pk(db: Session, model: Type, pk: Dict[str, Any]) -> bool:
+    """DELETE the row identified by pk. Returns False if it did not exist. Does NOT commit."""
+    result = db.execute(
+        delete(model)
+        .where(*_pk_clause(model, pk))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def commit_and_keep(db: Session) -> None:
+    """Commit, leaving loaded objects as they are instead of expiring them."""
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise_version_conflict()
+    finally:
+        db.expire_on_commit = expire_on_commit
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from fastapi import Header, HTTPException, Response
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, obj) -> None:
+    """ETag of a versioned row (employees, leave requests, leave quotas)."""
+    response.headers["ETag"] = etag(obj.version)
+
+
+def if_match_version(if_match: Optional[str] = Header(default=None)) -> Optional[int]:
+    """
+    Version a client expects to overwrite, from an If-Match header holding an
+    ETag we sent ("3" or W/"3"). None when absent or "*".
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this API")
+
+
+def expected_version(body_version: Optional[int], header_version: Optional[int]) -> Optional[int]:
+    """The body's version field wins over If-Match; they must agree if both are sent."""
+    if body_version is not None and header_version is not None and body_version != header_version:
+        raise HTTPException(status_code=400, detail="version and If-Match disagree")
+    return body_version if body_version is not None else header_version
@@ -0,0 +1,189 @@
+"""
+In-process pub/sub for leave request changes, served as Server-Sent Events.
+
+Every committed leave request change (created / updated / reviewed /
+cancelled / deleted) is published here by the outbox worker (app.outbox).
+Each SSE connection subscribes with an emp_no or manager_emp_no filter and
+gets its own bounded asyncio queue; a subscriber that falls
+LEAVE_EVENT_QUEUE_SIZE events behind is disconnected rather than buffered
+without limit, and resumes by reconnecting with Last-Event-ID.
+
+The last LEAVE_EVENT_HISTORY_SIZE events are kept for that resume. Event
+ids are "<boot>-<seq>"; an id from another process lifetime, or one older
+than the history, gets a single "reset" event telling the client to
+refetch its list once.
+
+Events only reach subscribers connected to the same process. With several
+API workers, clients may miss events from the others and should keep a
+slow fallback poll.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+LEAVE_EVENT_QUEUE_SIZE = int(os.getenv("LEAVE_EVENT_QUEUE_SIZE", "100"))
+LEAVE_EVENT_HISTORY_SIZE = int(os.getenv("LEAVE_EVENT_HISTORY_SIZE", "1000"))
+LEAVE_EVENT_HEARTBEAT_SECONDS = float(os.getenv("LEAVE_EVENT_HEARTBEAT_SECONDS", "15"))
+
+_BOOT = str(int(time.time()))
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, emp_no: Optional[int],
+                 manager_emp_no: Optional[int], queue_size: int):
+        self.loop = loop
+        self.emp_no = emp_no
+        self.manager_emp_no = manager_emp_no
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.emp_no is not None and event["emp_no"] == self.emp_no:
+            return True
+        if self.manager_emp_no is not None and event["manager_emp_no"] == self.manager_emp_no:
+            return True
+        return False
+
+    def _offer(self, event: dict) -> None:
+        # Runs on the subscriber's event loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake the reader so it can close the stream.
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class LeaveEventBroker:
+    def __init__(self, queue_size: int = LEAVE_EVENT_QUEUE_SIZE,
+                 history_size: int = LEAVE_EVENT_HISTORY_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._history: Deque[dict] = deque(maxlen=history_size)
+        self._source_ids: Deque[int] = deque(maxlen=history_size)
+        self._subscriptions: List[Subscription] = []
+
+    def publish(self, event_type: str, leave_id: int, emp_no: int,
+                manager_emp_no: Optional[int], status: Optional[str],
+                source_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Record and fan out an event. Call after the change is committed.
+        Safe to call from any thread.
+
+        source_id (the outbox row id) makes redelivery idempotent: an event
+        whose source_id is still in the history is not published again.
+        """
+        with self._lock:
+            if source_id is not None:
+                if source_id in self._source_ids:
+                    return None
+                self._source_ids.append(source_id)
+            event = {
+                "id": f"{_BOOT}-{next(self._seq)}",
+                "type": event_type,
+                "leave_id": leave_id,
+                "emp_no": emp_no,
+                "manager_emp_no": manager_emp_no,
+                "status": status,
+            }
+            self._history.append(event)
+            subscriptions = [s for s in self._subscriptions if s.matches(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # Loop already closed; the subscription is about to go away.
+                pass
+        return event
+
+    def subscribe(self, emp_no: Optional[int] = None,
+                  manager_emp_no: Optional[int] = None) -> Subscription:
+        """Must be called from the event loop that will read the subscription."""
+        subscription = Subscription(asyncio.get_running_loop(), emp_no, manager_emp_no, self.queue_size)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def replay(self, subscription: Subscription, last_event_id: str) -> Optional[List[dict]]:
+        """
+        Events after last_event_id that match the subscription, or None if
+        they can no longer be replayed (other process lifetime, or older
+        than the history).
+        """
+        boot, _, seq = last_event_id.partition("-")
+        if boot != _BOOT or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            history = list(self._history)
+        if history and event_seq(history[0]) > seq + 1:
+            return None
+        return [
+            event for event in history
+            if event_seq(event) > seq and subscription.matches(event)
+        ]
+
+
+def event_seq(event: dict) -> int:
+    return int(event["id"].split("-")[1])
+
+
+def format_sse(event: Optional[dict] = None, event_type: Optional[str] = None,
+               comment: Optional[str] = None) -> str:
+    if comment is not None:
+        return f": {comment}\n\n"
+    lines = []
+    if event is not None and "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event_type or event['type']}")
+    lines.append(f"data: {json.dumps(event or {})}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(request, subscription: Subscription, broker: LeaveEventBroker,
+                        last_event_id: Optional[str] = None,
+                        heartbeat_seconds: float = LEAVE_EVENT_HEARTBEAT_SECONDS):
+    """SSE body for one subscription: replay, then live events with heartbeats."""
+    try:
+        yield "retry: 3000\n\n"
+        sent_seq = 0
+        if last_event_id:
+            missed = broker.replay(subscription, last_event_id)
+            if missed is None:
+                yield format_sse({}, event_type="reset")
+            else:
+                for event in missed:
+                    sent_seq = event_seq(event)
+                    yield format_sse(event)
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield format_sse(comment="keep-alive")
+                continue
+            if event is None:
+                # Fell too far behind: close; the client resumes with Last-Event-ID.
+                break
+            # Already sent by the replay (published between subscribe and replay).
+            if event_seq(event) <= sent_seq:
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+leave_events = LeaveEventBroker()
@@ -0,0 +1,81 @@
+"""
+Scheduled expiry of stale PENDING leave requests.
+
+Requests nobody reviewed before they started (and, optionally, requests
+older than LEAVE_PENDING_MAX_AGE_DAYS) are cancelled by
+crud.leave_requests.expire_pending_leave_requests, so the pending set that
+manager inboxes scan stays small. LeaveExpiryScheduler runs it every
+LEAVE_EXPIRY_INTERVAL_SECONDS in a background thread; set the interval to 0
+to disable it and run scripts/expire_pending_leave_requests.py from cron
+instead. Running several schedulers at once is safe: chunks are locked and
+the UPDATE only touches rows that are still PENDING.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import leave_requests
+
+logger = logging.getLogger(__name__)
+
+LEAVE_EXPIRY_INTERVAL_SECONDS = float(os.getenv("LEAVE_EXPIRY_INTERVAL_SECONDS", "3600"))
+_max_age = os.getenv("LEAVE_PENDING_MAX_AGE_DAYS")
+LEAVE_PENDING_MAX_AGE_DAYS: Optional[int] = int(_max_age) if _max_age else None
+
+
+class LeaveExpiryScheduler:
+    """Background thread expiring stale PENDING requests every interval_seconds."""
+
+    def __init__(
+        self,
+        interval_seconds: float = LEAVE_EXPIRY_INTERVAL_SECONDS,
+        max_age_days: Optional[int] = LEAVE_PENDING_MAX_AGE_DAYS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_age_days = max_age_days
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    def start(self, session_factory: sessionmaker) -> None:
+        if self.interval_seconds <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._session_factory = session_factory
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="leave-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> dict:
+        db = self._session_factory()
+        try:
+            counts = leave_requests.expire_pending_leave_requests(db, max_age_days=self.max_age_days)
+        finally:
+            db.close()
+        if counts["expired"]:
+            logger.info(
+                f"Expired {counts['expired']} pending leave requests "
+                f"(past start: {counts['past_start']}, too old: {counts['too_old']})"
+            )
+        return counts
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Leave expiry run failed")
+            self._stopping.wait(self.interval_seconds)
+
+
+leave_expiry_scheduler = LeaveExpiryScheduler()
@@ -1,10 +1,13 @@
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.db import Base, engine
-from app.api import employees, departments, leave_requests, leave_quotas, auth,salary_routes
+from app.db import Base, SessionLocal, engine
+from app.outbox import outbox_worker
+from app.leave_expiry import leave_expiry_scheduler
+from app.api import employees, departments, leave_requests, leave_quotas, auth,salary_routes, calendar
 
 # ----- Logging config -----
 logging.basicConfig(
@@ -26,9 +29,21 @@ logger = logging.getLogger("hr_portal")
 # In a real project you'd usually manage this via Alembic migrations instead.
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs leave request side effects queued in the outbox table.
+    outbox_worker.start(SessionLocal)
+    # Cancels PENDING requests that were never reviewed in time.
+    leave_expiry_scheduler.start(SessionLocal)
+    yield
+    leave_expiry_scheduler.stop()
+    outbox_worker.stop()
+
+
 app = FastAPI(
     title="HR Portal API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -53,6 +68,7 @@ app.include_router(leave_requests.router)
 app.include_router(leave_quotas.router)
 app.include_router(auth.router)
 app.include_router(salary_routes.router)
+app.include_router(calendar.router)
 
 
 @app.get("/")
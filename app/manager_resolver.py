@@ -0,0 +1,136 @@
+"""
+In-process employee -> manager resolution.
+
+Holds two maps, loaded lazily in one pass each:
+  - emp_no  -> current dept_no   (latest current dept_emp row)
+  - dept_no -> current manager   (latest current dept_manager row)
+
+so resolving a manager on the hot path (leave request creation) costs no
+queries. The maps are dropped whenever a statement writes to dept_emp or
+dept_manager through any engine in this process (ORM flushes and raw SQL
+alike), and after MANAGER_CACHE_TTL_SECONDS as a backstop for writes made
+by other processes.
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.models import FAR_FUTURE
+
+MANAGER_CACHE_TTL_SECONDS = float(os.getenv("MANAGER_CACHE_TTL_SECONDS", "300"))
+
+_WRITE_TO_DEPT_TABLES = re.compile(
+    r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b.*\b(dept_emp|dept_manager)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+_DIRTY_KEY = "manager_resolver_dirty"
+
+
+class ManagerResolver:
+    def __init__(self, ttl_seconds: float = MANAGER_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._maps: Optional[Tuple[Dict[int, str], Dict[str, int]]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._maps = None
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._maps is not None
+            and time.monotonic() - self._loaded_at < self.ttl_seconds
+        )
+
+    def _load(self, db: Session) -> Tuple[Dict[int, str], Dict[str, int]]:
+        # Keep the latest from_date per key, matching the ORDER BY from_date DESC
+        # LIMIT 1 semantics of the original per-request queries.
+        emp_dept: Dict[int, str] = {}
+        latest = {}
+        for emp_no, dept_no, from_date in (
+            db.query(models.DeptEmp.emp_no, models.DeptEmp.dept_no, models.DeptEmp.from_date)
+            .filter(models.DeptEmp.to_date == FAR_FUTURE)
+        ):
+            if emp_no not in latest or from_date > latest[emp_no]:
+                latest[emp_no] = from_date
+                emp_dept[emp_no] = dept_no
+
+        dept_manager: Dict[str, int] = {}
+        latest = {}
+        for emp_no, dept_no, from_date in (
+            db.query(models.DeptManager.emp_no, models.DeptManager.dept_no, models.DeptManager.from_date)
+            .filter(models.DeptManager.to_date == FAR_FUTURE)
+        ):
+            if dept_no not in latest or from_date > latest[dept_no]:
+                latest[dept_no] = from_date
+                dept_manager[dept_no] = emp_no
+
+        return emp_dept, dept_manager
+
+    def _get_maps(self, db: Session) -> Tuple[Dict[int, str], Dict[str, int]]:
+        if self._is_fresh():
+            return self._maps
+        with self._lock:
+            if self._is_fresh():
+                return self._maps
+            generation = self._generation
+            maps = self._load(db)
+            # Only publish if nothing was invalidated while we were loading.
+            if generation == self._generation:
+                self._maps = maps
+                self._loaded_at = time.monotonic()
+            return maps
+
+    def resolve(self, db: Session, emp_no: int) -> Optional[int]:
+        """Current manager emp_no for an employee, or None."""
+        emp_dept, dept_manager = self._get_maps(db)
+        dept_no = emp_dept.get(emp_no)
+        if dept_no is None:
+            return None
+        return dept_manager.get(dept_no)
+
+    def resolve_many(self, db: Session, emp_nos: Iterable[int]) -> Dict[int, Optional[int]]:
+        """Resolve managers for many employees against a single snapshot."""
+        emp_dept, dept_manager = self._get_maps(db)
+        result = {}
+        for emp_no in emp_nos:
+            dept_no = emp_dept.get(emp_no)
+            result[emp_no] = dept_manager.get(dept_no) if dept_no is not None else None
+        return result
+
+    def current_dept(self, db: Session, emp_no: int) -> Optional[str]:
+        emp_dept, _ = self._get_maps(db)
+        return emp_dept.get(emp_no)
+
+
+manager_resolver = ManagerResolver()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _track_dept_writes(conn, cursor, statement, parameters, context, executemany):
+    if "dept_" in statement and _WRITE_TO_DEPT_TABLES.match(statement):
+        conn.info[_DIRTY_KEY] = True
+        manager_resolver.invalidate()
+
+
+@event.listens_for(Engine, "commit")
+def _invalidate_on_commit(conn):
+    # Invalidate again once the write is visible, so a reload that raced the
+    # uncommitted write cannot leave stale maps behind.
+    if conn.info.pop(_DIRTY_KEY, False):
+        manager_resolver.invalidate()
+
+
+@event.listens_for(Engine, "rollback")
+def _invalidate_on_rollback(conn):
+    if conn.info.pop(_DIRTY_KEY, False):
+        manager_resolver.invalidate()
@@ -1,5 +1,8 @@
 from datetime import date, datetime
+from typing import Optional
+
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
@@ -8,10 +11,25 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     SmallInteger,
+    Text,
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy import Index, PrimaryKeyConstraint, UniqueConstraint
 from .db import Base
+from .recurrence import mask_weekdays
+
+# to_date sentinel marking the current row in dept_emp / dept_manager / titles / salaries.
+FAR_FUTURE = date(9999, 1, 1)
+
+
+def recurrence_dict(leave) -> Optional[dict]:
+    """API form of a leave request's recurrence columns (schemas.LeaveRecurrence)."""
+    if leave.recurrence_weekdays is None:
+        return None
+    return {
+        "weekdays": mask_weekdays(leave.recurrence_weekdays),
+        "interval_weeks": leave.recurrence_interval_weeks or 1,
+    }
 
 
 class Employee(Base):
@@ -23,6 +41,10 @@ class Employee(Base):
     last_name = Column(String(16), nullable=False)
     gender = Column(Enum("M", "F", name="gender_enum"), nullable=False)
     hire_date = Column(Date, nullable=False)
+    # Optimistic concurrency: bumped on every UPDATE, checked by the ORM on flush.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     leave_requests = relationship(
@@ -54,6 +76,24 @@ class Department(Base):
     dept_no = Column(String(4), primary_key=True, index=True)
     dept_name = Column(String(40), nullable=False, unique=True)
 
+
+class DepartmentStats(Base):
+    """
+    Per-department aggregates over CURRENT dept_emp members.
+    Maintained incrementally by app.crud.department_stats on employee
+    create / transfer / update / delete, and fully rebuilt by
+    scripts/recompute_department_stats.py.
+    """
+    __tablename__ = "dept_stats"
+
+    dept_no = Column(String(4), ForeignKey("departments.dept_no", ondelete="CASCADE"), primary_key=True)
+    headcount = Column(Integer, nullable=False, default=0)
+    male_count = Column(Integer, nullable=False, default=0)
+    female_count = Column(Integer, nullable=False, default=0)
+    # Sum of date.toordinal(hire_date); average tenure is derived from it at read time.
+    hire_ordinal_sum = Column(BigInteger, nullable=False, default=0)
+
+
 class DeptManager(Base):
     __tablename__ = "dept_manager"
 
@@ -73,6 +113,8 @@ class DeptEmp(Base):
 
     __table_args__ = (
         PrimaryKeyConstraint("emp_no", "dept_no", "from_date", name="pk_dept_emp"),
+        # Department roster: current members of a dept, keyset-paged by emp_no.
+        Index("ix_dept_emp_dept_no_to_date_emp_no", "dept_no", "to_date", "emp_no"),
     )
 
 class Title(Base):
@@ -108,10 +150,74 @@ class EmployeeLeaveRequest(Base):
     manager_emp_no = Column(Integer, ForeignKey("employees.emp_no", ondelete="SET NULL"), nullable=True)
     employee_comment = Column(String(255), nullable=True)
     manager_comment = Column(String(255), nullable=True)
+    # Recurring leave (app.recurrence): weekday bitmask (Monday = 1) and every
+    # n-th week; NULL weekdays = every day from start_date to end_date.
+    recurrence_weekdays = Column(SmallInteger, nullable=True)
+    recurrence_interval_weeks = Column(SmallInteger, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @property
+    def recurrence(self) -> Optional[dict]:
+        return recurrence_dict(self)
 
     employee = relationship("Employee", back_populates="leave_requests", foreign_keys=[emp_no])
     manager = relationship("Employee", back_populates="managed_leave_requests", foreign_keys=[manager_emp_no])
 
+    __table_args__ = (
+        # Manager inbox: WHERE manager_emp_no = ? AND status = ? ORDER BY requested_at DESC.
+        # InnoDB appends the PK (leave_id) to secondary indexes, which covers the
+        # (requested_at, leave_id) keyset tie-break as well.
+        Index("ix_leave_requests_manager_status_requested", "manager_emp_no", "status", "requested_at"),
+        # Overlap probe: WHERE emp_no = ? AND start_date <= ? AND end_date >= ?.
+        Index("ix_leave_requests_emp_dates", "emp_no", "start_date", "end_date"),
+        # GET /leave-requests listings, newest first, per filter combination.
+        Index("ix_leave_requests_requested", "requested_at"),
+        Index("ix_leave_requests_status_requested", "status", "requested_at"),
+        Index("ix_leave_requests_emp_requested", "emp_no", "requested_at"),
+    )
+
+
+class EmployeeLeaveRequestArchive(Base):
+    """
+    Decided requests moved out of employee_leave_requests by
+    crud.leave_archive.archive_leave_requests. Same columns (leave_id kept),
+    plus archived_at; rows here are read-only.
+    """
+    __tablename__ = "employee_leave_requests_archive"
+
+    leave_id = Column(Integer, primary_key=True, autoincrement=False)
+    emp_no = Column(Integer, ForeignKey("employees.emp_no", ondelete="CASCADE"), nullable=False)
+    leave_type_id = Column(SmallInteger, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    days_requested = Column(Integer, nullable=False)
+    status = Column(
+        Enum("PENDING", "APPROVED", "REJECTED", "CANCELLED", name="leave_status_enum"),
+        nullable=False,
+    )
+    requested_at = Column(DateTime, nullable=False)
+    decided_at = Column(DateTime, nullable=True)
+    manager_emp_no = Column(Integer, nullable=True)
+    employee_comment = Column(String(255), nullable=True)
+    manager_comment = Column(String(255), nullable=True)
+    recurrence_weekdays = Column(SmallInteger, nullable=True)
+    recurrence_interval_weeks = Column(SmallInteger, nullable=True)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    @property
+    def recurrence(self) -> Optional[dict]:
+        return recurrence_dict(self)
+
+    __table_args__ = (
+        # History listings, newest first (see crud.leave_requests.leave_requests_query).
+        Index("ix_leave_archive_requested", "requested_at"),
+        Index("ix_leave_archive_emp_requested", "emp_no", "requested_at"),
+        Index("ix_leave_archive_manager_requested", "manager_emp_no", "requested_at"),
+    )
+
 
 class EmployeeLeaveQuota(Base):
     __tablename__ = "employee_leave_quota"
@@ -120,9 +226,105 @@ class EmployeeLeaveQuota(Base):
     year = Column(Integer, primary_key=True)
     leave_type_id = Column(SmallInteger, primary_key=True)  # 0=paid, 2=sick
     annual_quota_days = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     employee = relationship("Employee", back_populates="leave_quotas")
 
+
+class LeaveLedgerEntry(Base):
+    """
+    Append-only history of leave balance movements.
+      GRANT / ADJUSTMENT -> entitlement (ADJUSTMENT may be negative)
+      DEDUCTION / REVERSAL -> days used (an approval and its undo)
+    """
+    __tablename__ = "leave_ledger"
+
+    entry_id = Column(Integer, primary_key=True, autoincrement=True)
+    emp_no = Column(Integer, ForeignKey("employees.emp_no", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)
+    leave_type_id = Column(SmallInteger, nullable=False)
+    entry_type = Column(
+        Enum("GRANT", "ADJUSTMENT", "DEDUCTION", "REVERSAL", name="leave_ledger_entry_enum"),
+        nullable=False,
+    )
+    days = Column(Integer, nullable=False)
+    # No foreign key: the request may have moved to employee_leave_requests_archive.
+    leave_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    note = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("ix_leave_ledger_emp_year_type", "emp_no", "year", "leave_type_id"),
+        Index("ix_leave_ledger_leave_id", "leave_id"),
+    )
+
+
+class LeaveBalance(Base):
+    """
+    Materialized per-(emp, year, type) balance, updated in the same
+    transaction as every ledger entry (see app.crud.leave_ledger).
+    available = entitled_days - used_days, which is kept equal to
+    employee_leave_quota.annual_quota_days.
+    """
+    __tablename__ = "leave_balance"
+
+    emp_no = Column(Integer, ForeignKey("employees.emp_no", ondelete="CASCADE"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    leave_type_id = Column(SmallInteger, primary_key=True)
+    entitled_days = Column(Integer, nullable=False, default=0)
+    used_days = Column(Integer, nullable=False, default=0)
+    pending_days = Column(Integer, nullable=False, default=0)
+
+
+class Holiday(Base):
+    """
+    Non-working day. dept_no NULL = company-wide; otherwise the holiday only
+    applies to that department (regional holidays).
+    """
+    __tablename__ = "holidays"
+
+    holiday_id = Column(Integer, primary_key=True, autoincrement=True)
+    holiday_date = Column(Date, nullable=False)
+    dept_no = Column(String(4), ForeignKey("departments.dept_no", ondelete="CASCADE"), nullable=True)
+    name = Column(String(100), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("holiday_date", "dept_no", name="uq_holidays_date_dept"),
+    )
+
+
+class OutboxMessage(Base):
+    """
+    Side effect to run after a commit (see app.outbox). Written in the same
+    transaction as the change that causes it, drained by the outbox worker.
+    """
+    __tablename__ = "outbox"
+
+    outbox_id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(
+        Enum("PENDING", "DONE", "FAILED", name="outbox_status_enum"),
+        nullable=False,
+        default="PENDING",
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False)  # not claimed/retried before this
+    claim_token = Column(String(32), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    last_error = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Worker poll: WHERE status = 'PENDING' AND available_at <= ? ORDER BY outbox_id.
+        Index("ix_outbox_status_available", "status", "available_at"),
+        # Retention: WHERE status = 'DONE' AND processed_at < ? (outbox.purge_processed).
+        Index("ix_outbox_status_processed", "status", "processed_at"),
+    )
+
+
 class AuthUser(Base):
     __tablename__ = "auth_users"
 
@@ -0,0 +1,273 @@
+"""
+Transactional outbox.
+
+Side effects of a change (today: fanning leave request events out to SSE
+subscribers) are not run inline. enqueue() adds an outbox row in the
+caller's transaction, so the side effect exists if and only if the change
+committed; OutboxWorker runs them afterwards in a background thread:
+
+  - batches of up to OUTBOX_BATCH_SIZE rows are claimed with a guarded
+    UPDATE (claim token + lease), so several workers never run the same
+    row at the same time,
+  - each row's handlers run; success marks it DONE,
+  - failures are retried with exponential backoff and marked FAILED after
+    OUTBOX_MAX_ATTEMPTS,
+  - a worker that dies mid-batch lets the lease expire and the rows are
+    picked up again: delivery is at-least-once, so handlers must be
+    idempotent (they get the outbox_id to deduplicate on),
+  - DONE rows older than OUTBOX_RETENTION_HOURS are deleted in chunks
+    (purge_processed), by the worker every OUTBOX_PURGE_INTERVAL_SECONDS
+    while idle or by scripts/purge_outbox.py; FAILED rows are kept for
+    inspection.
+
+Handlers are registered per topic in HANDLERS.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.leave_events import leave_events
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_LEASE_SECONDS = 60
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "168"))
+OUTBOX_PURGE_INTERVAL_SECONDS = float(os.getenv("OUTBOX_PURGE_INTERVAL_SECONDS", "3600"))
+OUTBOX_PURGE_CHUNK_SIZE = 1000
+
+LEAVE_REQUEST_CHANGED = "leave_request.changed"
+
+
+def _publish_leave_event(outbox_id: int, payload: dict) -> None:
+    leave_events.publish(
+        payload["event_type"],
+        payload["leave_id"],
+        payload["emp_no"],
+        payload["manager_emp_no"],
+        payload["status"],
+        source_id=outbox_id,
+    )
+
+
+HANDLERS: Dict[str, List[Callable[[int, dict], None]]] = {
+    LEAVE_REQUEST_CHANGED: [_publish_leave_event],
+}
+
+
+def enqueue(db: Session, topic: str, payload: dict) -> None:
+    """Add a side effect to the caller's transaction. Does NOT commit."""
+    now = datetime.utcnow()
+    db.add(models.OutboxMessage(
+        topic=topic,
+        payload=json.dumps(payload, default=str),
+        status="PENDING",
+        attempts=0,
+        available_at=now,
+        created_at=now,
+    ))
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(2 ** attempts, OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+def drain(db: Session, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Claim and process one batch of due outbox rows. Returns how many rows
+    were processed (successfully or not); 0 means nothing was due.
+    """
+    outbox = models.OutboxMessage
+    now = datetime.utcnow()
+    due = [
+        outbox_id for (outbox_id,) in db.query(outbox.outbox_id)
+        .filter(outbox.status == "PENDING", outbox.available_at <= now)
+        .order_by(outbox.outbox_id)
+        .limit(batch_size)
+    ]
+    if not due:
+        db.rollback()
+        return 0
+
+    token = uuid.uuid4().hex
+    db.execute(
+        update(outbox)
+        .where(
+            outbox.outbox_id.in_(due),
+            outbox.status == "PENDING",
+            outbox.available_at <= now,
+        )
+        .values(claim_token=token, available_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    claimed = (
+        db.query(outbox.outbox_id, outbox.topic, outbox.payload, outbox.attempts)
+        .filter(outbox.claim_token == token)
+        .order_by(outbox.outbox_id)
+        .all()
+    )
+    done, failed = [], []
+    for outbox_id, topic, payload, attempts in claimed:
+        try:
+            for handler in HANDLERS.get(topic, ()):
+                handler(outbox_id, json.loads(payload))
+        except Exception as exc:
+            logger.exception(f"Outbox message {outbox_id} ({topic}) failed")
+            attempts += 1
+            failed.append({
+                "b_outbox_id": outbox_id,
+                "b_attempts": attempts,
+                "b_status": "FAILED" if attempts >= OUTBOX_MAX_ATTEMPTS else "PENDING",
+                "b_available_at": datetime.utcnow() + _backoff(attempts),
+                "b_last_error": str(exc)[:255],
+            })
+        else:
+            done.append({"b_outbox_id": outbox_id})
+
+    table = outbox.__table__
+    if done:
+        db.execute(
+            update(table)
+            .where(table.c.outbox_id == bindparam("b_outbox_id"), table.c.claim_token == token)
+            .values(status="DONE", processed_at=datetime.utcnow(), claim_token=None),
+            done,
+        )
+    if failed:
+        db.execute(
+            update(table)
+            .where(table.c.outbox_id == bindparam("b_outbox_id"), table.c.claim_token == token)
+            .values(
+                status=bindparam("b_status"),
+                attempts=bindparam("b_attempts"),
+                available_at=bindparam("b_available_at"),
+                last_error=bindparam("b_last_error"),
+                claim_token=None,
+            ),
+            failed,
+        )
+    db.commit()
+    return len(claimed)
+
+
+def purge_processed(
+    db: Session,
+    retention_hours: float = OUTBOX_RETENTION_HOURS,
+    chunk_size: int = OUTBOX_PURGE_CHUNK_SIZE,
+) -> int:
+    """
+    Delete DONE rows processed more than retention_hours ago, chunk_size
+    rows per DELETE and transaction, so the outbox only holds recent
+    history. Returns how many rows were deleted.
+    """
+    outbox = models.OutboxMessage
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    deleted = 0
+    while True:
+        ids = [
+            outbox_id for (outbox_id,) in db.query(outbox.outbox_id)
+            .filter(outbox.status == "DONE", outbox.processed_at < cutoff)
+            .order_by(outbox.outbox_id)
+            .limit(chunk_size)
+        ]
+        if not ids:
+            db.rollback()
+            return deleted
+        db.execute(
+            delete(outbox)
+            .where(outbox.outbox_id.in_(ids), outbox.status == "DONE")
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += len(ids)
+
+
+class OutboxWorker:
+    """Background thread draining the outbox; wake() skips the poll wait."""
+
+    def __init__(
+        self,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+        purge_interval_seconds: float = OUTBOX_PURGE_INTERVAL_SECONDS,
+    ):
+        self.poll_seconds = poll_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._last_purge: Optional[float] = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    def start(self, session_factory: sessionmaker) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._session_factory = session_factory
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        errors = 0
+        while not self._stopping.is_set():
+            # Cleared before draining, so a wake() during the drain is not lost.
+            self._wakeup.clear()
+            db = self._session_factory()
+            try:
+                processed = drain(db)
+                errors = 0
+            except Exception:
+                logger.exception("Outbox worker could not drain the outbox")
+                processed = 0
+                errors += 1
+            finally:
+                db.close()
+            if processed:
+                continue  # more may be due; keep going without waiting
+            self._purge_if_due()
+            wait = self.poll_seconds
+            if errors:
+                wait = min(self.poll_seconds * 2 ** errors, OUTBOX_MAX_BACKOFF_SECONDS)
+            self._wakeup.wait(wait)
+
+    def _purge_if_due(self) -> None:
+        if self.purge_interval_seconds <= 0:
+            return
+        now = time.monotonic()
+        if self._last_purge is not None and now - self._last_purge < self.purge_interval_seconds:
+            return
+        self._last_purge = now
+        db = self._session_factory()
+        try:
+            deleted = purge_processed(db)
+            if deleted:
+                logger.info(f"Purged {deleted} processed outbox rows")
+        except Exception:
+            logger.exception("Outbox worker could not purge processed rows")
+        finally:
+            db.close()
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,114 @@
+"""
+Recurring leave.
+
+A recurring leave request is one employee_leave_requests row: start_date
+and end_date bound the series, and the rule is two columns,
+recurrence_weekdays (bitmask, Monday = 1 << 0 .. Sunday = 1 << 6) and
+recurrence_interval_weeks (every n-th week, counted from the week of
+start_date). "Every Friday for a quarter" is one row, not thirteen.
+
+The occurrences are never stored. Everything that needs them expands the
+rule lazily into runs of consecutive days, (first, last) pairs in date
+order; a plain request is the single run (start_date, end_date). Runs feed:
+
+  - days_requested: working days summed over the runs, against one
+    working-calendar span (WorkingDayCalendar.working_days_in);
+  - overlap checks: runs_overlap walks two run streams side by side and
+    stops at the first shared day;
+  - the department absence calendar, which sweeps each run like a request.
+
+Since start_date / end_date still bound every occurrence, the existing
+(emp_no, start_date, end_date) index finds candidates; only those that are
+recurring need expanding. Like any request, a series spans at most
+crud.leave_requests.MAX_LEAVE_SPAN_DAYS days, so no rule expands without bound.
+"""
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+Run = Tuple[date, date]
+
+ONE_DAY = timedelta(days=1)
+
+
+class Recurrence(NamedTuple):
+    weekdays: int           # bitmask, Monday = 1 << 0
+    interval_weeks: int = 1
+
+
+def weekdays_mask(weekdays: Iterable[int]) -> int:
+    mask = 0
+    for weekday in weekdays:
+        mask |= 1 << weekday
+    return mask
+
+
+def mask_weekdays(mask: int) -> List[int]:
+    return [weekday for weekday in range(7) if mask >> weekday & 1]
+
+
+def recurrence_of(row) -> Optional[Recurrence]:
+    """The rule of a leave request row (ORM object or result row), None if not recurring."""
+    if row.recurrence_weekdays is None:
+        return None
+    return Recurrence(row.recurrence_weekdays, row.recurrence_interval_weeks or 1)
+
+
+def occurrences(start: date, end: date, recurrence: Recurrence) -> Iterator[date]:
+    """Days in [start, end] matching the rule, in order."""
+    offsets = mask_weekdays(recurrence.weekdays)
+    week = start - timedelta(days=start.weekday())
+    step_days = 7 * recurrence.interval_weeks
+    while True:
+        # Compare offsets rather than dates: near date.max the next day or
+        # week may not exist.
+        remaining = (end - week).days
+        for offset in offsets:
+            if offset > remaining:
+                return
+            day = week + timedelta(days=offset)
+            if day >= start:
+                yield day
+        if remaining < step_days:
+            return
+        week += timedelta(days=step_days)
+
+
+def leave_runs(start: date, end: date, recurrence: Optional[Recurrence] = None) -> Iterator[Run]:
+    """The leave's days as runs of consecutive days, in order."""
+    if recurrence is None:
+        yield start, end
+        return
+    first = last = None
+    for day in occurrences(start, end, recurrence):
+        if last is not None and day == last + ONE_DAY:
+            last = day
+            continue
+        if first is not None:
+            yield first, last
+        first = last = day
+    if first is not None:
+        yield first, last
+
+
+def clip_runs(runs: Iterable[Run], start: date, end: date) -> Iterator[Run]:
+    """The parts of runs inside [start, end]."""
+    for first, last in runs:
+        if last < start:
+            continue
+        if first > end:
+            return
+        yield max(first, start), min(last, end)
+
+
+def runs_overlap(a: Iterable[Run], b: Iterable[Run]) -> Optional[Run]:
+    """First span of days two run streams share, or None; stops as soon as one is found."""
+    a, b = iter(a), iter(b)
+    x, y = next(a, None), next(b, None)
+    while x is not None and y is not None:
+        if x[1] < y[0]:
+            x = next(a, None)
+        elif y[1] < x[0]:
+            y = next(b, None)
+        else:
+            return max(x[0], y[0]), min(x[1], y[1])
+    return None
@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import Optional, Literal
+from typing import Dict, List, Optional, Literal
 from pydantic import BaseModel, Field
 
 
@@ -32,14 +32,21 @@ class EmployeeUpdate(BaseModel):
     last_name: Optional[str] = Field(default=None, max_length=16)
     gender: Optional[Literal["M", "F"]] = None
     hire_date: Optional[date] = None
+    version: Optional[int] = None  # expected current version (or send If-Match); 409 if it changed
 
 
 class Employee(EmployeeBase):
     emp_no: int
+    version: int
 
     class Config:
         from_attributes = True
 
+class EmployeeTransfer(BaseModel):
+    dept_no: str = Field(max_length=4)
+    effective_date: Optional[date] = None  # defaults to today
+
+
 # ---- Employee search  ----
 class EmployeeSearchResult(BaseModel):
     emp_no: int
@@ -71,14 +78,68 @@ class Department(DepartmentBase):
         from_attributes = True
 
 
+class DepartmentMember(BaseModel):
+    emp_no: int
+    first_name: str
+    last_name: str
+    gender: str
+    hire_date: date
+    from_date: date  # when the employee joined this department
+    title: Optional[str] = None  # current title, if any
+
+    class Config:
+        from_attributes = True
+
+
+class DepartmentStats(BaseModel):
+    dept_no: str
+    headcount: int
+    male_count: int
+    female_count: int
+    avg_tenure_years: Optional[float] = None
+
+
+class DepartmentAbsence(BaseModel):
+    emp_no: int
+    first_name: str
+    last_name: str
+    leave_id: int
+    leave_type_id: int
+    status: str
+    start_date: date
+    end_date: date
+    recurrence: Optional["LeaveRecurrence"] = None
+
+
+class DepartmentAbsenceDay(BaseModel):
+    date: date
+    count: int            # distinct members out that day
+    emp_nos: List[int]
+
+
+class DepartmentAbsences(BaseModel):
+    dept_no: str
+    from_date: date
+    to_date: date
+    days: List[DepartmentAbsenceDay]
+    absences: List[DepartmentAbsence]
+
+
 # ---- Leave Request ----
 
+class LeaveRecurrence(BaseModel):
+    """Leave on these weekdays every interval_weeks weeks, between start_date and end_date"""
+    weekdays: List[Literal[0, 1, 2, 3, 4, 5, 6]] = Field(min_length=1)  # Monday=0 .. Sunday=6
+    interval_weeks: int = Field(1, ge=1, le=52)  # counted from the week of start_date
+
+
 class LeaveRequestBase(BaseModel):
     emp_no: int
     leave_type_id: Literal[0, 1, 2]  # 0=paid, 1=unpaid, 2=sick
     start_date: date
     end_date: date
     employee_comment: Optional[str] = None
+    recurrence: Optional[LeaveRecurrence] = None  # None = every day from start_date to end_date
 
 
 class LeaveRequestCreate(LeaveRequestBase):
@@ -93,6 +154,7 @@ class LeaveRequestUpdate(BaseModel):
     manager_emp_no: Optional[int] = None
     employee_comment: Optional[str] = None
     manager_comment: Optional[str] = None
+    version: Optional[int] = None  # expected current version (or send If-Match); 409 if it changed
 
 
 class LeaveRequestReview(BaseModel):
@@ -104,16 +166,49 @@ class LeaveRequestReview(BaseModel):
 class LeaveRequest(LeaveRequestBase):
     leave_id: int
     days_requested: int
-    status: Literal["PENDING", "APPROVED", "REJECTED"]
+    status: Literal["PENDING", "APPROVED", "REJECTED", "CANCELLED"]
     requested_at: datetime
     decided_at: Optional[datetime] = None
     manager_emp_no: Optional[int] = None
     manager_comment: Optional[str] = None
+    version: int
 
     class Config:
         from_attributes = True
 
 
+class LeaveRequestBulkReviewItem(LeaveRequestReview):
+    leave_id: int
+
+
+class LeaveRequestBulkReview(BaseModel):
+    """Schema for a manager to decide many leave requests in one call"""
+    items: List[LeaveRequestBulkReviewItem] = Field(min_length=1, max_length=1000)
+
+
+class LeaveReviewOutcome(BaseModel):
+    leave_id: int
+    ok: bool
+    status: Optional[str] = None  # status after the call (None if not found)
+    detail: Optional[str] = None  # why the item was not applied
+
+
+class LeaveImportError(BaseModel):
+    row: int     # line number in the CSV file (header = 1)
+    detail: str
+
+
+class LeaveImportResult(BaseModel):
+    imported: int  # rows written (or that would be, for a dry run)
+    failed: int
+    errors: List[LeaveImportError]
+
+
+class PendingCount(BaseModel):
+    manager_emp_no: int
+    pending: int
+
+
 # ---- Leave Quota ----
 
 class LeaveQuotaBase(BaseModel):
@@ -129,13 +224,107 @@ class LeaveQuotaCreate(LeaveQuotaBase):
 
 class LeaveQuotaUpdate(BaseModel):
     annual_quota_days: Optional[int] = None
+    version: Optional[int] = None  # expected current version (or send If-Match); 409 if it changed
 
 
 class LeaveQuota(LeaveQuotaBase):
+    version: int
+
+    class Config:
+        from_attributes = True
+
+
+class LeaveQuotaAdjustment(BaseModel):
+    emp_no: int
+    year: int
+    leave_type_id: Literal[0, 2]
+    days: Optional[int] = Field(default=None, ge=0)  # set the quota to this value
+    delta: Optional[int] = None                      # or add this (may be negative)
+
+
+class DepartmentQuotaRule(BaseModel):
+    """Applies days/delta to every current member of dept_no."""
+    dept_no: str
+    year: int
+    leave_type_id: Literal[0, 2]
+    days: Optional[int] = Field(default=None, ge=0)
+    delta: Optional[int] = None
+
+
+class LeaveQuotaBulkUpsert(BaseModel):
+    entries: List[LeaveQuotaAdjustment] = Field(default_factory=list, max_length=10000)
+    department_rules: List[DepartmentQuotaRule] = Field(default_factory=list, max_length=100)
+
+
+class LeaveQuotaBulkError(BaseModel):
+    index: int                     # position in entries / department_rules
+    dept_no: Optional[str] = None  # set when the row came from a department rule
+    emp_no: Optional[int] = None
+    year: int
+    leave_type_id: int
+    detail: str
+
+
+class LeaveQuotaBulkResult(BaseModel):
+    applied: int
+    failed: int
+    errors: List[LeaveQuotaBulkError]
+
+
+class LeaveBalance(BaseModel):
+    emp_no: int
+    year: int
+    leave_type_id: int
+    entitled_days: int
+    used_days: int
+    pending_days: int
+    available_days: int
+
+
+class LeaveTypeRolloverRule(BaseModel):
+    base_days: int = Field(ge=0)
+    carry_over_cap: int = Field(default=0, ge=0)      # max unused days carried into the new year
+    accrual_every_years: int = Field(default=0, ge=0)  # 0 disables tenure accrual
+    accrual_days: int = Field(default=0, ge=0)         # extra days per completed period of service
+    accrual_cap: int = Field(default=0, ge=0)          # max extra days from tenure
+
+
+class RolloverRules(BaseModel):
+    """Year-end rollover rules keyed by leave_type_id (0=paid, 2=sick)"""
+    rules: Dict[int, LeaveTypeRolloverRule] = {
+        0: LeaveTypeRolloverRule(
+            base_days=10, carry_over_cap=5, accrual_every_years=2, accrual_days=1, accrual_cap=5
+        ),
+        2: LeaveTypeRolloverRule(base_days=5),
+    }
+
+
+# ---- Working-day calendar ----
+
+class HolidayBase(BaseModel):
+    holiday_date: date
+    dept_no: Optional[str] = None  # None = company-wide
+    name: str = Field(max_length=100)
+
+
+class HolidayCreate(HolidayBase):
+    pass
+
+
+class Holiday(HolidayBase):
+    holiday_id: int
+
     class Config:
         from_attributes = True
 
 
+class WorkingDays(BaseModel):
+    start_date: date
+    end_date: date
+    dept_no: Optional[str] = None
+    working_days: int
+
+
 # ---- Auth / Login ----
 
 class LoginRequest(BaseModel):
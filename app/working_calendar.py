@@ -0,0 +1,148 @@
+"""
+In-process working-day calendar.
+
+A day is a working day unless it falls on a weekend day (WEEKEND_DAYS,
+Monday=0 .. Sunday=6) or is a holiday: company-wide holidays
+(holidays.dept_no IS NULL) apply to everyone, department holidays only to
+that department's members.
+
+Per scope (None = company-wide only, or a dept_no) the calendar keeps a
+cumulative array over whole years:
+
+    cumulative[i] = working days in [base, base + i days)
+
+so the working days of any range inside it cost two lookups. Arrays are
+built lazily for the years asked for, widened when a range falls outside
+them, dropped whenever holidays are written through app.crud.holidays, and
+after WORKING_CALENDAR_TTL_SECONDS as a backstop for writes made by other
+processes.
+
+Memory is bounded per scope: a scope's array is only widened up to
+MAX_SPAN_YEARS years (it is rebuilt around the new range beyond that), and
+at most MAX_CACHED_SCOPES scopes are kept, oldest dropped first. A single
+range may cover any number of years; the array then covers just that range.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app import models
+
+WEEKEND_DAYS = frozenset(
+    int(day) for day in os.getenv("WEEKEND_DAYS", "5,6").split(",") if day.strip()
+)
+WORKING_CALENDAR_TTL_SECONDS = float(os.getenv("WORKING_CALENDAR_TTL_SECONDS", "300"))
+MAX_CACHED_SCOPES = int(os.getenv("WORKING_CALENDAR_MAX_SCOPES", "64"))
+MAX_SPAN_YEARS = 10
+
+# (base date, cumulative working-day counts, monotonic build time)
+_Span = Tuple[date, List[int], float]
+
+
+class WorkingDayCalendar:
+    def __init__(
+        self,
+        ttl_seconds: float = WORKING_CALENDAR_TTL_SECONDS,
+        max_scopes: int = MAX_CACHED_SCOPES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._spans: Dict[Optional[str], _Span] = {}
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._spans = {}
+
+    def _covers(self, span: Optional[_Span], start: date, end: date) -> bool:
+        if span is None or time.monotonic() - span[2] >= self.ttl_seconds:
+            return False
+        base, cumulative, _ = span
+        return base <= start and (end - base).days + 1 < len(cumulative)
+
+    def _build(self, db: Session, dept_no: Optional[str], first_year: int, last_year: int) -> _Span:
+        base = date(first_year, 1, 1)
+        last = date(last_year, 12, 31)
+        holiday = models.Holiday
+        scope = holiday.dept_no.is_(None)
+        if dept_no is not None:
+            scope = or_(scope, holiday.dept_no == dept_no)
+        holidays = {
+            day for (day,) in db.query(holiday.holiday_date).filter(
+                holiday.holiday_date >= base, holiday.holiday_date <= last, scope
+            )
+        }
+
+        cumulative = [0] * ((last - base).days + 2)
+        for i in range(1, len(cumulative)):
+            # base + (i - 1), never stepping past `last` (date.max in year 9999).
+            day = base + timedelta(days=i - 1)
+            working = day.weekday() not in WEEKEND_DAYS and day not in holidays
+            cumulative[i] = cumulative[i - 1] + working
+        return base, cumulative, time.monotonic()
+
+    def _span(self, db: Session, dept_no: Optional[str], start: date, end: date) -> _Span:
+        span = self._spans.get(dept_no)
+        if self._covers(span, start, end):
+            return span
+        with self._lock:
+            span = self._spans.get(dept_no)
+            if self._covers(span, start, end):
+                return span
+            first_year, last_year = start.year, end.year
+            if span is not None:
+                # Widen rather than replace, so alternating ranges don't
+                # thrash, as long as the array stays within MAX_SPAN_YEARS.
+                widened_first = min(first_year, span[0].year)
+                widened_last = max(last_year, (span[0] + timedelta(days=len(span[1]) - 2)).year)
+                if widened_last - widened_first < MAX_SPAN_YEARS:
+                    first_year, last_year = widened_first, widened_last
+            generation = self._generation
+            span = self._build(db, dept_no, first_year, last_year)
+            # Only publish if nothing was invalidated while we were building.
+            if generation == self._generation:
+                spans = self._spans
+                if dept_no not in spans and len(spans) >= self.max_scopes:
+                    spans.pop(next(iter(spans)))
+                spans[dept_no] = span
+            return span
+
+    def working_days(
+        self, db: Session, start: date, end: date, dept_no: Optional[str] = None
+    ) -> int:
+        """
+        Working days in [start, end], inclusive (0 if end < start).
+        """
+        if end < start:
+            return 0
+        base, cumulative, _ = self._span(db, dept_no, start, end)
+        return cumulative[(end - base).days + 1] - cumulative[(start - base).days]
+
+    def working_days_in(
+        self,
+        db: Session,
+        runs: Iterable[Tuple[date, date]],
+        start: date,
+        end: date,
+        dept_no: Optional[str] = None,
+    ) -> int:
+        """
+        Working days in all of runs ((first, last) ranges, each inside
+        [start, end]); one span for the whole bound, two lookups per run.
+        """
+        if end < start:
+            return 0
+        base, cumulative, _ = self._span(db, dept_no, start, end)
+        return sum(
+            cumulative[(last - base).days + 1] - cumulative[(first - base).days]
+            for first, last in runs
+        )
+
+
+working_calendar = WorkingDayCalendar()
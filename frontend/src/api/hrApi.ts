@@ -50,6 +50,16 @@ export async function fetchManagerPendingLeaveRequests(
   return res.data;
 }
 
+export async function fetchManagerPendingCount(
+  managerEmpNo: number
+): Promise<number> {
+  const res = await api.get<{ manager_emp_no: number; pending: number }>(
+    "/leave-requests/pending-count",
+    { params: { manager_emp_no: managerEmpNo } }
+  );
+  return res.data.pending;
+}
+
 export async function updateLeaveRequest(
   leaveId: number,
   payload: UpdateLeaveRequestPayload
@@ -57,3 +67,33 @@ export async function updateLeaveRequest(
   const res = await api.put<LeaveRequest>(`/leave-requests/${leaveId}`, payload);
   return res.data;
 }
+
+export interface LeaveRequestEvent {
+  id: string;
+  type: "created" | "updated" | "reviewed" | "cancelled" | "expired" | "deleted";
+  leave_id: number;
+  emp_no: number;
+  manager_emp_no: number | null;
+  status: LeaveRequest["status"] | null;
+}
+
+// Push updates instead of polling /leave-requests. EventSource reconnects on
+// its own and sends Last-Event-ID, so missed events are replayed; onReset
+// fires when the gap is too old to replay and the list should be refetched.
+export function subscribeLeaveRequestEvents(
+  filter: { empNo?: number; managerEmpNo?: number },
+  onEvent: (event: LeaveRequestEvent) => void,
+  onReset: () => void
+): () => void {
+  const params = new URLSearchParams();
+  if (filter.empNo !== undefined) params.set("emp_no", String(filter.empNo));
+  if (filter.managerEmpNo !== undefined) params.set("manager_emp_no", String(filter.managerEmpNo));
+
+  const source = new EventSource(`${api.defaults.baseURL}/leave-requests/events?${params}`);
+  const handle = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+  for (const type of ["created", "updated", "reviewed", "cancelled", "expired", "deleted"]) {
+    source.addEventListener(type, handle);
+  }
+  source.addEventListener("reset", () => onReset());
+  return () => source.close();
+}
@@ -63,7 +63,8 @@ CREATE TABLE `dept_emp` (
   `from_date` date NOT NULL,
   `to_date` date NOT NULL,
   PRIMARY KEY (`emp_no`,`dept_no`),
-  KEY `dept_no` (`dept_no`)
+  KEY `dept_no` (`dept_no`),
+  KEY `ix_dept_emp_dept_no_to_date_emp_no` (`dept_no`,`to_date`,`emp_no`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -84,6 +85,24 @@ CREATE TABLE `dept_manager` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `dept_stats`
+--
+
+DROP TABLE IF EXISTS `dept_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `dept_stats` (
+  `dept_no` char(4) NOT NULL,
+  `headcount` int NOT NULL,
+  `male_count` int NOT NULL,
+  `female_count` int NOT NULL,
+  `hire_ordinal_sum` bigint NOT NULL,
+  PRIMARY KEY (`dept_no`),
+  CONSTRAINT `dept_stats_ibfk_1` FOREIGN KEY (`dept_no`) REFERENCES `departments` (`dept_no`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `employee_leave_quota`
 --
@@ -96,6 +115,7 @@ CREATE TABLE `employee_leave_quota` (
   `year` int NOT NULL,
   `leave_type_id` smallint NOT NULL,
   `annual_quota_days` int NOT NULL,
+  `version` int NOT NULL DEFAULT '1',
   PRIMARY KEY (`emp_no`,`year`,`leave_type_id`),
   CONSTRAINT `employee_leave_quota_ibfk_1` FOREIGN KEY (`emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -121,15 +141,55 @@ CREATE TABLE `employee_leave_requests` (
   `manager_emp_no` int DEFAULT NULL,
   `employee_comment` varchar(255) DEFAULT NULL,
   `manager_comment` varchar(255) DEFAULT NULL,
+  `recurrence_weekdays` smallint DEFAULT NULL,
+  `recurrence_interval_weeks` smallint DEFAULT NULL,
+  `version` int NOT NULL DEFAULT '1',
   PRIMARY KEY (`leave_id`),
   KEY `emp_no` (`emp_no`),
   KEY `manager_emp_no` (`manager_emp_no`),
   KEY `ix_employee_leave_requests_leave_id` (`leave_id`),
+  KEY `ix_leave_requests_manager_status_requested` (`manager_emp_no`,`status`,`requested_at`),
+  KEY `ix_leave_requests_emp_dates` (`emp_no`,`start_date`,`end_date`),
+  KEY `ix_leave_requests_requested` (`requested_at`),
+  KEY `ix_leave_requests_status_requested` (`status`,`requested_at`),
+  KEY `ix_leave_requests_emp_requested` (`emp_no`,`requested_at`),
   CONSTRAINT `employee_leave_requests_ibfk_1` FOREIGN KEY (`emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE CASCADE,
   CONSTRAINT `employee_leave_requests_ibfk_2` FOREIGN KEY (`manager_emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE SET NULL
 ) ENGINE=InnoDB AUTO_INCREMENT=10 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `employee_leave_requests_archive`
+--
+
+DROP TABLE IF EXISTS `employee_leave_requests_archive`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `employee_leave_requests_archive` (
+  `leave_id` int NOT NULL,
+  `emp_no` int NOT NULL,
+  `leave_type_id` smallint NOT NULL,
+  `start_date` date NOT NULL,
+  `end_date` date NOT NULL,
+  `days_requested` int NOT NULL,
+  `status` enum('PENDING','APPROVED','REJECTED','CANCELLED') NOT NULL,
+  `requested_at` datetime NOT NULL,
+  `decided_at` datetime DEFAULT NULL,
+  `manager_emp_no` int DEFAULT NULL,
+  `employee_comment` varchar(255) DEFAULT NULL,
+  `manager_comment` varchar(255) DEFAULT NULL,
+  `recurrence_weekdays` smallint DEFAULT NULL,
+  `recurrence_interval_weeks` smallint DEFAULT NULL,
+  `version` int NOT NULL,
+  `archived_at` datetime NOT NULL,
+  PRIMARY KEY (`leave_id`),
+  KEY `ix_leave_archive_requested` (`requested_at`),
+  KEY `ix_leave_archive_emp_requested` (`emp_no`,`requested_at`),
+  KEY `ix_leave_archive_manager_requested` (`manager_emp_no`,`requested_at`),
+  CONSTRAINT `employee_leave_requests_archive_ibfk_1` FOREIGN KEY (`emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `employees`
 --
@@ -144,10 +204,97 @@ CREATE TABLE `employees` (
   `last_name` varchar(16) NOT NULL,
   `gender` enum('M','F') NOT NULL,
   `hire_date` date NOT NULL,
+  `version` int NOT NULL DEFAULT '1',
   PRIMARY KEY (`emp_no`)
 ) ENGINE=InnoDB AUTO_INCREMENT=499862 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `holidays`
+--
+
+DROP TABLE IF EXISTS `holidays`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `holidays` (
+  `holiday_id` int NOT NULL AUTO_INCREMENT,
+  `holiday_date` date NOT NULL,
+  `dept_no` char(4) DEFAULT NULL,
+  `name` varchar(100) NOT NULL,
+  PRIMARY KEY (`holiday_id`),
+  UNIQUE KEY `uq_holidays_date_dept` (`holiday_date`,`dept_no`),
+  KEY `dept_no` (`dept_no`),
+  CONSTRAINT `holidays_ibfk_1` FOREIGN KEY (`dept_no`) REFERENCES `departments` (`dept_no`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `leave_balance`
+--
+
+DROP TABLE IF EXISTS `leave_balance`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `leave_balance` (
+  `emp_no` int NOT NULL,
+  `year` int NOT NULL,
+  `leave_type_id` smallint NOT NULL,
+  `entitled_days` int NOT NULL,
+  `used_days` int NOT NULL,
+  `pending_days` int NOT NULL,
+  PRIMARY KEY (`emp_no`,`year`,`leave_type_id`),
+  CONSTRAINT `leave_balance_ibfk_1` FOREIGN KEY (`emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `leave_ledger`
+--
+
+DROP TABLE IF EXISTS `leave_ledger`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `leave_ledger` (
+  `entry_id` int NOT NULL AUTO_INCREMENT,
+  `emp_no` int NOT NULL,
+  `year` int NOT NULL,
+  `leave_type_id` smallint NOT NULL,
+  `entry_type` enum('GRANT','ADJUSTMENT','DEDUCTION','REVERSAL') NOT NULL,
+  `days` int NOT NULL,
+  `leave_id` int DEFAULT NULL,
+  `created_at` datetime NOT NULL,
+  `note` varchar(255) DEFAULT NULL,
+  PRIMARY KEY (`entry_id`),
+  KEY `ix_leave_ledger_emp_year_type` (`emp_no`,`year`,`leave_type_id`),
+  KEY `ix_leave_ledger_leave_id` (`leave_id`),
+  CONSTRAINT `leave_ledger_ibfk_1` FOREIGN KEY (`emp_no`) REFERENCES `employees` (`emp_no`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `outbox`
+--
+
+DROP TABLE IF EXISTS `outbox`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `outbox` (
+  `outbox_id` int NOT NULL AUTO_INCREMENT,
+  `topic` varchar(64) NOT NULL,
+  `payload` text NOT NULL,
+  `status` enum('PENDING','DONE','FAILED') NOT NULL,
+  `attempts` int NOT NULL,
+  `available_at` datetime NOT NULL,
+  `claim_token` varchar(32) DEFAULT NULL,
+  `created_at` datetime NOT NULL,
+  `processed_at` datetime DEFAULT NULL,
+  `last_error` varchar(255) DEFAULT NULL,
+  PRIMARY KEY (`outbox_id`),
+  KEY `ix_outbox_status_available` (`status`,`available_at`),
+  KEY `ix_outbox_status_processed` (`status`,`processed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `salaries`
 --
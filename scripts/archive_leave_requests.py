@@ -0,0 +1,55 @@
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import leave_archive
+
+
+def main() -> None:
+    """
+    Move APPROVED, REJECTED and CANCELLED leave requests that ended and were
+    decided more than --retention-days ago into
+    employee_leave_requests_archive. They stay readable through
+    GET /leave-requests/{id} and GET /leave-requests?include_archived=true.
+
+    Meant for a nightly cron job; safe to re-run and to interrupt (each
+    chunk is its own transaction).
+
+    Usage:
+        python -m scripts.archive_leave_requests --retention-days 730
+    """
+    parser = argparse.ArgumentParser(description="Archive old decided leave requests.")
+    parser.add_argument("--retention-days", type=int, default=leave_archive.LEAVE_ARCHIVE_RETENTION_DAYS,
+                        help="keep requests decided within this many days in the main table")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="reference date (YYYY-MM-DD), default today")
+    parser.add_argument("--chunk-size", type=int, default=leave_archive.ARCHIVE_CHUNK_SIZE,
+                        help="requests per INSERT/DELETE transaction")
+    parser.add_argument("--dry-run", action="store_true", help="only count")
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = leave_archive.archive_leave_requests(
+            db,
+            retention_days=args.retention_days,
+            today=args.today,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+        )
+        elapsed = time.perf_counter() - started
+        verb = "Would archive" if args.dry_run else "Archived"
+        print(
+            f"{verb} {counts['archived']} leave requests decided before {counts['cutoff']} "
+            f"in {elapsed:.2f}s (chunks: {counts['chunks']})."
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import csv
+import sys
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import leave_requests
+
+
+def main() -> None:
+    """
+    Report every pair of overlapping PENDING/APPROVED leave requests.
+
+    New overlaps are rejected by the API; this finds the ones created
+    before that check existed (or loaded directly into the database), in a
+    single ordered pass over employee_leave_requests. Read-only.
+
+    Usage:
+        python -m scripts.audit_leave_overlaps > overlaps.csv
+    """
+    parser = argparse.ArgumentParser(description="Find overlapping leave requests.")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        writer = csv.DictWriter(
+            sys.stdout,
+            fieldnames=["emp_no", "leave_id", "overlapping_leave_id", "overlap_start", "overlap_end"],
+        )
+        writer.writeheader()
+        found = 0
+        for overlap in leave_requests.find_all_overlaps(db, batch_size=args.batch_size):
+            writer.writerow(overlap)
+            found += 1
+        print(f"Found {found} overlapping leave requests.", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,54 @@
+import argparse
+import time
 from datetime import date
 
 from sqlalchemy.orm import Session
 
 from app.db import SessionLocal
-from app import models
 from app.crud import leave_quotas
 
 
 def main() -> None:
     """
-    Backfill default leave quotas for existing employees.
+    Backfill leave quotas for existing employees.
 
+    Defaults:
     - Paid leave (leave_type_id = 0): 10 days/year
     - Sick leave (leave_type_id = 2): 5 days/year
     - Unpaid leave (leave_type_id = 1): no quota
 
-    This script is safe to re-run:
-    - It uses get_or_create_quota(), so existing quotas are not duplicated.
+    Runs one INSERT ... SELECT ... WHERE NOT EXISTS per leave type and
+    emp_no chunk, so it is safe to re-run: existing quotas are skipped,
+    never overwritten.
+
+    Usage:
+        python -m scripts.backfill_leave_quotas --year 2026 --paid-days 12
     """
+    parser = argparse.ArgumentParser(description="Backfill default leave quotas.")
+    parser.add_argument("--year", type=int, default=date.today().year)
+    parser.add_argument("--paid-days", type=int, default=leave_quotas.DEFAULT_QUOTAS[0])
+    parser.add_argument("--sick-days", type=int, default=leave_quotas.DEFAULT_QUOTAS[2])
+    parser.add_argument("--chunk-size", type=int, default=50000,
+                        help="employees per INSERT ... SELECT statement")
+    args = parser.parse_args()
+
     db: Session = SessionLocal()
     try:
-        current_year = date.today().year
+        started = time.perf_counter()
+        created_count, skipped_count = leave_quotas.backfill_quotas(
+            db,
+            year=args.year,
+            quotas={0: args.paid_days, 2: args.sick_days},
+            chunk_size=args.chunk_size,
+        )
+        elapsed = time.perf_counter() - started
 
-        employees = db.query(models.Employee).all()
-        if not employees:
+        if created_count == 0 and skipped_count == 0:
             print("No employees found. Nothing to backfill.")
             return
 
-        created_count = 0
-        skipped_count = 0
-
-        for emp in employees:
-            for leave_type_id in (0, 2):  # 0 = paid, 2 = sick
-                quota = leave_quotas.get_leave_quota(
-                    db, emp_no=emp.emp_no, year=current_year, leave_type_id=leave_type_id
-                )
-                if quota:
-                    skipped_count += 1
-                    continue
-
-                # get_or_create_quota will create with default values
-                leave_quotas.get_or_create_quota(
-                    db, emp_no=emp.emp_no, leave_type_id=leave_type_id, year=current_year
-                )
-                created_count += 1
-
         print(
-            f"Backfill complete for year {current_year}. "
+            f"Backfill complete for year {args.year} in {elapsed:.2f}s. "
             f"Created {created_count} quotas, skipped {skipped_count} existing."
         )
     finally:
@@ -55,5 +57,3 @@ def main() -> None:
 
 if __name__ == "__main__":
     main()
-
-
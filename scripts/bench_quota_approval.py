@@ -0,0 +1,163 @@
+"""
+Stress benchmark for leave approval quota deduction.
+
+Creates one employee with N one-day PENDING paid-leave requests and a quota
+of exactly N days, then approves all of them from a thread pool twice:
+
+  legacy  - the old path: commit the status change, then read the quota
+            into Python, subtract, and commit again
+  atomic  - crud.leave_requests.review_leave_request (single transaction,
+            guarded in-database UPDATE)
+
+After each run the remaining quota should be 0. The quota row is
+versioned, so a legacy deduction racing another one now fails with
+StaleDataError instead of silently overwriting it; those are reported as
+conflicts, and whatever quota remains beyond them is lost updates.
+
+Usage:
+    python -m scripts.bench_quota_approval --threads 8 --requests 200
+    python -m scripts.bench_quota_approval --database-url mysql+pymysql://...
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import models, schemas
+from app.db import Base
+from app.crud import leave_requests
+
+BENCH_EMP_NO = 900031
+BENCH_MANAGER_EMP_NO = 900032
+BENCH_YEAR = 2099
+
+
+def setup(Session, n_requests: int) -> list:
+    db = Session()
+    try:
+        for model in (models.EmployeeLeaveRequest, models.EmployeeLeaveQuota):
+            db.execute(delete(model).where(model.emp_no == BENCH_EMP_NO))
+        for emp_no in (BENCH_EMP_NO, BENCH_MANAGER_EMP_NO):
+            if db.get(models.Employee, emp_no) is None:
+                db.add(models.Employee(
+                    emp_no=emp_no, birth_date=date(1990, 1, 1), first_name="Bench",
+                    last_name="Quota", gender="M", hire_date=date(2020, 1, 1),
+                ))
+        db.add(models.EmployeeLeaveQuota(
+            emp_no=BENCH_EMP_NO, year=BENCH_YEAR, leave_type_id=0, annual_quota_days=n_requests,
+        ))
+        db.flush()
+
+        day = date(BENCH_YEAR, 1, 1)
+        db.execute(models.EmployeeLeaveRequest.__table__.insert(), [
+            {
+                "emp_no": BENCH_EMP_NO, "leave_type_id": 0, "start_date": day, "end_date": day,
+                "days_requested": 1, "status": "PENDING", "requested_at": datetime.utcnow(),
+            }
+            for _ in range(n_requests)
+        ])
+        db.commit()
+        return [
+            leave_id for (leave_id,) in db.query(models.EmployeeLeaveRequest.leave_id)
+            .filter(models.EmployeeLeaveRequest.emp_no == BENCH_EMP_NO)
+        ]
+    finally:
+        db.close()
+
+
+def legacy_approve(Session, leave_id: int) -> None:
+    """The pre-atomic approval flow, kept here for comparison."""
+    db = Session()
+    try:
+        leave = db.get(models.EmployeeLeaveRequest, leave_id)
+        leave.status = "APPROVED"
+        leave.manager_emp_no = BENCH_MANAGER_EMP_NO
+        leave.decided_at = datetime.utcnow()
+        db.commit()
+        db.refresh(leave)
+
+        quota = db.get(models.EmployeeLeaveQuota, (leave.emp_no, leave.start_date.year, 0))
+        quota.annual_quota_days = max(quota.annual_quota_days - leave.days_requested, 0)
+        db.commit()
+    finally:
+        db.close()
+
+
+def atomic_approve(Session, leave_id: int) -> None:
+    db = Session()
+    try:
+        leave_requests.review_leave_request(
+            db, leave_id, schemas.LeaveRequestReview(status="APPROVED"), BENCH_MANAGER_EMP_NO
+        )
+    finally:
+        db.close()
+
+
+def run(Session, name: str, approve, n_requests: int, threads: int) -> None:
+    leave_ids = setup(Session, n_requests)
+    errors = 0
+    conflicts = 0
+
+    def task(leave_id):
+        nonlocal errors, conflicts
+        try:
+            approve(Session, leave_id)
+        except StaleDataError:
+            conflicts += 1
+        except HTTPException as exc:
+            if exc.status_code == 409:
+                conflicts += 1
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(task, leave_ids))
+    elapsed = time.perf_counter() - started
+
+    db = Session()
+    try:
+        remaining = db.get(models.EmployeeLeaveQuota, (BENCH_EMP_NO, BENCH_YEAR, 0)).annual_quota_days
+    finally:
+        db.close()
+
+    print(
+        f"{name:<7} approvals={n_requests} threads={threads} "
+        f"elapsed={elapsed:.3f}s throughput={n_requests / elapsed:.1f}/s "
+        f"remaining_quota={remaining} lost_updates={remaining - conflicts} "
+        f"conflicts={conflicts} errors={errors}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--database-url", default=None,
+                        help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+
+    url = args.database_url
+    connect_args = {}
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_quota.db")
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False, "timeout": 30}
+
+    engine = create_engine(url, connect_args=connect_args, pool_size=args.threads)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    run(Session, "legacy", legacy_approve, args.requests, args.threads)
+    run(Session, "atomic", atomic_approve, args.requests, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark for working-day counting over multi-year ranges.
+
+Loads company-wide holidays (Jan 1 and Dec 25 of every year) into a
+throwaway database, then counts the working days of N random ranges of up
+to --max-years years two ways:
+
+  naive     - walk the range day by day against a holiday set
+  calendar  - app.working_calendar (cumulative array, two lookups per range)
+
+Both must agree; the calendar's one-off build time is reported separately.
+
+Usage:
+    python -m scripts.bench_working_days --ranges 20000 --max-years 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db import Base
+from app.working_calendar import WEEKEND_DAYS, WorkingDayCalendar
+
+FIRST_YEAR = 2000
+LAST_YEAR = 2040
+
+
+def naive_working_days(start: date, end: date, holidays: set) -> int:
+    days = 0
+    day = start
+    while day <= end:
+        if day.weekday() not in WEEKEND_DAYS and day not in holidays:
+            days += 1
+        day += timedelta(days=1)
+    return days
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ranges", type=int, default=20000)
+    parser.add_argument("--max-years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=40)
+    args = parser.parse_args()
+
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_calendar.db")
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    holidays = set()
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        holidays.update((date(year, 1, 1), date(year, 12, 25)))
+    db = Session()
+    try:
+        db.execute(models.Holiday.__table__.insert(), [
+            {"holiday_date": day, "dept_no": None, "name": "Bench holiday"} for day in holidays
+        ])
+        db.commit()
+
+        rng = random.Random(args.seed)
+        first = date(FIRST_YEAR, 1, 1).toordinal()
+        last = date(LAST_YEAR - args.max_years, 12, 31).toordinal()
+        ranges = []
+        for _ in range(args.ranges):
+            start = date.fromordinal(rng.randint(first, last))
+            ranges.append((start, start + timedelta(days=rng.randint(0, 365 * args.max_years))))
+
+        started = time.perf_counter()
+        naive = [naive_working_days(start, end, holidays) for start, end in ranges]
+        naive_elapsed = time.perf_counter() - started
+
+        calendar = WorkingDayCalendar()
+        started = time.perf_counter()
+        calendar.working_days(db, date(FIRST_YEAR, 1, 1), date(LAST_YEAR, 12, 31))
+        build_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast = [calendar.working_days(db, start, end) for start, end in ranges]
+        fast_elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    assert fast == naive, "calendar and naive counts disagree"
+    print(f"ranges={args.ranges} max_years={args.max_years}")
+    print(f"naive     elapsed={naive_elapsed:.3f}s per_range={naive_elapsed / args.ranges * 1e6:.1f}us")
+    print(
+        f"calendar  elapsed={fast_elapsed:.3f}s per_range={fast_elapsed / args.ranges * 1e6:.1f}us "
+        f"(build {build_elapsed * 1000:.1f}ms, {LAST_YEAR - FIRST_YEAR + 1} years)"
+    )
+
+
+if __name__ == "__main__":
+    main()
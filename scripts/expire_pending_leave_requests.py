@@ -0,0 +1,56 @@
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import leave_requests
+from app.leave_expiry import LEAVE_PENDING_MAX_AGE_DAYS
+
+
+def main() -> None:
+    """
+    Cancel PENDING leave requests that were never reviewed: those whose
+    start_date has passed and, with --max-age-days, those requested longer
+    ago than that. decided_at is set and the pending days are released.
+
+    The app does this itself every LEAVE_EXPIRY_INTERVAL_SECONDS; use this
+    from cron when the in-app scheduler is disabled. Safe to re-run.
+
+    Usage:
+        python -m scripts.expire_pending_leave_requests --max-age-days 60
+    """
+    parser = argparse.ArgumentParser(description="Expire stale pending leave requests.")
+    parser.add_argument("--max-age-days", type=int, default=LEAVE_PENDING_MAX_AGE_DAYS,
+                        help="also expire requests older than this many days")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="reference date (YYYY-MM-DD), default today")
+    parser.add_argument("--chunk-size", type=int, default=leave_requests.EXPIRY_CHUNK_SIZE,
+                        help="requests per UPDATE / transaction")
+    parser.add_argument("--dry-run", action="store_true", help="only count")
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = leave_requests.expire_pending_leave_requests(
+            db,
+            today=args.today,
+            max_age_days=args.max_age_days,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+        )
+        elapsed = time.perf_counter() - started
+        verb = "Would expire" if args.dry_run else "Expired"
+        print(
+            f"{verb} {counts['expired']} pending leave requests in {elapsed:.2f}s "
+            f"(past start: {counts['past_start']}, too old: {counts['too_old']}, "
+            f"chunks: {counts['chunks']})."
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
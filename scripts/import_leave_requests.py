@@ -0,0 +1,59 @@
+import argparse
+import csv
+import sys
+import time
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import leave_import
+
+
+def main() -> None:
+    """
+    Import leave requests from a CSV file (e.g. history from the old system).
+
+    The file needs a header row; emp_no, leave_type_id, start_date and
+    end_date are required, status (default PENDING), requested_at,
+    decided_at, manager_emp_no, employee_comment and manager_comment are
+    optional. Every row is validated before anything is written; valid rows
+    are inserted in chunked transactions and the rest are reported.
+
+    Rejected rows are written to stderr as CSV (row,detail).
+
+    Usage:
+        python -m scripts.import_leave_requests leave_history.csv --dry-run
+    """
+    parser = argparse.ArgumentParser(description="Bulk import leave requests from CSV.")
+    parser.add_argument("path", help="CSV file to import")
+    parser.add_argument("--chunk-size", type=int, default=leave_import.IMPORT_CHUNK_SIZE,
+                        help="rows per insert transaction")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        with open(args.path, newline="", encoding="utf-8-sig") as f:
+            result = leave_import.import_leave_requests(
+                db, f, chunk_size=args.chunk_size, dry_run=args.dry_run
+            )
+        elapsed = time.perf_counter() - started
+
+        if result["errors"]:
+            writer = csv.writer(sys.stderr)
+            writer.writerow(["row", "detail"])
+            for error in result["errors"]:
+                writer.writerow([error["row"], error["detail"]])
+
+        verb = "Would import" if args.dry_run else "Imported"
+        print(
+            f"{verb} {result['imported']} leave requests in {elapsed:.2f}s, "
+            f"{result['failed']} rows rejected."
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import time
+
+from sqlalchemy.orm import Session
+
+from app import outbox
+from app.db import SessionLocal
+
+
+def main() -> None:
+    """
+    Delete processed (DONE) outbox rows older than --retention-hours.
+    FAILED rows are kept.
+
+    The outbox worker does this itself every OUTBOX_PURGE_INTERVAL_SECONDS;
+    use this from cron when that is disabled (interval 0). Safe to re-run.
+
+    Usage:
+        python -m scripts.purge_outbox --retention-hours 168
+    """
+    parser = argparse.ArgumentParser(description="Purge processed outbox rows.")
+    parser.add_argument("--retention-hours", type=float, default=outbox.OUTBOX_RETENTION_HOURS,
+                        help="keep rows processed within this many hours")
+    parser.add_argument("--chunk-size", type=int, default=outbox.OUTBOX_PURGE_CHUNK_SIZE,
+                        help="rows per DELETE / transaction")
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        deleted = outbox.purge_processed(db, retention_hours=args.retention_hours, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"Purged {deleted} processed outbox rows in {elapsed:.2f}s.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
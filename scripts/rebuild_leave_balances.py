@@ -0,0 +1,25 @@
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import leave_ledger
+
+
+def main() -> None:
+    """
+    Rebuild the leave_balance snapshots from the leave_ledger history and the
+    currently PENDING leave requests.
+
+    The API keeps leave_balance up to date in the same transaction as every
+    ledger entry; run this to repair drift or after loading ledger rows
+    directly. Safe to re-run.
+    """
+    db: Session = SessionLocal()
+    try:
+        written = leave_ledger.rebuild_balances(db)
+        print(f"Rebuilt {written} leave balances.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
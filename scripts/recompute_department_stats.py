@@ -0,0 +1,24 @@
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.crud import department_stats
+
+
+def main() -> None:
+    """
+    Rebuild the dept_stats aggregates from dept_emp + employees.
+
+    The API keeps dept_stats up to date incrementally; run this after bulk
+    loads that bypass the API (e.g. importing employees_dev.sql) or to
+    repair drift. Safe to re-run.
+    """
+    db: Session = SessionLocal()
+    try:
+        written = department_stats.recompute_department_stats(db)
+        print(f"Recomputed stats for {written} departments.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
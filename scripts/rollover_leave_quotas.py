@@ -0,0 +1,71 @@
+import argparse
+import csv
+import sys
+import time
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.db import SessionLocal
+from app.crud import leave_rollover
+
+
+def main() -> None:
+    """
+    Year-end leave quota rollover: create next year's quotas for every
+    employee from configurable rules (base days, carry-over cap, tenure
+    accrual from hire_date).
+
+    Safe to re-run and to resume after an interruption: quotas that already
+    exist for the target year are left untouched.
+
+    Usage:
+        python -m scripts.rollover_leave_quotas --from-year 2025 --dry-run > diff.csv
+        python -m scripts.rollover_leave_quotas --from-year 2025 --rules rules.json
+
+    rules.json follows schemas.RolloverRules, e.g.
+        {"rules": {"0": {"base_days": 10, "carry_over_cap": 5,
+                         "accrual_every_years": 2, "accrual_days": 1, "accrual_cap": 5},
+                   "2": {"base_days": 5}}}
+    """
+    parser = argparse.ArgumentParser(description="Roll leave quotas over into the next year.")
+    parser.add_argument("--from-year", type=int, default=date.today().year)
+    parser.add_argument("--rules", help="JSON file with RolloverRules (defaults built in)")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="write nothing; print the diff as CSV on stdout")
+    args = parser.parse_args()
+
+    rules = schemas.RolloverRules()
+    if args.rules:
+        with open(args.rules) as f:
+            rules = schemas.RolloverRules.model_validate_json(f.read())
+
+    db: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        result = leave_rollover.run_rollover(
+            db, args.from_year, rules=rules, chunk_size=args.chunk_size, dry_run=args.dry_run
+        )
+        elapsed = time.perf_counter() - started
+
+        if args.dry_run:
+            writer = csv.DictWriter(
+                sys.stdout, fieldnames=["emp_no", "leave_type_id", "current", "proposed", "action"]
+            )
+            writer.writeheader()
+            writer.writerows(result["diff"])
+
+        verb = "Would create" if args.dry_run else "Created"
+        print(
+            f"Rollover {args.from_year} -> {result['to_year']} in {elapsed:.2f}s. "
+            f"{verb} {result['created']} quotas, skipped {result['skipped']} existing.",
+            file=sys.stderr,
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from datetime import date
+
+from app.working_calendar import WorkingDayCalendar
+from tests.conftest import TestingSessionLocal
+from tests.test_departments import create_employee
+
+
+def test_working_days_weekends_and_holidays(client):
+    client.post("/departments", json={"dept_no": "h040", "dept_name": "Holiday Dept"})
+    emp_no = create_employee(client, "h040", "Hol", "F", "2018-01-01")
+
+    # 2044-01-04 is a Monday
+    company = client.post("/calendar/holidays", json={"holiday_date": "2044-01-05", "name": "Company day"})
+    assert company.status_code == 201
+    regional = client.post(
+        "/calendar/holidays", json={"holiday_date": "2044-01-06", "dept_no": "h040", "name": "Regional day"}
+    )
+    assert regional.status_code == 201
+    duplicate = client.post("/calendar/holidays", json={"holiday_date": "2044-01-05", "name": "Again"})
+    assert duplicate.status_code == 409
+
+    def working_days(**params):
+        response = client.get(
+            "/calendar/working-days", params={"start_date": "2044-01-04", "end_date": "2044-01-10", **params}
+        )
+        assert response.status_code == 200
+        return response.json()["working_days"]
+
+    assert working_days() == 4               # Mon-Fri minus the company holiday
+    assert working_days(dept_no="h040") == 3  # plus the department's own holiday
+
+    # Leave requests count working days of the employee's department
+    response = client.post("/leave-requests", json={
+        "emp_no": emp_no, "leave_type_id": 0, "start_date": "2044-01-04", "end_date": "2044-01-10",
+    })
+    assert response.status_code == 201
+    assert response.json()["days_requested"] == 3
+
+    # Weekend-only requests are rejected
+    response = client.post("/leave-requests", json={
+        "emp_no": emp_no, "leave_type_id": 1, "start_date": "2044-01-16", "end_date": "2044-01-17",
+    })
+    assert response.status_code == 400
+
+    # Removing a holiday is visible immediately
+    assert client.delete(f"/calendar/holidays/{company.json()['holiday_id']}").status_code == 204
+    assert working_days() == 5
+    assert [h["name"] for h in client.get("/calendar/holidays", params={"year": 2044, "dept_no": "h040"}).json()] == [
+        "Regional day"
+    ]
+
+
+def test_working_day_calendar_matches_day_by_day_count(client):
+    calendar = WorkingDayCalendar()
+    db = TestingSessionLocal()
+    try:
+        for start, end in (
+            (date(2044, 12, 20), date(2044, 12, 20)),
+            (date(2044, 12, 20), date(2045, 1, 3)),
+            (date(2044, 12, 20), date(2045, 12, 20)),
+            (date(2047, 1, 1), date(2047, 2, 28)),
+            (date(2044, 12, 20), date(2047, 2, 28)),
+            (date(9999, 12, 1), date(9999, 12, 31)),
+        ):
+            expected = sum(
+                1 for offset in range((end - start).days + 1)
+                if date.fromordinal(start.toordinal() + offset).weekday() < 5
+            )
+            assert calendar.working_days(db, start, end) == expected
+        # Widening to earlier years keeps the later ones
+        assert calendar.working_days(db, date(2041, 1, 1), date(2041, 1, 1)) == 1
+        assert calendar.working_days(db, date(2047, 2, 27), date(2047, 2, 28)) == 2
+    finally:
+        db.close()
+
+
+def test_working_day_calendar_is_bounded(client):
+    response = client.get("/calendar/working-days", params={"start_date": "9999-01-01", "end_date": "9999-12-31"})
+    assert response.status_code == 200 and response.json()["working_days"] == 261
+    # Multi-year ranges are counted in one piece (2000-2040: 14976 days, 10696 weekdays)
+    response = client.get("/calendar/working-days", params={"start_date": "2000-01-01", "end_date": "2040-12-31"})
+    assert response.status_code == 200 and response.json()["working_days"] == 10696
+
+    calendar = WorkingDayCalendar(max_scopes=2)
+    db = TestingSessionLocal()
+    try:
+        # Far-apart ranges rebuild the array instead of widening it across the gap
+        calendar.working_days(db, date(2041, 1, 1), date(2041, 1, 2))
+        calendar.working_days(db, date(9999, 1, 1), date(9999, 1, 2))
+        base, cumulative, _ = calendar._spans[None]
+        assert base == date(9999, 1, 1) and len(cumulative) == 366
+        for dept_no in ("b040", "c040", "d040"):
+            calendar.working_days(db, date(2041, 1, 1), date(2041, 1, 2), dept_no)
+        assert list(calendar._spans) == ["c040", "d040"]
+    finally:
+        db.close()
@@ -0,0 +1,185 @@
+from datetime import date
+
+from app import models
+from app.crud import department_stats
+from app.models import FAR_FUTURE
+from tests.conftest import TestingSessionLocal
+
+
+def create_employee(client, dept_no: str, first_name: str, gender: str, hire_date: str) -> int:
+    payload = {
+        "birth_date": "1990-01-01",
+        "first_name": first_name,
+        "last_name": "Stats",
+        "gender": gender,
+        "hire_date": hire_date,
+        "dept_no": dept_no,
+        "title": "Engineer",
+        "starting_salary": 60000,
+    }
+    response = client.post("/employees", json=payload)
+    assert response.status_code == 201
+    return response.json()["emp_no"]
+
+
+def test_department_stats_incremental(client):
+    client.post("/departments", json={"dept_no": "x026", "dept_name": "Stats Dept A"})
+    client.post("/departments", json={"dept_no": "x027", "dept_name": "Stats Dept B"})
+
+    # Department with no members yet reports zeros
+    response = client.get("/departments/x026/stats")
+    assert response.status_code == 200
+    assert response.json()["headcount"] == 0
+
+    emp_a = create_employee(client, "x026", "Ann", "F", "2010-01-01")
+    emp_b = create_employee(client, "x026", "Ben", "M", "2020-01-01")
+    create_employee(client, "x026", "Cat", "F", "2015-01-01")
+
+    data = client.get("/departments/x026/stats").json()
+    assert data["headcount"] == 3
+    assert data["female_count"] == 2
+    assert data["male_count"] == 1
+    assert data["avg_tenure_years"] > 0
+
+    # Transfer moves the employee between both aggregates
+    response = client.post(f"/employees/{emp_b}/transfer", json={"dept_no": "x027"})
+    assert response.status_code == 200
+    assert client.get("/departments/x026/stats").json()["headcount"] == 2
+    assert client.get("/departments/x027/stats").json()["male_count"] == 1
+
+    # Unknown departments are rejected; moving back reopens the old dept_emp row
+    assert client.post(f"/employees/{emp_b}/transfer", json={"dept_no": "zzzz"}).status_code == 404
+    response = client.post(
+        f"/employees/{emp_b}/transfer", json={"dept_no": "x026", "effective_date": "2030-01-01"}
+    )
+    assert response.status_code == 200
+    db = TestingSessionLocal()
+    try:
+        rows = db.query(models.DeptEmp).filter(models.DeptEmp.emp_no == emp_b).order_by(models.DeptEmp.dept_no).all()
+        assert [(r.dept_no, r.from_date, r.to_date) for r in rows] == [
+            ("x026", date(2030, 1, 1), FAR_FUTURE),
+            ("x027", rows[1].from_date, date(2030, 1, 1)),
+        ]
+    finally:
+        db.close()
+    client.post(f"/employees/{emp_b}/transfer", json={"dept_no": "x027", "effective_date": "2031-01-01"})
+
+    # Delete removes the employee from the current department
+    assert client.delete(f"/employees/{emp_a}").status_code == 204
+    data = client.get("/departments/x026/stats").json()
+    assert data["headcount"] == 1
+    assert data["female_count"] == 1
+
+    # Full recompute agrees with the incrementally maintained rows
+    incremental = {d["dept_no"]: d for d in client.get("/departments/stats").json()}
+    db = TestingSessionLocal()
+    try:
+        department_stats.recompute_department_stats(db)
+    finally:
+        db.close()
+    recomputed = {d["dept_no"]: d for d in client.get("/departments/stats").json()}
+    assert recomputed["x026"] == incremental["x026"]
+    assert recomputed["x027"] == incremental["x027"]
+
+
+def test_department_stats_unknown_department(client):
+    response = client.get("/departments/zzzz/stats")
+    assert response.status_code == 404
+
+
+def test_department_roster_keyset_pagination(client):
+    client.post("/departments", json={"dept_no": "r027", "dept_name": "Roster Dept"})
+    client.post("/departments", json={"dept_no": "t027", "dept_name": "Roster Target Dept"})
+    emp_nos = [
+        create_employee(client, "r027", f"Member{i}", "M", "2019-06-01")
+        for i in range(5)
+    ]
+    # A transferred-out employee is no longer a current member
+    response = client.post(f"/employees/{emp_nos[0]}/transfer", json={"dept_no": "t027"})
+    assert response.status_code == 200
+
+    seen = []
+    after = None
+    while True:
+        params = {"limit": 2}
+        if after is not None:
+            params["after_emp_no"] = after
+        page = client.get("/departments/r027/employees", params=params).json()
+        if not page:
+            break
+        assert len(page) <= 2
+        seen.extend(row["emp_no"] for row in page)
+        after = page[-1]["emp_no"]
+
+    assert seen == sorted(emp_nos[1:])
+    first = client.get("/departments/r027/employees").json()[0]
+    assert first["title"] == "Engineer"
+
+
+def test_department_roster_unknown_department(client):
+    response = client.get("/departments/zzzz/employees")
+    assert response.status_code == 404
+
+
+def test_department_absence_calendar(client):
+    client.post("/departments", json={"dept_no": "a039", "dept_name": "Absence Dept"})
+    ann = create_employee(client, "a039", "Ann", "F", "2018-01-01")
+    bob = create_employee(client, "a039", "Bob", "M", "2018-01-01")
+    cid = create_employee(client, "a039", "Cid", "M", "2018-01-01")
+
+    def leave(emp_no, start, end):
+        response = client.post("/leave-requests", json={
+            "emp_no": emp_no, "leave_type_id": 1, "start_date": start, "end_date": end,
+        })
+        assert response.status_code == 201
+        return response.json()["leave_id"]
+
+    leave(ann, "2043-03-01", "2043-03-03")   # starts before the window
+    leave(bob, "2043-03-03", "2043-03-04")
+    rejected = leave(cid, "2043-03-02", "2043-03-02")
+    client.patch(f"/leave-requests/{rejected}/review", params={"manager_emp_no": ann}, json={"status": "REJECTED"})
+    leave(cid, "2043-03-10", "2043-03-12")   # outside the window
+
+    response = client.get("/departments/a039/absences", params={"from": "2043-03-02", "to": "2043-03-05"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [(d["date"], d["count"], d["emp_nos"]) for d in data["days"]] == [
+        ("2043-03-02", 1, [ann]),
+        ("2043-03-03", 2, sorted([ann, bob])),
+        ("2043-03-04", 1, [bob]),
+        ("2043-03-05", 0, []),
+    ]
+    assert {a["emp_no"] for a in data["absences"]} == {ann, bob}
+
+    assert client.get("/departments/a039/absences", params={"from": "2043-03-05", "to": "2043-03-01"}).status_code == 400
+    assert client.get("/departments/a039/absences", params={"from": "2043-01-01", "to": "2045-01-01"}).status_code == 400
+    assert client.get("/departments/zzzz/absences", params={"from": "2043-03-01", "to": "2043-03-02"}).status_code == 404
+
+
+def test_department_writes_single_statement(client):
+    from sqlalchemy import event
+    from tests.conftest import engine
+
+    assert client.post("/departments", json={"dept_no": "w047", "dept_name": "Writes"}).status_code == 201
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.put("/departments/w047", json={"dept_name": "Writes Renamed"})
+        assert response.status_code == 200
+        assert response.json() == {"dept_no": "w047", "dept_name": "Writes Renamed"}
+        assert statements == ["UPDATE"]  # UPDATE ... RETURNING, no SELECT before or after
+
+        statements.clear()
+        assert client.delete("/departments/w047").status_code == 204
+        assert statements == ["DELETE"]
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert client.get("/departments/w047").status_code == 404
+    assert client.put("/departments/w047", json={"dept_name": "Gone"}).status_code == 404
+    assert client.delete("/departments/w047").status_code == 404
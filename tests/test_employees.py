@@ -102,3 +102,35 @@ def test_delete_employee(client):
     # Verify it's gone
     response = client.get(f"/employees/{emp_no}")
     assert response.status_code == 404
+
+
+def test_update_employee_optimistic_version(client):
+    payload = {
+        "birth_date": "1994-05-05",
+        "first_name": "Vera",
+        "last_name": "Sion",
+        "gender": "F",
+        "hire_date": "2024-05-05",
+        "dept_no": "d005",
+        "title": "Developer",
+        "starting_salary": 61000,
+    }
+    emp_no = client.post("/employees", json=payload).json()["emp_no"]
+
+    fetched = client.get(f"/employees/{emp_no}")
+    assert fetched.json()["version"] == 1
+    assert fetched.headers["ETag"] == '"1"'
+
+    # Two editors read version 1; the first write wins...
+    first = client.put(f"/employees/{emp_no}", json={"first_name": "Vee"}, headers={"If-Match": '"1"'})
+    assert first.status_code == 200
+    assert first.json()["version"] == 2 and first.headers["ETag"] == '"2"'
+    # ...the second gets 409, by header or body field, on either update path
+    assert client.put(f"/employees/{emp_no}", json={"first_name": "V"}, headers={"If-Match": '"1"'}).status_code == 409
+    assert client.put(f"/employees/{emp_no}", json={"gender": "M", "version": 1}).status_code == 409
+    assert client.get(f"/employees/{emp_no}").json()["first_name"] == "Vee"
+
+    # Retrying with the current version works; without a version it is a blind write
+    assert client.put(f"/employees/{emp_no}", json={"hire_date": "2024-06-01", "version": 2}).json()["version"] == 3
+    assert client.put(f"/employees/{emp_no}", json={"last_name": "Sions"}).json()["version"] == 4
+    assert client.put("/employees/99999991", json={"first_name": "X", "version": 1}).status_code == 404
@@ -0,0 +1,179 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app import models, outbox
+from app.leave_events import LeaveEventBroker, leave_events, stream_events
+from tests.conftest import TestingSessionLocal
+from tests.test_leave_requests import create_test_employee
+
+
+class FakeRequest:
+    """Connected until the first `disconnect_after` checks have passed."""
+
+    def __init__(self, disconnect_after: int = 1):
+        self.checks = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        self.checks += 1
+        return self.checks > self.disconnect_after
+
+
+def drain_outbox() -> int:
+    db = TestingSessionLocal()
+    try:
+        return outbox.drain(db)
+    finally:
+        db.close()
+
+
+def test_crud_changes_reach_subscribers_and_replay(client):
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20042, first_name="Event", last_name="Emp")
+        create_test_employee(db, emp_no=30042, first_name="Event", last_name="Manager")
+    finally:
+        db.close()
+
+    while drain_outbox():
+        pass  # events queued by other tests
+
+    async def scenario():
+        employee = leave_events.subscribe(emp_no=20042)
+        manager = leave_events.subscribe(manager_emp_no=30042)
+        other = leave_events.subscribe(emp_no=29999998)
+
+        response = await asyncio.to_thread(client.post, "/leave-requests", json={
+            "emp_no": 20042, "leave_type_id": 1, "start_date": "2046-04-02", "end_date": "2046-04-02",
+        })
+        leave_id = response.json()["leave_id"]
+        assert employee.queue.empty()   # nothing is published inline
+        assert await asyncio.to_thread(drain_outbox) >= 1
+        created = await asyncio.wait_for(employee.queue.get(), 5)
+        assert (created["type"], created["leave_id"], created["status"]) == ("created", leave_id, "PENDING")
+
+        await asyncio.to_thread(
+            client.patch, f"/leave-requests/{leave_id}/review",
+            params={"manager_emp_no": 30042}, json={"status": "APPROVED"},
+        )
+        await asyncio.to_thread(drain_outbox)
+        reviewed = await asyncio.wait_for(employee.queue.get(), 5)
+        assert (reviewed["type"], reviewed["status"]) == ("reviewed", "APPROVED")
+        assert (await asyncio.wait_for(manager.queue.get(), 5))["id"] == reviewed["id"]
+        assert other.queue.empty()
+
+        # Resuming after the first event replays only what came after it
+        missed = leave_events.replay(employee, created["id"])
+        assert [e["id"] for e in missed] == [reviewed["id"]]
+        assert leave_events.replay(employee, "1-1") is None   # other process lifetime
+
+        for subscription in (employee, manager, other):
+            leave_events.unsubscribe(subscription)
+
+    asyncio.run(scenario())
+
+
+def test_stream_replays_then_closes_slow_subscriber():
+    broker = LeaveEventBroker(queue_size=2, history_size=10)
+
+    async def scenario():
+        first = broker.publish("created", 1, 7, None, "PENDING")
+        broker.publish("reviewed", 1, 7, 8, "APPROVED")
+
+        subscription = broker.subscribe(emp_no=7)
+        body = [
+            chunk async for chunk in stream_events(
+                FakeRequest(disconnect_after=0), subscription, broker, last_event_id=first["id"]
+            )
+        ]
+        assert body[0].startswith("retry:")
+        assert len(body) == 2 and "event: reviewed" in body[1]
+
+        # A subscriber that cannot keep up is closed instead of buffering forever
+        slow = broker.subscribe(emp_no=7)
+        for leave_id in range(2, 6):
+            broker.publish("created", leave_id, 7, None, "PENDING")
+        await asyncio.sleep(0)
+        body = [
+            chunk async for chunk in stream_events(FakeRequest(disconnect_after=10), slow, broker)
+        ]
+        assert len(body) == 2   # retry + the one event that fit before the overflow marker
+        assert broker.replay(slow, "garbage") is None
+        assert not broker._subscriptions
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_requires_a_filter(client):
+    assert client.get("/leave-requests/events").status_code == 400
+
+
+def test_outbox_retries_with_backoff_and_is_idempotent(client):
+    calls = []
+
+    def flaky(outbox_id, payload):
+        calls.append(outbox_id)
+        if len(calls) == 1:
+            raise RuntimeError("downstream unavailable")
+
+    outbox.HANDLERS["test.flaky"] = [flaky]
+    try:
+        db = TestingSessionLocal()
+        try:
+            while drain_outbox():
+                pass  # events queued by other tests
+            outbox.enqueue(db, "test.flaky", {"n": 1})
+            db.commit()
+            message = db.query(models.OutboxMessage).filter_by(topic="test.flaky").one()
+
+            assert outbox.drain(db) == 1
+            db.refresh(message)
+            assert (message.status, message.attempts) == ("PENDING", 1)
+            assert "downstream unavailable" in message.last_error
+            assert message.available_at > datetime.utcnow()
+            assert outbox.drain(db) == 0   # backing off
+
+            message.available_at = datetime.utcnow() - timedelta(seconds=1)
+            db.commit()
+            assert outbox.drain(db) == 1
+            db.refresh(message)
+            assert message.status == "DONE" and message.processed_at is not None
+            assert calls == [message.outbox_id, message.outbox_id]
+        finally:
+            db.close()
+    finally:
+        del outbox.HANDLERS["test.flaky"]
+
+    # Redelivering the same outbox row does not publish a second event
+    broker = LeaveEventBroker()
+    assert broker.publish("created", 1, 7, None, "PENDING", source_id=99) is not None
+    assert broker.publish("created", 1, 7, None, "PENDING", source_id=99) is None
+
+
+def test_outbox_purges_old_processed_rows(client):
+    now = datetime.utcnow()
+    db = TestingSessionLocal()
+    try:
+        def message(status, processed_at):
+            row = models.OutboxMessage(
+                topic="test.purge", payload="{}", status=status, attempts=0,
+                available_at=now, created_at=now, processed_at=processed_at,
+            )
+            db.add(row)
+            return row
+
+        old = [message("DONE", now - timedelta(days=10)) for _ in range(3)]
+        recent = message("DONE", now - timedelta(hours=1))
+        failed = message("FAILED", now - timedelta(days=10))
+        db.commit()
+        kept_ids = {recent.outbox_id, failed.outbox_id}
+
+        assert outbox.purge_processed(db, retention_hours=24 * 7, chunk_size=2) == 3
+        remaining = {
+            outbox_id for (outbox_id,) in db.query(models.OutboxMessage.outbox_id)
+            .filter(models.OutboxMessage.topic == "test.purge")
+        }
+        assert remaining == kept_ids
+        assert outbox.purge_processed(db, retention_hours=24 * 7) == 0
+    finally:
+        db.close()
@@ -0,0 +1,237 @@
+import json
+from datetime import date
+
+from app import models, schemas
+from app.crud import leave_ledger, leave_quotas, leave_rollover
+from tests.conftest import TestingSessionLocal
+from tests.test_leave_requests import create_test_employee
+
+
+def test_rollover_carry_over_and_tenure(client):
+    """Next-year quota = base + capped tenure accrual + capped carry-over; re-runs are no-ops"""
+    db = TestingSessionLocal()
+    try:
+        # hired 2020-01-01; far-future years keep other tests' quotas out of the way
+        create_test_employee(db, emp_no=20035, first_name="Roll", last_name="Over")
+        db.add(models.EmployeeLeaveQuota(emp_no=20035, year=2134, leave_type_id=0, annual_quota_days=8))
+        # hired after from_year, so nothing to carry over
+        new_hire = create_test_employee(db, emp_no=20052, first_name="New", last_name="Hire")
+        new_hire.hire_date = date(2135, 1, 1)
+        # employed through from_year but never touched its quota: default 10 left
+        create_test_employee(db, emp_no=20053, first_name="Un", last_name="Touched")
+        db.commit()
+
+        rules = schemas.RolloverRules(rules={
+            0: schemas.LeaveTypeRolloverRule(
+                base_days=10, carry_over_cap=5, accrual_every_years=2, accrual_days=1, accrual_cap=5
+            ),
+            2: schemas.LeaveTypeRolloverRule(base_days=5),
+        })
+
+        preview = leave_rollover.run_rollover(db, 2134, rules=rules, dry_run=True)
+        assert preview["created"] > 0
+        assert leave_quotas.get_leave_quota(db, 20035, 2135, 0) is None
+        proposed = {
+            (row["emp_no"], row["leave_type_id"]): row["proposed"] for row in preview["diff"]
+        }
+        # 10 base + min(115 // 2, 5) accrual + min(8, 5) carry
+        assert proposed[(20035, 0)] == 20
+        assert proposed[(20035, 2)] == 5
+        # no 2134 row and hired after it: base only
+        assert proposed[(20052, 0)] == 10
+        # no 2134 row but employed then: the untouched default carries over, capped
+        assert proposed[(20053, 0)] == 20
+
+        result = leave_rollover.run_rollover(db, 2134, rules=rules, chunk_size=3)
+        assert result["created"] == preview["created"]
+        assert leave_quotas.get_leave_quota(db, 20035, 2135, 0).annual_quota_days == 20
+
+        again = leave_rollover.run_rollover(db, 2134, rules=rules)
+        assert again["created"] == 0
+        assert again["skipped"] == result["created"] + result["skipped"]
+    finally:
+        db.close()
+
+
+def test_completed_years():
+    assert leave_rollover.completed_years(date(2020, 6, 1), date(2025, 1, 1)) == 4
+    assert leave_rollover.completed_years(date(2020, 1, 1), date(2025, 1, 1)) == 5
+    assert leave_rollover.completed_years(date(2026, 1, 1), date(2025, 1, 1)) == 0
+
+
+def test_ledger_balance_follows_request_lifecycle(client):
+    """Pending -> approved -> cancelled moves the balance snapshot; a rebuild from the ledger agrees"""
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20036, first_name="Led", last_name="Ger")
+        db.add(models.EmployeeLeaveQuota(emp_no=20036, year=2036, leave_type_id=0, annual_quota_days=10))
+        db.commit()
+    finally:
+        db.close()
+
+    def paid_balance():
+        response = client.get("/leave-quotas/20036/2036/balance")
+        assert response.status_code == 200
+        return next(b for b in response.json() if b["leave_type_id"] == 0)
+
+    # Nothing recorded yet: reported straight from the quota row
+    assert paid_balance()["available_days"] == 10
+
+    response = client.post("/leave-requests", json={
+        "emp_no": 20036, "leave_type_id": 0,
+        "start_date": "2036-03-03", "end_date": "2036-03-05",
+    })
+    assert response.status_code == 201
+    leave_id = response.json()["leave_id"]
+    balance = paid_balance()
+    assert (balance["entitled_days"], balance["used_days"], balance["pending_days"]) == (10, 0, 3)
+
+    response = client.patch(
+        f"/leave-requests/{leave_id}/review",
+        params={"manager_emp_no": 20036},
+        json={"status": "APPROVED"},
+    )
+    assert response.status_code == 200
+    balance = paid_balance()
+    assert (balance["used_days"], balance["pending_days"], balance["available_days"]) == (3, 0, 7)
+    assert client.get("/leave-quotas/20036/2036/0").json()["annual_quota_days"] == 7
+
+    response = client.patch(f"/leave-requests/{leave_id}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "CANCELLED"
+    assert paid_balance()["available_days"] == 10
+    assert client.get("/leave-quotas/20036/2036/0").json()["annual_quota_days"] == 10
+
+    # Only pending/approved requests can be cancelled
+    assert client.patch(f"/leave-requests/{leave_id}/cancel").status_code == 400
+
+    # HR edits to the quota row are recorded as adjustments
+    client.put("/leave-quotas/20036/2036/0", json={"annual_quota_days": 12})
+    incremental = paid_balance()
+    assert incremental["available_days"] == 12
+
+    db = TestingSessionLocal()
+    try:
+        leave_ledger.rebuild_balances(db)
+        entry_types = [
+            e.entry_type for e in db.query(models.LeaveLedgerEntry)
+            .filter(models.LeaveLedgerEntry.emp_no == 20036)
+            .order_by(models.LeaveLedgerEntry.entry_id)
+        ]
+    finally:
+        db.close()
+    assert paid_balance() == incremental
+    assert entry_types == ["GRANT", "DEDUCTION", "REVERSAL", "ADJUSTMENT"]
+
+
+def test_list_quotas_keyset_pagination_and_stream(client):
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20037, first_name="Page", last_name="Quota")
+        for year in (2037, 2038, 2039):
+            for leave_type_id in (0, 2):
+                db.add(models.EmployeeLeaveQuota(
+                    emp_no=20037, year=year, leave_type_id=leave_type_id, annual_quota_days=year - 2030,
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+    seen = []
+    params = {"emp_no": 20037, "limit": 4}
+    while True:
+        page = client.get("/leave-quotas", params=params).json()
+        if not page:
+            break
+        assert len(page) <= 4
+        seen.extend((row["year"], row["leave_type_id"]) for row in page)
+        last = page[-1]
+        params.update(
+            after_emp_no=last["emp_no"], after_year=last["year"], after_leave_type_id=last["leave_type_id"]
+        )
+    assert seen == [(y, t) for y in (2037, 2038, 2039) for t in (0, 2)]
+
+    response = client.get("/leave-quotas", params={"after_emp_no": 20037})
+    assert response.status_code == 400
+    assert client.get("/leave-quotas", params={"limit": 100000}).status_code == 422
+
+    response = client.get("/leave-quotas/stream", params={"emp_no": 20037})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 6
+    assert rows[0] == {"emp_no": 20037, "year": 2037, "leave_type_id": 0, "annual_quota_days": 7}
+
+
+def test_bulk_quota_upsert(client):
+    client.post("/departments", json={"dept_no": "q037", "dept_name": "Bulk Quota Dept"})
+    db = TestingSessionLocal()
+    try:
+        for emp_no in (20038, 20039):
+            create_test_employee(db, emp_no=emp_no, first_name="Bulk", last_name="Quota")
+            db.add(models.DeptEmp(
+                emp_no=emp_no, dept_no="q037", from_date=date(2020, 1, 1), to_date=models.FAR_FUTURE,
+            ))
+        db.add(models.EmployeeLeaveQuota(emp_no=20038, year=2040, leave_type_id=0, annual_quota_days=4))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.post("/leave-quotas/bulk", json={
+        "entries": [
+            {"emp_no": 20038, "year": 2041, "leave_type_id": 2, "days": 9},
+            {"emp_no": 29999999, "year": 2041, "leave_type_id": 2, "days": 9},
+            {"emp_no": 20039, "year": 2041, "leave_type_id": 0, "delta": -20},
+            {"emp_no": 20039, "year": 2041, "leave_type_id": 2},
+        ],
+        "department_rules": [
+            {"dept_no": "q037", "year": 2040, "leave_type_id": 0, "delta": 3},
+            {"dept_no": "zzzz", "year": 2040, "leave_type_id": 0, "days": 1},
+        ],
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["applied"] == 3
+    errors = {(e["index"], e["dept_no"]): e["detail"] for e in result["errors"]}
+    assert errors == {
+        (1, None): "Employee not found",
+        (2, None): "Quota cannot go below 0",
+        (3, None): "Exactly one of days or delta is required",
+        (1, "zzzz"): "Department not found",
+    }
+
+    def quota(emp_no, year, leave_type_id):
+        return client.get(f"/leave-quotas/{emp_no}/{year}/{leave_type_id}").json()["annual_quota_days"]
+
+    assert quota(20038, 2041, 2) == 9
+    assert quota(20038, 2040, 0) == 7    # existing 4 + 3
+    assert quota(20039, 2040, 0) == 13   # default 10 + 3
+
+
+def test_portable_quota_upsert(client):
+    """The fallback for dialects without an upsert syntax: guarded UPDATE, then INSERT ... WHERE NOT EXISTS"""
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20051, first_name="Port", last_name="Able")
+        db.add(models.EmployeeLeaveQuota(emp_no=20051, year=2051, leave_type_id=0, annual_quota_days=10))
+        db.commit()
+
+        table = models.EmployeeLeaveQuota.__table__
+        rows = [
+            {"emp_no": 20051, "year": 2051, "leave_type_id": 0, "annual_quota_days": 12},
+            {"emp_no": 20051, "year": 2051, "leave_type_id": 2, "annual_quota_days": 4},
+        ]
+        db.execute(leave_quotas._insert_missing_stmt(table), leave_quotas._bound_rows(rows))
+        db.commit()
+        quotas = {q.leave_type_id: (q.annual_quota_days, q.version)
+                  for q in db.query(models.EmployeeLeaveQuota).filter_by(emp_no=20051, year=2051)}
+        assert quotas == {0: (10, 1), 2: (4, 1)}
+
+        rows.append({"emp_no": 20051, "year": 2052, "leave_type_id": 0, "annual_quota_days": 7})
+        leave_quotas._upsert_portable(db, rows)
+        db.commit()
+        quotas = {(q.year, q.leave_type_id): (q.annual_quota_days, q.version)
+                  for q in db.query(models.EmployeeLeaveQuota).filter_by(emp_no=20051).populate_existing()}
+        assert quotas == {(2051, 0): (12, 2), (2051, 2): (4, 2), (2052, 0): (7, 1)}
+    finally:
+        db.close()
@@ -5,6 +5,10 @@ from sqlalchemy import text
 from app import models
 from tests.conftest import TestingSessionLocal
 
+# Leave is counted in working days; anchor relative dates on this week's
+# Monday so "+7 .. +11" is always Monday .. Friday.
+MONDAY = date.today() - timedelta(days=date.today().weekday())
+
 
 def create_test_employee(db: Session, emp_no: int, first_name: str = "Test", last_name: str = "Employee") -> models.Employee:
     """Helper to create a test employee"""
@@ -88,8 +92,8 @@ def test_create_paid_leave_request_sufficient_quota(client):
         payload = {
             "emp_no": 10001,
             "leave_type_id": 0,  # paid
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=11)),  # 5 days inclusive
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=11)),  # 5 days inclusive
             "employee_comment": "Vacation request"
         }
         
@@ -118,8 +122,8 @@ def test_create_sick_leave_request_sufficient_quota(client):
         payload = {
             "emp_no": 10002,
             "leave_type_id": 2,  # sick
-            "start_date": str(date.today() + timedelta(days=1)),
-            "end_date": str(date.today() + timedelta(days=3)),  # 3 days inclusive
+            "start_date": str(MONDAY + timedelta(days=1)),
+            "end_date": str(MONDAY + timedelta(days=3)),  # 3 days inclusive
             "employee_comment": "Medical appointment"
         }
         
@@ -146,8 +150,8 @@ def test_create_leave_request_insufficient_quota(client):
         payload = {
             "emp_no": 10003,
             "leave_type_id": 0,  # paid
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=21)),  # 15 days inclusive
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=21)),  # 15 days inclusive
             "employee_comment": "Long vacation"
         }
         
@@ -170,8 +174,8 @@ def test_create_unpaid_leave_request_no_quota_check(client):
         payload = {
             "emp_no": 10004,
             "leave_type_id": 1,  # unpaid
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=26)),  # 20 days inclusive
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=26)),  # 15 working days inclusive
             "employee_comment": "Personal leave"
         }
         
@@ -181,7 +185,7 @@ def test_create_unpaid_leave_request_no_quota_check(client):
         data = response.json()
         assert data["leave_type_id"] == 1
         assert data["status"] == "PENDING"
-        assert data["days_requested"] == 20
+        assert data["days_requested"] == 15
     finally:
         db.close()
 
@@ -199,20 +203,20 @@ def test_manager_approves_leave_request_quota_deducted(client):
         payload = {
             "emp_no": 10005,
             "leave_type_id": 0,  # paid
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),  # 3 days
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),  # 3 days
             "employee_comment": "Vacation"
         }
         leave_request = client.post("/leave-requests", json=payload).json()
         leave_id = leave_request["leave_id"]
         
-        # Check initial quota (should be 10 days default)
+        # Creating the request only reads the quota: no row yet, default 10 days applies
         quota_before = db.query(models.EmployeeLeaveQuota).filter(
             models.EmployeeLeaveQuota.emp_no == 10005,
             models.EmployeeLeaveQuota.leave_type_id == 0
         ).first()
-        assert quota_before is not None
-        initial_quota = quota_before.annual_quota_days
+        assert quota_before is None
+        initial_quota = 10
         
         # Manager approves the request
         review_payload = {
@@ -232,8 +236,11 @@ def test_manager_approves_leave_request_quota_deducted(client):
         assert data["decided_at"] is not None
         
         # Verify quota was deducted
-        db.refresh(quota_before)
-        assert quota_before.annual_quota_days == initial_quota - 3
+        quota_after = db.query(models.EmployeeLeaveQuota).filter(
+            models.EmployeeLeaveQuota.emp_no == 10005,
+            models.EmployeeLeaveQuota.leave_type_id == 0
+        ).first()
+        assert quota_after.annual_quota_days == initial_quota - 3
     finally:
         db.close()
 
@@ -251,19 +258,15 @@ def test_manager_rejects_leave_request_quota_not_deducted(client):
         payload = {
             "emp_no": 10006,
             "leave_type_id": 0,  # paid
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),  # 3 days
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),  # 3 days
             "employee_comment": "Vacation"
         }
         leave_request = client.post("/leave-requests", json=payload).json()
         leave_id = leave_request["leave_id"]
         
-        # Check initial quota
-        quota_before = db.query(models.EmployeeLeaveQuota).filter(
-            models.EmployeeLeaveQuota.emp_no == 10006,
-            models.EmployeeLeaveQuota.leave_type_id == 0
-        ).first()
-        initial_quota = quota_before.annual_quota_days
+        # Check initial quota (no row yet: default 10 days)
+        initial_quota = 10
         
         # Manager rejects the request
         review_payload = {
@@ -280,8 +283,11 @@ def test_manager_rejects_leave_request_quota_not_deducted(client):
         assert data["status"] == "REJECTED"
         
         # Verify quota was NOT deducted
-        db.refresh(quota_before)
-        assert quota_before.annual_quota_days == initial_quota
+        quota_after = db.query(models.EmployeeLeaveQuota).filter(
+            models.EmployeeLeaveQuota.emp_no == 10006,
+            models.EmployeeLeaveQuota.leave_type_id == 0
+        ).first()
+        assert quota_after is None or quota_after.annual_quota_days == initial_quota
     finally:
         db.close()
 
@@ -299,8 +305,8 @@ def test_review_non_pending_request_fails(client):
         payload = {
             "emp_no": 10007,
             "leave_type_id": 1,  # unpaid (no quota issues)
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
         }
         leave_request = client.post("/leave-requests", json=payload).json()
         leave_id = leave_request["leave_id"]
@@ -336,8 +342,8 @@ def test_multiple_requests_quota_tracking(client):
         payload1 = {
             "emp_no": 10008,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),  # 3 days
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),  # 3 days
         }
         req1 = client.post("/leave-requests", json=payload1).json()
         
@@ -358,8 +364,8 @@ def test_multiple_requests_quota_tracking(client):
         payload2 = {
             "emp_no": 10008,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=20)),
-            "end_date": str(date.today() + timedelta(days=23)),  # 4 days
+            "start_date": str(MONDAY + timedelta(days=21)),
+            "end_date": str(MONDAY + timedelta(days=24)),  # 4 days
         }
         req2 = client.post("/leave-requests", json=payload2).json()
         
@@ -390,8 +396,8 @@ def test_list_leave_requests_by_status(client):
             payload = {
                 "emp_no": 10009,
                 "leave_type_id": 1,  # unpaid
-                "start_date": str(date.today() + timedelta(days=7 + i)),
-                "end_date": str(date.today() + timedelta(days=8 + i)),
+                "start_date": str(MONDAY + timedelta(days=7 + 2 * i)),
+                "end_date": str(MONDAY + timedelta(days=8 + 2 * i)),
             }
             req = client.post("/leave-requests", json=payload).json()
             
@@ -437,16 +443,16 @@ def test_list_leave_requests_by_employee(client):
         payload1 = {
             "emp_no": 10010,
             "leave_type_id": 1,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=8)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=8)),
         }
         client.post("/leave-requests", json=payload1)
         
         payload2 = {
             "emp_no": 10011,
             "leave_type_id": 1,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=8)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=8)),
         }
         client.post("/leave-requests", json=payload2)
         
@@ -509,8 +515,8 @@ def test_manager_auto_assigned_on_leave_request_creation(client):
         payload = {
             "emp_no": 50010,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
             "employee_comment": "Vacation"
         }
         
@@ -579,8 +585,8 @@ def test_manager_auto_assigned_latest_department(client):
         payload = {
             "emp_no": 20011,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
         }
         
         response = client.post("/leave-requests", json=payload)
@@ -604,8 +610,8 @@ def test_no_manager_when_no_department(client):
         payload = {
             "emp_no": 20012,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
         }
         
         response = client.post("/leave-requests", json=payload)
@@ -647,8 +653,8 @@ def test_no_manager_when_department_has_no_manager(client):
         payload = {
             "emp_no": 20013,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
         }
         
         response = client.post("/leave-requests", json=payload)
@@ -703,8 +709,8 @@ def test_manager_auto_assigned_then_manager_approves(client):
         payload = {
             "emp_no": 20014,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=7)),
-            "end_date": str(date.today() + timedelta(days=9)),
+            "start_date": str(MONDAY + timedelta(days=7)),
+            "end_date": str(MONDAY + timedelta(days=9)),
         }
         leave_request = client.post("/leave-requests", json=payload).json()
         leave_id = leave_request["leave_id"]
@@ -736,8 +742,8 @@ def test_invalid_employee_returns_404(client):
     payload = {
         "emp_no": 99999,  # Non-existent employee
         "leave_type_id": 0,
-        "start_date": str(date.today() + timedelta(days=7)),
-        "end_date": str(date.today() + timedelta(days=9)),
+        "start_date": str(MONDAY + timedelta(days=7)),
+        "end_date": str(MONDAY + timedelta(days=9)),
     }
     
     response = client.post("/leave-requests", json=payload)
@@ -755,8 +761,8 @@ def test_invalid_dates_returns_400(client):
         payload = {
             "emp_no": 20015,
             "leave_type_id": 0,
-            "start_date": str(date.today() + timedelta(days=10)),
-            "end_date": str(date.today() + timedelta(days=5)),  # End before start
+            "start_date": str(MONDAY + timedelta(days=10)),
+            "end_date": str(MONDAY + timedelta(days=5)),  # End before start
         }
         
         response = client.post("/leave-requests", json=payload)
@@ -765,3 +771,691 @@ def test_invalid_dates_returns_400(client):
     finally:
         db.close()
 
+
+
+# Test Case 18: Manager resolver serves batches from cache and sees dept changes
+def test_manager_resolver_batch_and_invalidation(client):
+    """Batch resolution costs no queries once loaded; dept writes invalidate the maps"""
+    from sqlalchemy import event
+    from app.crud.leave_requests import get_employee_managers
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20028, first_name="Res", last_name="One")
+        create_test_employee(db, emp_no=20029, first_name="Res", last_name="Two")
+        create_test_employee(db, emp_no=30028, first_name="Manager", last_name="Res")
+        create_department_assignment(db, 20028, "d028")
+        create_department_manager(db, 30028, "d028")
+
+        assert get_employee_managers(db, [20028, 20029]) == {20028: 30028, 20029: None}
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.get_bind(), "before_cursor_execute", listener)
+        try:
+            assert get_employee_managers(db, [20028, 20029]) == {20028: 30028, 20029: None}
+        finally:
+            event.remove(db.get_bind(), "before_cursor_execute", listener)
+        assert statements == []
+
+        # Writing dept_emp drops the cached maps
+        create_department_assignment(db, 20029, "d028")
+        assert get_employee_managers(db, [20029]) == {20029: 30028}
+    finally:
+        db.close()
+
+
+# Test Case 19: Manager inbox filter, keyset paging and pending count
+def test_manager_inbox_keyset_and_pending_count(client):
+    """manager_emp_no filters the listing; keyset pages walk the inbox without overlap"""
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20030, first_name="Inbox", last_name="Emp")
+        create_test_employee(db, emp_no=30030, first_name="Inbox", last_name="Manager")
+        create_department_assignment(db, 20030, "d030")
+        create_department_manager(db, 30030, "d030")
+
+        created = []
+        for i in range(4):
+            payload = {
+                "emp_no": 20030,
+                "leave_type_id": 1,
+                "start_date": str(MONDAY + timedelta(days=35 + i)),
+                "end_date": str(MONDAY + timedelta(days=35 + i)),
+            }
+            created.append(client.post("/leave-requests", json=payload).json())
+        client.patch(
+            f"/leave-requests/{created[0]['leave_id']}/review?manager_emp_no=30030",
+            json={"status": "APPROVED"},
+        )
+
+        response = client.get("/leave-requests/pending-count?manager_emp_no=30030")
+        assert response.status_code == 200
+        assert response.json()["pending"] == 3
+
+        seen = []
+        params = {"manager_emp_no": 30030, "status": "PENDING", "limit": 2}
+        while True:
+            page = client.get("/leave-requests", params=params).json()
+            if not page:
+                break
+            assert all(req["manager_emp_no"] == 30030 for req in page)
+            seen.extend(req["leave_id"] for req in page)
+            params["before_requested_at"] = page[-1]["requested_at"]
+            params["before_leave_id"] = page[-1]["leave_id"]
+        assert sorted(seen) == sorted(req["leave_id"] for req in created[1:])
+
+        # Half a cursor is rejected
+        response = client.get("/leave-requests", params={"before_leave_id": 1})
+        assert response.status_code == 400
+    finally:
+        db.close()
+
+
+# Test Case 20: Bulk review applies decisions and aggregated quota in one call
+def test_bulk_review_leave_requests(client):
+    """PATCH /leave-requests/review decides many requests and reports per-item outcomes"""
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20031, first_name="Bulk", last_name="Emp")
+        create_test_employee(db, emp_no=30031, first_name="Bulk", last_name="Manager")
+
+        def create(leave_type_id, offset, days):
+            payload = {
+                "emp_no": 20031,
+                "leave_type_id": leave_type_id,
+                "start_date": str(date(2031, 3, 3) + timedelta(days=offset)),  # a Monday
+                "end_date": str(date(2031, 3, 3) + timedelta(days=offset + days - 1)),
+            }
+            return client.post("/leave-requests", json=payload).json()["leave_id"]
+
+        paid_a = create(0, 0, 2)
+        paid_b = create(0, 7, 3)
+        sick = create(2, 14, 1)
+        rejected = create(0, 21, 1)
+        client.patch(f"/leave-requests/{rejected}/review?manager_emp_no=30031",
+                     json={"status": "REJECTED"})
+
+        items = [
+            {"leave_id": paid_a, "status": "APPROVED"},
+            {"leave_id": paid_b, "status": "APPROVED", "manager_comment": "ok"},
+            {"leave_id": sick, "status": "REJECTED"},
+            {"leave_id": rejected, "status": "APPROVED"},
+            {"leave_id": 999999, "status": "APPROVED"},
+        ]
+        response = client.patch("/leave-requests/review?manager_emp_no=30031", json={"items": items})
+        assert response.status_code == 200
+        outcomes = {o["leave_id"]: o for o in response.json()}
+        assert outcomes[paid_a]["ok"] and outcomes[paid_b]["ok"] and outcomes[sick]["ok"]
+        assert not outcomes[rejected]["ok"] and "already" in outcomes[rejected]["detail"]
+        assert not outcomes[999999]["ok"]
+
+        assert client.get(f"/leave-requests/{paid_b}").json()["manager_comment"] == "ok"
+        assert client.get(f"/leave-requests/{sick}").json()["status"] == "REJECTED"
+
+        # Both paid approvals deducted from the 2031 quota in one aggregated update
+        quota = client.get("/leave-quotas/20031/2031/0").json()
+        assert quota["annual_quota_days"] == 10 - 5
+    finally:
+        db.close()
+
+
+# Test Case 21: Approval that exceeds the remaining quota changes nothing
+def test_approval_with_insufficient_quota_is_atomic(client):
+    """Status change and quota deduction commit together or not at all"""
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20032, first_name="Atomic", last_name="Emp")
+        create_test_employee(db, emp_no=30032, first_name="Atomic", last_name="Manager")
+
+        leave_ids = []
+        for offset in (0, 7):
+            payload = {
+                "emp_no": 20032,
+                "leave_type_id": 2,  # sick, 5 days default
+                "start_date": str(date(2032, 5, 3) + timedelta(days=offset)),  # a Monday
+                "end_date": str(date(2032, 5, 3) + timedelta(days=offset + 2)),  # 3 days
+            }
+            leave_ids.append(client.post("/leave-requests", json=payload).json()["leave_id"])
+
+        response = client.patch(f"/leave-requests/{leave_ids[0]}/review?manager_emp_no=30032",
+                                json={"status": "APPROVED"})
+        assert response.status_code == 200
+
+        # 2 days left, second request needs 3
+        response = client.patch(f"/leave-requests/{leave_ids[1]}/review?manager_emp_no=30032",
+                                json={"status": "APPROVED"})
+        assert response.status_code == 400
+        assert "Insufficient quota" in response.json()["detail"]
+
+        assert client.get(f"/leave-requests/{leave_ids[1]}").json()["status"] == "PENDING"
+        assert client.get("/leave-quotas/20032/2032/2").json()["annual_quota_days"] == 2
+    finally:
+        db.close()
+
+
+# Test Case 22: Quota get-or-create is a race-free upsert; availability check never writes
+def test_get_or_create_quota_upsert_and_readonly_check(client):
+    """get_or_create_quota returns existing rows untouched; check_quota_availability writes nothing"""
+    from app.crud import leave_quotas
+    from app.crud.leave_requests import check_quota_availability
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20033, first_name="Upsert", last_name="Emp")
+
+        assert check_quota_availability(db, 20033, 0, 10, year=2033)
+        assert not check_quota_availability(db, 20033, 0, 11, year=2033)
+        assert leave_quotas.get_leave_quota(db, 20033, 2033, 0) is None
+
+        quota = leave_quotas.get_or_create_quota(db, 20033, 0, 2033)
+        assert quota.annual_quota_days == 10
+        db.commit()
+
+        leave_quotas.deduct_quota(db, 20033, 2033, 0, 4)
+        db.commit()
+
+        # Second call hits the conflict path and returns the existing row
+        quota = leave_quotas.get_or_create_quota(db, 20033, 0, 2033)
+        assert quota.annual_quota_days == 6
+        db.commit()
+    finally:
+        db.close()
+
+
+# Test Case 23: Set-based quota backfill only fills the gaps
+def test_backfill_quotas_inserts_missing_only(client):
+    """backfill_quotas creates missing rows with overrides and skips existing ones"""
+    from app.crud import leave_quotas
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20034, first_name="Backfill", last_name="One")
+        db.add(models.EmployeeLeaveQuota(emp_no=20034, year=2034, leave_type_id=0, annual_quota_days=3))
+        db.commit()
+
+        total = db.query(models.Employee).count()
+        created, skipped = leave_quotas.backfill_quotas(
+            db, year=2034, quotas={0: 12, 2: 6}, chunk_size=20000
+        )
+        assert created + skipped == total * 2
+        assert skipped == 1
+
+        assert leave_quotas.get_leave_quota(db, 20034, 2034, 0).annual_quota_days == 3
+        assert leave_quotas.get_leave_quota(db, 20034, 2034, 2).annual_quota_days == 6
+
+        # Re-running is a no-op
+        assert leave_quotas.backfill_quotas(db, year=2034, quotas={0: 12, 2: 6}) == (0, total * 2)
+    finally:
+        db.close()
+
+
+# Test Case 24: Overlapping requests are rejected; the audit sweep finds legacy overlaps
+def test_overlapping_leave_requests(client):
+    from datetime import datetime
+    from app.crud import leave_requests
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20040, first_name="Over", last_name="Lap")
+    finally:
+        db.close()
+
+    def request(start, end, leave_type_id=1):
+        return client.post("/leave-requests", json={
+            "emp_no": 20040, "leave_type_id": leave_type_id, "start_date": start, "end_date": end,
+        })
+
+    first = request("2042-05-04", "2042-05-08")
+    assert first.status_code == 201
+    first_id = first.json()["leave_id"]
+
+    response = request("2042-05-08", "2042-05-10")
+    assert response.status_code == 400
+    assert f"overlaps existing leave request {first_id}" in response.json()["detail"]
+    # Also across leave types
+    assert request("2042-05-01", "2042-05-20", leave_type_id=0).status_code == 400
+    # Adjacent ranges are fine
+    second = request("2042-05-09", "2042-05-10")
+    assert second.status_code == 201
+
+    # Moving a request onto another one is rejected too
+    response = client.put(f"/leave-requests/{second.json()['leave_id']}", json={"start_date": "2042-05-07"})
+    assert response.status_code == 400
+
+    # Cancelled requests no longer block their dates
+    client.patch(f"/leave-requests/{first_id}/cancel")
+    assert request("2042-05-05", "2042-05-06").status_code == 201
+
+    # Legacy overlap written behind the API's back
+    db = TestingSessionLocal()
+    try:
+        legacy = models.EmployeeLeaveRequest(
+            emp_no=20040, leave_type_id=1, start_date=date(2042, 5, 10), end_date=date(2042, 5, 12),
+            days_requested=3, status="APPROVED", requested_at=datetime.utcnow(),
+        )
+        db.add(legacy)
+        db.commit()
+        overlaps = [
+            o for o in leave_requests.find_all_overlaps(db) if o["emp_no"] == 20040
+        ]
+        assert overlaps == [{
+            "emp_no": 20040,
+            "leave_id": second.json()["leave_id"],
+            "overlapping_leave_id": legacy.leave_id,
+            "overlap_start": date(2042, 5, 10),
+            "overlap_end": date(2042, 5, 10),
+        }]
+    finally:
+        db.close()
+
+
+def explain(query) -> str:
+    """SQLite EXPLAIN QUERY PLAN for an ORM query, as one string."""
+    compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    connection = query.session.connection()
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+# Test Case 25: Listings read a composite index in order; start_date filters and keyset compose
+def test_list_leave_requests_index_plans_and_start_filter(client):
+    from datetime import datetime
+    from app.crud.leave_requests import leave_requests_query
+
+    db = TestingSessionLocal()
+    try:
+        cursor = {"before_requested_at": datetime(2100, 1, 1), "before_leave_id": 1}
+        cases = [
+            ({}, "ix_leave_requests_requested"),
+            ({"status": "PENDING"}, "ix_leave_requests_status_requested"),
+            ({"emp_no": 10001}, "ix_leave_requests_emp_requested"),
+            ({"manager_emp_no": 20001, "status": "PENDING"}, "ix_leave_requests_manager_status_requested"),
+            ({"status": "APPROVED", **cursor}, "ix_leave_requests_status_requested"),
+        ]
+        for filters, index in cases:
+            plan = explain(leave_requests_query(db, **filters).limit(50))
+            assert index in plan, (filters, plan)
+            assert "TEMP B-TREE" not in plan, (filters, plan)
+
+        create_test_employee(db, emp_no=20041, first_name="Range", last_name="Filter")
+    finally:
+        db.close()
+
+    for start in ("2045-02-06", "2045-02-13", "2045-02-20"):  # Mondays
+        response = client.post("/leave-requests", json={
+            "emp_no": 20041, "leave_type_id": 1, "start_date": start, "end_date": start,
+        })
+        assert response.status_code == 201
+
+    response = client.get(
+        "/leave-requests", params={"emp_no": 20041, "start_from": "2045-02-07", "start_to": "2045-02-20"}
+    )
+    assert response.status_code == 200
+    assert sorted(r["start_date"] for r in response.json()) == ["2045-02-13", "2045-02-20"]
+    assert client.get("/leave-requests", params={"limit": 10000}).status_code == 422
+
+
+def test_import_leave_requests_csv(client):
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20043, first_name="Import", last_name="One")
+        create_test_employee(db, emp_no=20044, first_name="Import", last_name="Two")
+    finally:
+        db.close()
+
+    csv_body = "\n".join([
+        "emp_no,leave_type_id,start_date,end_date,status,employee_comment",
+        "20043,0,2048-03-02,2048-03-06,APPROVED,old system",   # 2: 5 days
+        "20043,0,2048-03-09,2048-03-13,APPROVED,",             # 3: 5 more, quota now used up
+        "20043,0,2048-03-16,2048-03-16,PENDING,",              # 4: no quota left
+        "20043,1,2048-03-04,2048-03-04,,",                     # 5: overlaps row 2
+        "29999999,1,2048-03-02,2048-03-02,,",                  # 6: unknown employee
+        "20044,2,2048-03-07,2048-03-08,,",                     # 7: weekend only
+        "20044,1,2048-13-01,2048-03-08,,",                     # 8: bad date
+        "20044,2,2048-03-02,2048-03-03,PENDING,",              # 9: 2 days pending
+    ]) + "\n"
+    headers = {"Content-Type": "text/csv"}
+
+    dry = client.post("/leave-requests/import", params={"dry_run": True}, content=csv_body, headers=headers)
+    assert dry.status_code == 200
+    assert dry.json()["imported"] == 3
+    assert [e["row"] for e in dry.json()["errors"]] == [4, 5, 6, 7, 8]
+    assert client.get("/leave-requests", params={"emp_no": 20043}).json() == []
+
+    response = client.post("/leave-requests/import", params={"chunk_size": 1}, content=csv_body, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["imported"] == 3 and body["failed"] == 5
+    errors = {e["row"]: e["detail"] for e in body["errors"]}
+    assert errors[4] == "Insufficient quota"
+    assert errors[5] == "Overlaps row 2"
+    assert "not found" in errors[6]
+    assert "working day" in errors[7]
+
+    imported = client.get("/leave-requests", params={"emp_no": 20043}).json()
+    assert sorted((r["start_date"], r["days_requested"], r["status"]) for r in imported) == [
+        ("2048-03-02", 5, "APPROVED"), ("2048-03-09", 5, "APPROVED"),
+    ]
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20043/2048/balance").json()}
+    assert balances[0]["used_days"] == 10 and balances[0]["available_days"] == 0
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20044/2048/balance").json()}
+    assert balances[2]["pending_days"] == 2
+
+    # Importing the same file again only produces overlap errors
+    again = client.post("/leave-requests/import", content=csv_body, headers=headers).json()
+    assert again["imported"] == 0
+    assert "Overlaps leave request" in {e["row"]: e["detail"] for e in again["errors"]}[2]
+
+    bad_header = client.post("/leave-requests/import", content="emp_no,start\n1,2\n", headers=headers).json()
+    assert bad_header["errors"][0]["row"] == 1
+
+    managed = "\n".join([
+        "emp_no,leave_type_id,start_date,end_date,manager_emp_no",
+        "20044,1,2048-04-06,2048-04-06,20043",
+        "20044,1,2048-04-07,2048-04-07,29999999",  # unknown manager
+    ]) + "\n"
+    result = client.post("/leave-requests/import", content=managed, headers=headers).json()
+    assert result["imported"] == 1
+    assert result["errors"] == [{"row": 3, "detail": "Manager with emp_no 29999999 not found"}]
+
+    # Separators str.splitlines() would break on stay inside quoted fields
+    comment = "first\u2028second\x0bthird\x85fourth\x1cfifth"
+    quoted = f'emp_no,leave_type_id,start_date,end_date,employee_comment\n20044,1,2048-04-08,2048-04-08,"{comment}"\n'
+    result = client.post(
+        "/leave-requests/import", content=quoted.encode("utf-8"), headers={"Content-Type": "text/csv; charset=utf-8"}
+    ).json()
+    assert result == {"imported": 1, "failed": 0, "errors": []}
+    rows = client.get("/leave-requests", params={"emp_no": 20044, "start_from": "2048-04-08"}).json()
+    assert [r["employee_comment"] for r in rows] == [comment]
+
+
+def test_expire_stale_pending_leave_requests(client):
+    from app.crud import leave_requests
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20045, first_name="Stale", last_name="Pending")
+    finally:
+        db.close()
+
+    csv_body = "\n".join([
+        "emp_no,leave_type_id,start_date,end_date,status,requested_at",
+        "20045,0,2000-03-06,2000-03-07,PENDING,2000-02-01T09:00:00",  # started before "today"
+        "20045,0,2001-03-05,2001-03-05,PENDING,2000-01-03T09:00:00",  # older than 30 days
+        "20045,0,2001-03-12,2001-03-12,PENDING,2000-12-20T09:00:00",  # still fresh
+        "20045,0,2000-04-03,2000-04-03,APPROVED,2000-03-01T09:00:00",
+    ]) + "\n"
+    result = client.post("/leave-requests/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert result.json()["imported"] == 4
+
+    db = TestingSessionLocal()
+    try:
+        today = date(2001, 1, 1)
+        counts = leave_requests.expire_pending_leave_requests(db, today=today, max_age_days=30, dry_run=True)
+        assert counts["expired"] == 2 and counts["past_start"] == 1
+        counts = leave_requests.expire_pending_leave_requests(db, today=today, max_age_days=30, chunk_size=1)
+        assert counts == {"expired": 2, "past_start": 1, "too_old": 1, "chunks": 2}
+        # Nothing left to do
+        assert leave_requests.expire_pending_leave_requests(db, today=today, max_age_days=30)["expired"] == 0
+    finally:
+        db.close()
+
+    rows = {r["start_date"]: r for r in client.get("/leave-requests", params={"emp_no": 20045}).json()}
+    assert rows["2000-03-06"]["status"] == "CANCELLED" and rows["2000-03-06"]["decided_at"] is not None
+    assert rows["2001-03-05"]["status"] == "CANCELLED"
+    assert rows["2001-03-12"]["status"] == "PENDING"
+    assert rows["2000-04-03"]["status"] == "APPROVED"
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20045/2000/balance").json()}
+    assert balances[0]["pending_days"] == 0 and balances[0]["used_days"] == 1
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20045/2001/balance").json()}
+    assert balances[0]["pending_days"] == 1
+
+
+def test_create_leave_request_statement_count(client):
+    from sqlalchemy import event
+    from tests.conftest import engine
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20046, first_name="Few", last_name="Queries")
+        create_test_employee(db, emp_no=20047, first_name="Few", last_name="Boss")
+        setup_department_tables(db)
+        create_department_assignment(db, 20046, "s046")
+        create_department_manager(db, 20047, "s046")
+    finally:
+        db.close()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    def create(leave_type_id, day):
+        statements.clear()
+        response = client.post("/leave-requests", json={
+            "emp_no": 20046, "leave_type_id": leave_type_id, "start_date": day, "end_date": day,
+        })
+        assert response.status_code == 201
+        return response.json()
+
+    # First paid request of the year seeds the balance snapshot
+    create(0, "2049-03-01")
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        created = create(0, "2049-03-02")
+        assert created["manager_emp_no"] == 20047 and created["days_requested"] == 1
+        # combined check, insert, pending_days update, outbox row
+        assert statements == ["SELECT", "INSERT", "UPDATE", "INSERT"]
+        create(1, "2049-03-03")
+        assert statements == ["SELECT", "INSERT", "INSERT"]
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20046/2049/balance").json()}
+    assert balances[0]["pending_days"] == 2
+
+
+def test_leave_request_and_quota_versions(client):
+    from fastapi import HTTPException
+    from app import schemas
+    from app.crud import leave_requests
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20048, first_name="Opti", last_name="Mistic")
+    finally:
+        db.close()
+
+    quota = client.post("/leave-quotas", json={
+        "emp_no": 20048, "year": 2049, "leave_type_id": 0, "annual_quota_days": 10,
+    })
+    assert quota.json()["version"] == 1
+    created = client.post("/leave-requests", json={
+        "emp_no": 20048, "leave_type_id": 0, "start_date": "2049-06-07", "end_date": "2049-06-08",
+    }).json()
+    leave_id = created["leave_id"]
+    assert created["version"] == 1
+
+    # A reader holding version 1 ...
+    db = TestingSessionLocal()
+    try:
+        stale = leave_requests.get_leave_request(db, leave_id)
+        assert stale.version == 1
+
+        # ... while someone else edits the request
+        edited = client.put(f"/leave-requests/{leave_id}", json={"employee_comment": "hi", "version": 1})
+        assert edited.status_code == 200 and edited.headers["ETag"] == '"2"'
+        assert client.put(
+            f"/leave-requests/{leave_id}", json={"employee_comment": "lost"}, headers={"If-Match": '"1"'}
+        ).status_code == 409
+
+        # Even without an explicit version the ORM's version check refuses the stale write
+        try:
+            leave_requests.update_leave_request(db, stale, schemas.LeaveRequestUpdate(end_date=date(2049, 6, 14)))
+            assert False, "expected a version conflict"
+        except HTTPException as exc:
+            assert exc.status_code == 409
+    finally:
+        db.close()
+    assert client.get(f"/leave-requests/{leave_id}").json()["end_date"] == "2049-06-08"
+
+    # Approval moves the quota, so an HR edit based on the earlier read conflicts
+    quota = client.get("/leave-quotas/20048/2049/0")
+    assert quota.headers["ETag"] == '"1"'
+    client.patch(f"/leave-requests/{leave_id}/review", params={"manager_emp_no": 20048},
+                 json={"status": "APPROVED"})
+    reviewed = client.get(f"/leave-requests/{leave_id}").json()
+    assert reviewed["status"] == "APPROVED" and reviewed["version"] == 3
+    response = client.put("/leave-quotas/20048/2049/0", json={"annual_quota_days": 20},
+                          headers={"If-Match": quota.headers["ETag"]})
+    assert response.status_code == 409
+    current = client.get("/leave-quotas/20048/2049/0")
+    assert current.json()["annual_quota_days"] == 8
+    response = client.put("/leave-quotas/20048/2049/0", json={"annual_quota_days": 20},
+                          headers={"If-Match": current.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["version"] == current.json()["version"] + 1
+
+
+def test_archive_decided_leave_requests(client):
+    from app.crud import leave_archive
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20049, first_name="Old", last_name="History")
+    finally:
+        db.close()
+
+    csv_body = "\n".join([
+        "emp_no,leave_type_id,start_date,end_date,status,requested_at,decided_at",
+        "20049,0,1998-03-02,1998-03-03,APPROVED,1998-02-02T09:00:00,1998-02-03T09:00:00",
+        "20049,0,1998-06-01,1998-06-01,REJECTED,1998-05-04T09:00:00,1998-05-05T09:00:00",
+        "20049,0,1999-03-01,1999-03-01,PENDING,1999-02-01T09:00:00,",
+        # ended long ago but decided inside the retention window
+        "20049,0,1999-11-01,1999-11-01,APPROVED,1999-10-01T09:00:00,1999-12-15T09:00:00",
+    ]) + "\n"
+    result = client.post("/leave-requests/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert result.json()["imported"] == 4
+    hot = client.get("/leave-requests", params={"emp_no": 20049}).json()
+    ids = {r["start_date"]: r["leave_id"] for r in hot}
+
+    db = TestingSessionLocal()
+    try:
+        today = date(2000, 1, 1)
+        counts = leave_archive.archive_leave_requests(db, retention_days=30, today=today, dry_run=True)
+        assert counts["archived"] == 2
+        counts = leave_archive.archive_leave_requests(db, retention_days=30, today=today, chunk_size=1)
+        assert counts["archived"] == 2 and counts["chunks"] == 2
+        assert leave_archive.archive_leave_requests(db, retention_days=30, today=today)["archived"] == 0
+    finally:
+        db.close()
+
+    listed = client.get("/leave-requests", params={"emp_no": 20049}).json()
+    assert sorted(r["start_date"] for r in listed) == ["1999-03-01", "1999-11-01"]
+
+    # Archived requests keep their id and stay readable
+    archived = client.get(f"/leave-requests/{ids['1998-03-02']}")
+    assert archived.status_code == 200
+    assert archived.json()["status"] == "APPROVED" and archived.json()["days_requested"] == 2
+    assert client.put(f"/leave-requests/{ids['1998-03-02']}", json={"employee_comment": "x"}).status_code == 404
+
+    history = client.get("/leave-requests", params={"emp_no": 20049, "include_archived": True}).json()
+    assert [r["leave_id"] for r in history] == [r["leave_id"] for r in hot]
+    page = client.get(
+        "/leave-requests", params={"emp_no": 20049, "include_archived": True, "limit": 2, "offset": 1}
+    ).json()
+    assert [r["leave_id"] for r in page] == [r["leave_id"] for r in hot[1:3]]
+
+    # Balances are untouched by archiving
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20049/1998/balance").json()}
+    assert balances[0]["used_days"] == 2
+
+
+def test_recurring_leave_requests(client):
+    from app.crud import leave_requests
+
+    client.post("/departments", json={"dept_no": "p050", "dept_name": "Pattern Dept"})
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20050, first_name="Every", last_name="Friday")
+        setup_department_tables(db)
+        create_department_assignment(db, 20050, "p050")
+    finally:
+        db.close()
+
+    def request(start, end, weekdays=None, interval_weeks=1, leave_type_id=0):
+        body = {"emp_no": 20050, "leave_type_id": leave_type_id, "start_date": start, "end_date": end}
+        if weekdays is not None:
+            body["recurrence"] = {"weekdays": weekdays, "interval_weeks": interval_weeks}
+        return client.post("/leave-requests", json=body)
+
+    # Every Friday for a quarter: one row, twelve days
+    fridays = request("2050-01-03", "2050-03-31", weekdays=[4], leave_type_id=1)
+    assert fridays.status_code == 201
+    assert fridays.json()["days_requested"] == 12
+    assert fridays.json()["recurrence"] == {"weekdays": [4], "interval_weeks": 1}
+    fridays_id = fridays.json()["leave_id"]
+    assert client.get(f"/leave-requests/{fridays_id}").json()["recurrence"]["weekdays"] == [4]
+
+    # Days between the occurrences are free; the occurrences are not
+    plain = request("2050-01-11", "2050-01-13")
+    assert plain.status_code == 201
+    assert client.put(
+        f"/leave-requests/{plain.json()['leave_id']}", json={"end_date": "2050-01-14"}
+    ).status_code == 400
+    response = request("2050-01-14", "2050-01-14")
+    assert response.status_code == 400 and str(fridays_id) in response.json()["detail"]
+    assert request("2050-02-01", "2050-02-28", weekdays=[2, 4]).status_code == 400
+    # Every other Monday, from the week of start_date
+    mondays = request("2050-01-03", "2050-03-31", weekdays=[0], interval_weeks=2)
+    assert mondays.status_code == 201 and mondays.json()["days_requested"] == 7
+    # Moving the series re-expands it
+    moved = client.put(f"/leave-requests/{fridays_id}", json={"start_date": "2050-01-08"})
+    assert moved.status_code == 200 and moved.json()["days_requested"] == 11
+
+    # Quota is checked against the whole expansion
+    response = request("2050-06-06", "2050-09-30", weekdays=[0, 1, 2])
+    assert response.status_code == 400 and response.json()["detail"] == "Insufficient quota"
+    assert request("2050-01-03", "2051-06-30", weekdays=[3], leave_type_id=1).status_code == 400
+
+    balances = {b["leave_type_id"]: b for b in client.get("/leave-quotas/20050/2050/balance").json()}
+    assert balances[0]["pending_days"] == 3 + 7
+
+    # Calendar: only the occurrences count as absences
+    calendar = client.get("/departments/p050/absences", params={"from": "2050-01-10", "to": "2050-01-16"}).json()
+    out = {day["date"]: day["emp_nos"] for day in calendar["days"]}
+    assert out["2050-01-10"] == [] and out["2050-01-12"] == [20050] and out["2050-01-14"] == [20050]
+    assert out["2050-01-15"] == []
+    assert {a["leave_id"] for a in calendar["absences"] if a["recurrence"]} == {fridays_id}
+
+    db = TestingSessionLocal()
+    try:
+        assert [o for o in leave_requests.find_all_overlaps(db) if o["emp_no"] == 20050] == []
+    finally:
+        db.close()
+
+
+def test_recurring_leave_near_date_max(client):
+    from app.recurrence import Recurrence, occurrences
+
+    # 9999-12-31 (date.max) is a Friday; the week after it does not exist
+    assert list(occurrences(date(9999, 12, 20), date(9999, 12, 31), Recurrence(1 << 6))) == [date(9999, 12, 26)]
+    assert list(occurrences(date(9999, 12, 27), date(9999, 12, 31), Recurrence(1 << 4, 3))) == [date(9999, 12, 31)]
+
+    db = TestingSessionLocal()
+    try:
+        create_test_employee(db, emp_no=20054, first_name="Last", last_name="Week")
+    finally:
+        db.close()
+
+    def request(weekdays):
+        return client.post("/leave-requests", json={
+            "emp_no": 20054, "leave_type_id": 1, "start_date": "9999-12-20", "end_date": "9999-12-31",
+            "recurrence": {"weekdays": weekdays, "interval_weeks": 1},
+        })
+
+    assert request([6]).status_code == 400  # Sundays only: no working day, not an overflow
+    fridays = request([4])
+    assert fridays.status_code == 201 and fridays.json()["days_requested"] == 2